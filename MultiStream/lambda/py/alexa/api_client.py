@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+from typing import Optional
+from ask_sdk_model.services import ApiClient, ApiClientRequest, ApiClientResponse
+
+
+class LazyApiClient(ApiClient):
+    """Api client creating the SDK ``DefaultApiClient`` on first use.
+
+    The default client imports ``requests``, which is only needed when a
+    handler calls an Alexa service API.
+    """
+    def __init__(self):
+        # type: () -> None
+        self._client = None  # type: Optional[ApiClient]
+
+    def invoke(self, request):
+        # type: (ApiClientRequest) -> ApiClientResponse
+        if self._client is None:
+            from ask_sdk_core.api_client import DefaultApiClient
+            self._client = DefaultApiClient()
+        return self._client.invoke(request)
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""Episode catalog of the skill.
+
+The catalog is read from a memory-mapped file, built from a JSON lines
+file of ``{"title": ..., "url": ..., "mirrors": [...]}`` objects, one
+per episode, the mirrors being optional::
+
+    python -m alexa.catalog --input episodes.jsonl [--output PATH]
+
+The title search index of the catalog is written with it. Without a
+catalog file, ``data.AUDIO_DATA`` is used.
+"""
+
+import abc
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import (
+    Dict, Iterable, Iterator, List, Mapping, Optional, Tuple)
+from . import data
+
+# File layout, little-endian:
+#   header:  magic, version, episode count, index slot count, the
+#            offsets of the records, the index and the string table, and
+#            the revision, a hash of the episode keys in catalog order
+#   records: per episode, its key and the offset and length of its
+#            title, url and mirrors in the string table
+#   index:   open addressing table of (key, position + 1), 0 when empty
+#   strings: utf-8 titles, urls and mirror urls, one per line
+MAGIC = b"ACAT"
+VERSION = 3
+HEADER = struct.Struct("<4sIIIQQQQ")
+RECORD = struct.Struct("<QIIIIII")
+# Version 2 records have no mirrors
+RECORDS = {2: struct.Struct("<QIIII"), VERSION: RECORD}
+SLOT = struct.Struct("<QI")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "catalog.bin")
+
+
+def episode_key(url):
+    """Stable 64-bit key of the episode at ``url``."""
+    # type: (str) -> int
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return struct.unpack("<Q", digest)[0]
+
+
+def _revision(keys):
+    # type: (Iterable[int]) -> int
+    digest = hashlib.blake2b(digest_size=8)
+    for key in keys:
+        digest.update(struct.pack("<Q", key))
+    return struct.unpack("<Q", digest.digest())[0]
+
+
+class Catalog(abc.ABC):
+    """Episodes by position, with their stream tokens.
+
+    The token of an episode is its url key in 16 hex digits, so it
+    still names the same episode after the catalog is reordered or
+    extended. Tokens written by older versions of the skill are the
+    decimal catalog position.
+    """
+    @abc.abstractmethod
+    def __len__(self):
+        # type: () -> int
+        pass
+
+    @abc.abstractmethod
+    def __getitem__(self, position):
+        # type: (int) -> Dict[str, str]
+        pass
+
+    @property
+    @abc.abstractmethod
+    def revision(self):
+        """Hex digest of the episode keys, changed by any update."""
+        # type: () -> str
+        pass
+
+    @abc.abstractmethod
+    def key(self, position):
+        # type: (int) -> int
+        pass
+
+    @abc.abstractmethod
+    def position(self, key):
+        """Position of the episode with ``key``, None if unknown."""
+        # type: (int) -> Optional[int]
+        pass
+
+    def token(self, position):
+        # type: (int) -> str
+        return "{:016x}".format(self.key(position))
+
+    def resolve(self, token):
+        """Position of the episode of ``token``, None if unknown."""
+        # type: (Optional[str]) -> Optional[int]
+        if token is None:
+            return None
+        token = str(token)
+        try:
+            if len(token) == 16:
+                return self.position(int(token, 16))
+            # Legacy catalog position
+            position = int(token)
+        except ValueError:
+            return None
+        return position if 0 <= position < len(self) else None
+
+
+class FileCatalog(Catalog):
+    """Catalog read from a catalog file.
+
+    The file is mapped on first use and episodes are decoded when
+    indexed, so the resident memory does not grow with the catalog.
+    """
+    def __init__(self, path):
+        # type: (str) -> None
+        self.path = path
+        self._map = None  # type: Optional[mmap.mmap]
+        self._count = 0
+        self._slot_count = 0
+        self._records_offset = 0
+        self._index_offset = 0
+        self._strings_offset = 0
+        self._revision = 0
+        self._record = RECORD
+
+    def _open(self):
+        # type: () -> mmap.mmap
+        if self._map is None:
+            with open(self.path, "rb") as catalog_file:
+                mapped = mmap.mmap(catalog_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            (magic, version, self._count, self._slot_count,
+             self._records_offset, self._index_offset,
+             self._strings_offset, self._revision) = HEADER.unpack_from(
+                mapped, 0)
+            if magic != MAGIC or version not in RECORDS:
+                mapped.close()
+                raise ValueError(
+                    "{} is not a version {} catalog file".format(
+                        self.path, VERSION))
+            self._record = RECORDS[version]
+            self._map = mapped
+        return self._map
+
+    def __len__(self):
+        # type: () -> int
+        self._open()
+        return self._count
+
+    @property
+    def revision(self):
+        # type: () -> str
+        self._open()
+        return "{:016x}".format(self._revision)
+
+    def _unpack(self, position):
+        """Record at ``position``, negative positions counting from the
+        end like lists."""
+        # type: (int) -> Tuple[int, ...]
+        mapped = self._open()
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError("catalog position out of range")
+        return self._record.unpack_from(
+            mapped, self._records_offset + position * self._record.size)
+
+    def __getitem__(self, position):
+        # type: (int) -> Dict[str, str]
+        record = self._unpack(position)
+        mapped = self._map
+        strings = self._strings_offset
+        episode = {
+            "title": mapped[strings + record[1]:
+                            strings + record[1] + record[2]].decode("utf-8"),
+            "url": mapped[strings + record[3]:
+                          strings + record[3] + record[4]].decode("utf-8")
+        }
+        if len(record) > 5 and record[6]:
+            episode["mirrors"] = mapped[
+                strings + record[5]:
+                strings + record[5] + record[6]].decode("utf-8").split("\n")
+        return episode
+
+    def key(self, position):
+        # type: (int) -> int
+        return self._unpack(position)[0]
+
+    def position(self, key):
+        # type: (int) -> Optional[int]
+        mapped = self._open()
+        mask = self._slot_count - 1
+        slot = key & mask
+        while True:
+            slot_key, stored = SLOT.unpack_from(
+                mapped, self._index_offset + slot * SLOT.size)
+            if stored == 0:
+                return None
+            if slot_key == key:
+                return stored - 1
+            slot = (slot + 1) & mask
+
+
+class ListCatalog(Catalog):
+    """Catalog over a list of episode dicts, like ``data.AUDIO_DATA``."""
+    def __init__(self, episodes):
+        # type: (List[Dict[str, str]]) -> None
+        self.episodes = episodes
+        self._positions = None  # type: Optional[Dict[int, int]]
+        self._revision = None  # type: Optional[str]
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.episodes)
+
+    @property
+    def revision(self):
+        # type: () -> str
+        if self._revision is None:
+            self._revision = "{:016x}".format(_revision(
+                self.key(position) for position in range(len(self))))
+        return self._revision
+
+    def __getitem__(self, position):
+        # type: (int) -> Dict[str, str]
+        return self.episodes[position]
+
+    def key(self, position):
+        # type: (int) -> int
+        return episode_key(self.episodes[position]["url"])
+
+    def position(self, key):
+        # type: (int) -> Optional[int]
+        if self._positions is None:
+            positions = {}  # type: Dict[int, int]
+            for position in range(len(self.episodes)):
+                positions.setdefault(self.key(position), position)
+            self._positions = positions
+        return self._positions.get(key)
+
+
+def build(episodes, path):
+    """Write the catalog file of the episodes.
+
+    Records are written as the episodes are read, and their strings to a
+    temporary file copied after the index, which a second pass over the
+    mapped records fills in: memory use doesn't grow with the catalog.
+    """
+    # type: (Iterable[Mapping[str, str]], str) -> int
+    count = 0
+    strings_length = 0
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w+b") as catalog_file, \
+            tempfile.TemporaryFile() as strings_file:
+        records_offset = HEADER.size
+        catalog_file.seek(records_offset)
+        for episode in episodes:
+            title = episode["title"].encode("utf-8")
+            url = episode["url"].encode("utf-8")
+            mirrors = "\n".join(episode.get("mirrors") or ()).encode("utf-8")
+            catalog_file.write(RECORD.pack(
+                episode_key(episode["url"]), strings_length, len(title),
+                strings_length + len(title), len(url),
+                strings_length + len(title) + len(url), len(mirrors)))
+            strings_file.write(title)
+            strings_file.write(url)
+            strings_file.write(mirrors)
+            strings_length += len(title) + len(url) + len(mirrors)
+            count += 1
+
+        slot_count = 1
+        while slot_count < 2 * count:
+            slot_count *= 2
+        index_offset = records_offset + count * RECORD.size
+        strings_offset = index_offset + slot_count * SLOT.size
+        # Empty slots are zeros
+        catalog_file.truncate(strings_offset)
+        catalog_file.seek(strings_offset)
+        strings_file.seek(0)
+        shutil.copyfileobj(strings_file, catalog_file)
+        catalog_file.flush()
+
+        mapped = mmap.mmap(catalog_file.fileno(), 0)
+        try:
+            def keys():
+                # type: () -> Iterator[int]
+                for position in range(count):
+                    yield RECORD.unpack_from(
+                        mapped, records_offset + position * RECORD.size)[0]
+
+            mask = slot_count - 1
+            for position, key in enumerate(keys()):
+                slot = key & mask
+                while True:
+                    slot_key, stored = SLOT.unpack_from(
+                        mapped, index_offset + slot * SLOT.size)
+                    if stored == 0:
+                        SLOT.pack_into(mapped, index_offset + slot * SLOT.size,
+                                       key, position + 1)
+                        break
+                    if slot_key == key:
+                        # The first of duplicate urls wins
+                        break
+                    slot = (slot + 1) & mask
+            HEADER.pack_into(
+                mapped, 0, MAGIC, VERSION, count, slot_count, records_offset,
+                index_offset, strings_offset, _revision(keys()))
+            mapped.flush()
+        finally:
+            mapped.close()
+    os.replace(temporary_path, path)
+    return count
+
+
+def load(path):
+    """Catalog of the file at ``path``, ``data.AUDIO_DATA`` if there is
+    none."""
+    # type: (str) -> Catalog
+    if os.path.exists(path):
+        return FileCatalog(path)
+    return ListCatalog(data.AUDIO_DATA)
+
+
+_catalog = None
+
+
+def get_catalog():
+    """Catalog of the skill, opened once per container.
+
+    The file is ``CATALOG_PATH``, ``catalog.bin`` next to this module by
+    default; ``data.AUDIO_DATA`` is used when it doesn't exist.
+    """
+    # type: () -> Catalog
+    global _catalog
+    if _catalog is None:
+        _catalog = load(os.environ.get("CATALOG_PATH", DEFAULT_PATH))
+    return _catalog
+
+
+def read_episodes(path):
+    # type: (str) -> Iterable[Dict[str, str]]
+    with open(path) as episodes:
+        for line in episodes:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    # search reads the catalog through this module
+    from . import search
+
+    parser = argparse.ArgumentParser(
+        description="Build the episode catalog file of the skill and its "
+                    "title search index.")
+    parser.add_argument("--input",
+                        help="JSON lines file of the episodes, "
+                             "data.AUDIO_DATA by default")
+    parser.add_argument("--output", default=DEFAULT_PATH,
+                        help="catalog file, {} by default".format(
+                            DEFAULT_PATH))
+    parser.add_argument("--search-index", default=search.DEFAULT_PATH,
+                        help="title search index file, {} by default".format(
+                            search.DEFAULT_PATH))
+    args = parser.parse_args(argv)
+
+    episodes = (read_episodes(args.input) if args.input
+                else data.AUDIO_DATA)
+    count = build(episodes, args.output)
+    search.write(FileCatalog(args.output), args.search_index)
+    print("Wrote {} episodes to {} and their search index to {}".format(
+        count, args.output, args.search_index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Playback cursor carried by the stream tokens in stateless mode.
+
+With ``STATELESS_PLAYBACK=true``, the token of every stream played by
+the skill is a signed cursor: the episode key, the shuffle seed and
+the catalog revision. AudioPlayer events echo the token, so their
+handlers work out the next stream from it, without reading the
+persistent attributes. The loop setting, which can change while a
+stream plays, isn't carried: it is read from the persistent attributes
+at the end of the play order. The tokens are signed with the
+``PLAYBACK_TOKEN_SECRET`` key.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import struct
+from collections import namedtuple
+from typing import Optional
+
+VERSION = 1
+# version, flags, shuffle seed, episode key, catalog revision
+PAYLOAD = struct.Struct("<BBIQQ")
+TAG_SIZE = 12
+TOKEN_LENGTH = len(base64.urlsafe_b64encode(
+    b"\0" * (PAYLOAD.size + TAG_SIZE)))
+
+# Bit 0 held the loop setting, it is ignored
+SHUFFLE = 2
+
+Cursor = namedtuple("Cursor", ["key", "seed", "shuffle", "revision"])
+
+
+class CursorCodec(object):
+    """Writes cursors as signed stream tokens and reads them back."""
+    def __init__(self, secret):
+        # type: (bytes) -> None
+        if not secret:
+            raise ValueError(
+                "Stateless playback needs a secret to sign the stream "
+                "tokens. Set PLAYBACK_TOKEN_SECRET.")
+        self.secret = secret
+
+    def _tag(self, payload):
+        # type: (bytes) -> bytes
+        return hmac.new(self.secret, payload,
+                        hashlib.sha256).digest()[:TAG_SIZE]
+
+    def encode(self, cursor):
+        # type: (Cursor) -> str
+        flags = SHUFFLE if cursor.shuffle else 0
+        payload = PAYLOAD.pack(VERSION, flags, cursor.seed, cursor.key,
+                               cursor.revision)
+        return base64.urlsafe_b64encode(
+            payload + self._tag(payload)).decode("ascii")
+
+    def decode(self, token):
+        """Cursor of the token, None if it isn't one signed with our
+        secret."""
+        # type: (Optional[str]) -> Optional[Cursor]
+        if token is None or len(token) != TOKEN_LENGTH:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token.encode("ascii"))
+        except (ValueError, TypeError):
+            return None
+        payload, tag = raw[:PAYLOAD.size], raw[PAYLOAD.size:]
+        if not hmac.compare_digest(tag, self._tag(payload)):
+            return None
+        version, flags, seed, key, revision = PAYLOAD.unpack(payload)
+        if version != VERSION:
+            return None
+        return Cursor(key=key, seed=seed, shuffle=bool(flags & SHUFFLE),
+                      revision=revision)
+
+
+_codec = None  # type: Optional[CursorCodec]
+_codec_loaded = False
+
+
+def get_codec():
+    """Codec of the stream tokens, None unless in stateless mode."""
+    # type: () -> Optional[CursorCodec]
+    global _codec, _codec_loaded
+    if not _codec_loaded:
+        if os.environ.get("STATELESS_PLAYBACK", "false") == "true":
+            _codec = CursorCodec(os.environ.get(
+                "PLAYBACK_TOKEN_SECRET", "").encode("utf-8"))
+        _codec_loaded = True
+    return _codec
@@ -16,6 +16,8 @@ PLAYBACK_PLAY = "This is {}"
 PLAYBACK_PLAY_CARD = "Playing {}"
 PLAYBACK_NEXT_END = "You have reached the end of the playlist"
 PLAYBACK_PREVIOUS_END = "You have reached the start of the playlist"
+EPISODE_NOT_FOUND_MSG = "Sorry, I couldn't find an episode called {}."
+EPISODE_NOT_FOUND_REPROMPT_MSG = "You can say, play, and the name of an episode, or play the audio, to begin."
 
 DYNAMODB_TABLE_NAME = "Audio-Player-Multi-Stream"
 
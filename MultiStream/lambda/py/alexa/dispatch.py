@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from ask_sdk_core.handler_input import HandlerInput
+from ask_sdk_runtime.dispatch_components import (
+    GenericRequestMapper, GenericRequestHandlerChain)
+from . import envelope
+
+logger = logging.getLogger(__name__)
+
+
+def get_request_key(handler_input):
+    """Intent name for intent requests, request type otherwise."""
+    # type: (HandlerInput) -> str
+    return (envelope.get_intent_name(handler_input) or
+            envelope.get_request_type(handler_input))
+
+
+class IndexedRequestMapper(GenericRequestMapper):
+    """Request mapper looking up handlers by request type and intent name.
+
+    Request handlers declare what they handle through the class
+    attributes ``request_types``, ``intent_names`` and ``state``, a dict
+    of state predicate names to the expected truth value. The state
+    predicates are evaluated at most once per request. Handlers without
+    declarations are checked with their ``can_handle``, in their
+    registration order relative to the indexed handlers.
+
+    With ``verify`` set, every decision is also checked against the
+    linear ``can_handle`` chain; mismatches are logged and the decision
+    of the linear chain is used.
+    """
+    def __init__(self, request_handler_chains, state_predicates=None,
+                 verify=False):
+        # type: (List[GenericRequestHandlerChain], Dict[str, Callable[[HandlerInput], object]], bool) -> None
+        self.state_predicates = state_predicates or {}
+        self.verify = verify
+        self._candidates = None  # type: Optional[Dict[str, List[Tuple]]]
+        self._unindexed = []  # type: List[Tuple]
+        super(IndexedRequestMapper, self).__init__(request_handler_chains)
+
+    def add_request_handler_chain(self, request_handler_chain):
+        # type: (GenericRequestHandlerChain) -> None
+        super(IndexedRequestMapper, self).add_request_handler_chain(
+            request_handler_chain)
+        self._candidates = None
+
+    def _build_index(self):
+        # type: () -> None
+        indexed = {}  # type: Dict[str, List[Tuple]]
+        unindexed = []
+        for position, chain in enumerate(self.request_handler_chains):
+            handler = chain.request_handler
+            keys = (tuple(getattr(handler, "request_types", ())) +
+                    tuple(getattr(handler, "intent_names", ())))
+            if not keys:
+                unindexed.append((position, chain, None))
+                continue
+
+            state = tuple(getattr(handler, "state", {}).items())
+            for key in keys:
+                indexed.setdefault(key, []).append((position, chain, state))
+
+        self._unindexed = unindexed
+        self._candidates = {
+            key: sorted(candidates + unindexed, key=lambda c: c[0])
+            for key, candidates in indexed.items()}
+
+    def _find_chain(self, handler_input):
+        # type: (HandlerInput) -> Optional[GenericRequestHandlerChain]
+        if self._candidates is None:
+            self._build_index()
+
+        candidates = self._candidates.get(
+            get_request_key(handler_input), self._unindexed)
+        state_values = {}  # type: Dict[str, bool]
+        for _, chain, state in candidates:
+            if state is None:
+                if chain.request_handler.can_handle(handler_input):
+                    return chain
+                continue
+
+            for name, expected in state:
+                if name not in state_values:
+                    state_values[name] = bool(
+                        self.state_predicates[name](handler_input))
+                if state_values[name] != expected:
+                    break
+            else:
+                return chain
+
+        return None
+
+    def get_request_handler_chain(self, handler_input):
+        # type: (HandlerInput) -> Optional[GenericRequestHandlerChain]
+        chain = self._find_chain(handler_input)
+        if self.verify:
+            expected = super(
+                IndexedRequestMapper, self).get_request_handler_chain(
+                handler_input)
+            if chain is not expected:
+                logger.error(
+                    "Dispatch mismatch for {}: index chose {}, linear "
+                    "chain chose {}".format(
+                        get_request_key(handler_input),
+                        type(chain.request_handler).__name__ if chain
+                        else None,
+                        type(expected.request_handler).__name__ if expected
+                        else None))
+                return expected
+        return chain
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Failover of the streams to their mirrors.
+
+Station and episode records may list ``mirrors``, other urls of the
+same audio, tried in order after their ``url``. When a stream fails, its
+url is charged with the failure and the next healthy url of the record
+is played instead. The failed url itself isn't played again right away,
+so a stream without a healthy mirror stops.
+
+Each url has a circuit breaker: FAILURE_THRESHOLD failures within
+FAILURE_WINDOW open it, and the url isn't played again until it closes,
+``MIRROR_BACKOFF_SECONDS`` later. The delay doubles each time the
+circuit opens again, and is reset after RESET_AFTER without failures.
+Breakers are kept in the container, for all its users, and in the
+persistent attributes of each user, so they outlive the container. A
+user gets at most ``PLAYBACK_RETRY_LIMIT`` retries per RETRY_WINDOW.
+"""
+
+import hashlib
+import os
+import time
+from typing import Dict, List, Mapping, MutableMapping, Optional
+
+# Times in milliseconds
+FAILURE_THRESHOLD = 2
+FAILURE_WINDOW = 60 * 1000
+BACKOFF = int(os.environ.get("MIRROR_BACKOFF_SECONDS", "30")) * 1000
+MAX_BACKOFF = 60 * 60 * 1000
+RESET_AFTER = 6 * 60 * 60 * 1000
+RETRY_LIMIT = int(os.environ.get("PLAYBACK_RETRY_LIMIT", "5"))
+RETRY_WINDOW = 10 * 60 * 1000
+# Breakers kept per container and per user
+MAX_BREAKERS = 1000
+MAX_USER_BREAKERS = 20
+
+# url -> breaker, for all the users of the container
+_breakers = {}  # type: Dict[str, Dict[str, int]]
+# token -> url, for the streams played from a mirror
+_mirror_streams = {}  # type: Dict[str, str]
+
+
+def _now():
+    # type: () -> int
+    return int(time.time() * 1000)
+
+
+def _user_key(url):
+    """Short key of a url in the persistent attributes."""
+    # type: (str) -> str
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def urls(record):
+    """Urls of a station or episode record, its ``url`` first."""
+    # type: (Mapping) -> List[str]
+    return [record["url"]] + list(record.get("mirrors") or ())
+
+
+def _is_open(breaker, now):
+    # type: (Optional[Mapping], int) -> bool
+    return breaker is not None and int(breaker.get("open_until", 0)) > now
+
+
+def _charge(breaker, now):
+    """Count a failure, opening the breaker at the threshold."""
+    # type: (MutableMapping, int) -> None
+    last_failure = int(breaker.get("last_failure", 0))
+    trips = int(breaker.get("trips", 0))
+    failures = int(breaker.get("failures", 0))
+    if now - last_failure > RESET_AFTER:
+        trips = 0
+    if now - last_failure > FAILURE_WINDOW:
+        failures = 0
+    failures += 1
+    if failures >= FAILURE_THRESHOLD:
+        trips += 1
+        failures = 0
+        breaker["open_until"] = now + min(
+            BACKOFF << min(trips - 1, 16), MAX_BACKOFF)
+    breaker["failures"] = failures
+    breaker["trips"] = trips
+    breaker["last_failure"] = now
+
+
+def _prune(breakers, size, now):
+    """Drop the breakers without failures for RESET_AFTER, then the
+    oldest ones, down to ``size``."""
+    # type: (MutableMapping[str, MutableMapping], int, int) -> None
+    for key in [key for key, breaker in breakers.items()
+                if now - int(breaker.get("last_failure", 0)) > RESET_AFTER]:
+        del breakers[key]
+    if len(breakers) > size:
+        oldest = sorted(
+            breakers,
+            key=lambda key: int(breakers[key].get("last_failure", 0)))
+        for key in oldest[:len(breakers) - size]:
+            del breakers[key]
+
+
+def _user_breakers(attributes):
+    # type: (Optional[Mapping]) -> MutableMapping
+    health = (attributes or {}).get("stream_health") or {}
+    return health.get("breakers") or {}
+
+
+def _is_healthy(url, user_breakers, now):
+    """Whether the circuit of ``url`` is closed in the container and for
+    the user."""
+    # type: (str, Mapping, int) -> bool
+    return not (_is_open(_breakers.get(url), now) or
+                _is_open(user_breakers.get(_user_key(url)), now))
+
+
+def pick(record, attributes=None):
+    """Url to play a record from: the first one whose circuit is closed
+    in the container and in the persistent ``attributes`` of the user,
+    when given, its ``url`` if none is."""
+    # type: (Mapping, Optional[Mapping]) -> str
+    now = _now()
+    user_breakers = _user_breakers(attributes)
+    candidates = urls(record)
+    for url in candidates:
+        if _is_healthy(url, user_breakers, now):
+            return url
+    return candidates[0]
+
+
+def remember(token, url, record):
+    """Note the url the stream of ``token`` is played from, for the
+    records whose token isn't their url."""
+    # type: (str, str, Mapping) -> None
+    if url == record["url"]:
+        _mirror_streams.pop(token, None)
+        return
+    if len(_mirror_streams) >= MAX_BREAKERS:
+        del _mirror_streams[next(iter(_mirror_streams))]
+    _mirror_streams[token] = url
+
+
+def played_url(token, record):
+    """Url the stream of ``token`` was played from, as far as this
+    container knows."""
+    # type: (Optional[str], Mapping) -> str
+    return _mirror_streams.get(token, record["url"])
+
+
+def fail_over(record, failed_url, attributes, request_id=None):
+    """Url to play the record from after ``failed_url`` failed, None to
+    give up.
+
+    The failure is charged to the url in the container and in the
+    persistent ``attributes`` of the user, which also count the retries.
+    The container is charged once per ``request_id``, for requests
+    handled again after a write conflict. The other urls are tried in
+    turn from the one after ``failed_url``, which is left to back off.
+    """
+    # type: (Mapping, str, MutableMapping, Optional[str]) -> Optional[str]
+    now = _now()
+    health = attributes.get("stream_health") or {}
+    user_breakers = _user_breakers(attributes)
+
+    breaker = _breakers.setdefault(failed_url, {})
+    if request_id is None or breaker.get("request_id") != request_id:
+        _charge(breaker, now)
+        breaker["request_id"] = request_id
+    _prune(_breakers, MAX_BREAKERS, now)
+    _charge(user_breakers.setdefault(_user_key(failed_url), {}), now)
+    _prune(user_breakers, MAX_USER_BREAKERS, now)
+
+    retries = [int(retry) for retry in health.get("retries") or ()
+               if now - int(retry) < RETRY_WINDOW]
+    url = None
+    if len(retries) < RETRY_LIMIT:
+        candidates = urls(record)
+        start = (candidates.index(failed_url) + 1
+                 if failed_url in candidates else 0)
+        for i in range(len(candidates)):
+            candidate = candidates[(start + i) % len(candidates)]
+            if (candidate != failed_url and
+                    _is_healthy(candidate, user_breakers, now)):
+                url = candidate
+                retries.append(now)
+                break
+
+    attributes["stream_health"] = {"breakers": user_breakers,
+                                   "retries": retries}
+    return url
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Podcast feed ingestion into the episode catalog.
+
+Adds the episodes of RSS or Atom feed files missing from the catalog
+file, from the ``lambda/py`` directory::
+
+    python -m alexa.feed FEED [FEED ...] [--catalog PATH]
+
+Feeds are parsed item by item, so memory grows with the number of new
+episodes, not with the size of the feeds.
+
+Episodes are identified by their enclosure url: the ones already in the
+catalog, or seen earlier in the feeds, are skipped, and the new ones are
+appended to the catalog, oldest first. The title search index is
+rebuilt when episodes were added.
+
+A feed whose size and modification time did not change since it was
+last ingested into the same catalog is not parsed again.
+"""
+
+import argparse
+import calendar
+import email.utils
+import itertools
+import json
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional, Set
+from . import catalog, search
+
+ATOM_NAMESPACE = "http://www.w3.org/2005/Atom"
+
+Episode = namedtuple("Episode", ["title", "url", "published"])
+
+_ISO_DATE = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[Tt ](\d{2}):(\d{2}):(\d{2})(?:\.\d+)?"
+    r"(?:([Zz])|([+-])(\d{2}):?(\d{2}))?$")
+
+
+def _split(tag):
+    """Namespace and local name of an element tag."""
+    # type: (str) -> tuple
+    if tag.startswith("{"):
+        namespace, name = tag[1:].split("}", 1)
+        return namespace, name
+    return "", tag
+
+
+def _parse_date(text):
+    """Unix time of an RSS or Atom date, None if it can't be read."""
+    # type: (Optional[str]) -> Optional[float]
+    if not text:
+        return None
+    text = text.strip()
+    match = _ISO_DATE.match(text)
+    if match:
+        (year, month, day, hour, minute, second, _, sign, offset_hours,
+         offset_minutes) = match.groups()
+        timestamp = calendar.timegm((int(year), int(month), int(day),
+                                     int(hour), int(minute), int(second)))
+        if sign:
+            offset = int(offset_hours) * 3600 + int(offset_minutes) * 60
+            timestamp -= offset if sign == "+" else -offset
+        return float(timestamp)
+    parsed = email.utils.parsedate_tz(text)
+    if parsed is None:
+        return None
+    return float(email.utils.mktime_tz(parsed))
+
+
+def _episode(item):
+    """Episode of an RSS item or Atom entry, None if it has no audio."""
+    # type: (ElementTree.Element) -> Optional[Episode]
+    title = None
+    url = None
+    published = None
+    for child in item:
+        namespace, name = _split(child.tag)
+        if namespace not in ("", ATOM_NAMESPACE):
+            # itunes:title and the like
+            continue
+        if name == "title" and title is None:
+            title = "".join(child.itertext()).strip()
+        elif name == "enclosure" and url is None:
+            # RSS
+            if child.get("type", "audio/").startswith("audio/"):
+                url = child.get("url")
+        elif (name == "link" and url is None and
+              child.get("rel") == "enclosure"):
+            # Atom
+            if child.get("type", "audio/").startswith("audio/"):
+                url = child.get("href")
+        elif name in ("pubDate", "published") or (
+                name == "updated" and published is None):
+            published = _parse_date(child.text)
+    if not url:
+        return None
+    url = url.strip()
+    return Episode(title=title or url.rsplit("/", 1)[-1], url=url,
+                   published=published)
+
+
+def read_feed(path):
+    """Episodes of a feed file, in feed order.
+
+    Items are dropped from the tree once read, so only the one being
+    parsed is held in memory.
+    """
+    # type: (str) -> Iterator[Episode]
+    parents = []  # type: List[ElementTree.Element]
+    for event, element in ElementTree.iterparse(path,
+                                                events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if _split(element.tag)[1] not in ("item", "entry"):
+            continue
+        episode = _episode(element)
+        if episode is not None:
+            yield episode
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+
+
+class FeedState(object):
+    """Size and modification time of the feeds last ingested into a
+    catalog, kept in a JSON file next to it."""
+    def __init__(self, path):
+        # type: (str) -> None
+        self.path = path
+        self.feeds = {}  # type: Dict[str, Dict]
+        if os.path.exists(path):
+            with open(path) as state_file:
+                self.feeds = json.load(state_file)
+
+    @staticmethod
+    def _stamp(feed_path, revision):
+        # type: (str, str) -> Dict
+        stat = os.stat(feed_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "catalog_revision": revision}
+
+    def unchanged(self, feed_path, revision):
+        """Whether the feed was ingested as it is into this catalog."""
+        # type: (str, str) -> bool
+        return (self.feeds.get(os.path.abspath(feed_path)) ==
+                self._stamp(feed_path, revision))
+
+    def update(self, feed_paths, revision):
+        # type: (List[str], str) -> None
+        for feed_path in feed_paths:
+            self.feeds[os.path.abspath(feed_path)] = self._stamp(
+                feed_path, revision)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as state_file:
+            json.dump(self.feeds, state_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+
+def new_episodes(episodes, feed_paths):
+    """Episodes of the feeds missing from the ``episodes`` catalog, oldest
+    first.
+
+    Episodes without a date come after the dated ones, in reverse feed
+    order.
+    Urls not served over https, which AudioPlayer can't stream, are
+    skipped.
+    """
+    # type: (catalog.Catalog, List[str]) -> List[Episode]
+    seen = set()  # type: Set[int]
+    added = []  # type: List[Episode]
+    for feed_path in feed_paths:
+        for episode in read_feed(feed_path):
+            if not episode.url.startswith("https://"):
+                continue
+            key = catalog.episode_key(episode.url)
+            if key in seen or episodes.position(key) is not None:
+                continue
+            seen.add(key)
+            added.append(episode)
+    # Feeds list their newest episodes first
+    added.reverse()
+    added.sort(key=lambda episode: (episode.published is None,
+                                    episode.published or 0))
+    return added
+
+
+def ingest(feed_paths, catalog_path, search_index_path=None, force=False):
+    """Append the new episodes of the feeds to the catalog file, and
+    rebuild its search index. Number of episodes added."""
+    # type: (List[str], str, Optional[str], bool) -> int
+    episodes = catalog.load(catalog_path)
+    state = FeedState(catalog_path + ".feeds.json")
+    changed = [feed_path for feed_path in feed_paths
+               if force or not state.unchanged(feed_path, episodes.revision)]
+    added = new_episodes(episodes, changed)
+    if added:
+        catalog.build(itertools.chain(
+            (episodes[position] for position in range(len(episodes))),
+            ({"title": episode.title, "url": episode.url}
+             for episode in added)), catalog_path)
+        episodes = catalog.FileCatalog(catalog_path)
+        if search_index_path:
+            search.write(episodes, search_index_path)
+    state.update(feed_paths, episodes.revision)
+    return len(added)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    parser = argparse.ArgumentParser(
+        description="Add the new episodes of podcast feeds to the episode "
+                    "catalog file of the skill.")
+    parser.add_argument("feeds", nargs="+", metavar="FEED",
+                        help="RSS or Atom feed file")
+    parser.add_argument("--catalog", default=catalog.DEFAULT_PATH,
+                        help="catalog file, {} by default, started from "
+                             "data.AUDIO_DATA if it doesn't exist".format(
+                                 catalog.DEFAULT_PATH))
+    parser.add_argument("--search-index", default=search.DEFAULT_PATH,
+                        help="title search index rebuilt with the catalog, "
+                             "{} by default".format(search.DEFAULT_PATH))
+    parser.add_argument("--force", action="store_true",
+                        help="parse the feeds even if they did not change")
+    args = parser.parse_args(argv)
+
+    count = ingest(args.feeds, args.catalog, args.search_index, args.force)
+    print("Added {} episodes to {}".format(count, args.catalog))
+
+
+if __name__ == "__main__":
+    main()
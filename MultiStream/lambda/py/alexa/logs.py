@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import random
+from typing import Dict, List, Tuple
+from ask_sdk_core.handler_input import HandlerInput
+from ask_sdk_core.serialize import DefaultSerializer
+from . import envelope
+
+# Share of requests logged per request type, first match wins. A
+# pattern is a request type, or a prefix followed by ``*``. Records at
+# ERROR level and above are never sampled out.
+DEFAULT_SAMPLE_RATES = (
+    ("AudioPlayer.PlaybackFailed", 1.0),
+    ("System.ExceptionEncountered", 1.0),
+    ("AudioPlayer.*", 0.01),
+)  # type: Tuple[Tuple[str, float], ...]
+
+_serializer = DefaultSerializer()
+_rng = random.Random()
+_rate_by_type = {}  # type: Dict[str, float]
+
+
+def parse_sample_rates(value):
+    """Parse ``"AudioPlayer.*=0.01,LaunchRequest=1"`` into rate pairs."""
+    # type: (str) -> List[Tuple[str, float]]
+    rates = []
+    for item in value.split(","):
+        if item.strip():
+            pattern, rate = item.split("=")
+            rates.append((pattern.strip(), float(rate)))
+    return rates
+
+
+# LOG_SAMPLE_RATES takes precedence over the defaults
+SAMPLE_RATES = tuple(parse_sample_rates(
+    os.environ.get("LOG_SAMPLE_RATES", ""))) + DEFAULT_SAMPLE_RATES
+
+
+class JsonLine(object):
+    """Log message written as a compact JSON object.
+
+    Fields, request and response models included, are only serialized
+    when a handler emits the record.
+    """
+    __slots__ = ("event", "fields")
+
+    def __init__(self, event, **fields):
+        # type: (str, object) -> None
+        self.event = event
+        self.fields = fields
+
+    def __str__(self):
+        # type: () -> str
+        record = {"event": self.event}
+        for key, value in self.fields.items():
+            record[key] = _serializer.serialize(value)
+        return json.dumps(record, separators=(",", ":"), default=str)
+
+
+def sample_rate(request_type):
+    # type: (str) -> float
+    try:
+        return _rate_by_type[request_type]
+    except KeyError:
+        pass
+
+    rate = 1.0
+    for pattern, pattern_rate in SAMPLE_RATES:
+        if (request_type == pattern or pattern.endswith("*") and
+                request_type.startswith(pattern[:-1])):
+            rate = pattern_rate
+            break
+    _rate_by_type[request_type] = rate
+    return rate
+
+
+def sampled(request_type):
+    """Draw whether a request of the type is logged."""
+    # type: (str) -> bool
+    rate = sample_rate(request_type)
+    return rate >= 1 or _rng.random() < rate
+
+
+def is_sampled(handler_input):
+    """Whether the request is logged, drawn once per request."""
+    # type: (HandlerInput) -> bool
+    request_attributes = handler_input.attributes_manager.request_attributes
+    decision = request_attributes.get("log_sampled")
+    if decision is None:
+        decision = sampled(envelope.get_request_type(handler_input))
+        request_attributes["log_sampled"] = decision
+    return decision
+
+
+def log(logger, level, handler_input, event, **fields):
+    """Log a JSON line for the request, if it is sampled."""
+    # type: (logging.Logger, int, HandlerInput, str, object) -> None
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.ERROR and not is_sampled(handler_input):
+        return
+    logger.log(level, "%s", JsonLine(event, **fields))
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from ask_sdk_model import RequestEnvelope
+from ask_sdk_core.attributes_manager import AbstractPersistenceAdapter
+from ask_sdk_core.exceptions import PersistenceException
+from ask_sdk_dynamodb.partition_keygen import user_id_partition_keygen
+
+logger = logging.getLogger(__name__)
+
+
+def diff_attributes(old, new, path=()):
+    """Compare two attribute dicts and return the changed field paths.
+
+    Nested dicts are compared key by key, so that a change of
+    ``playback_info["index"]`` is reported as the single path
+    ``("playback_info", "index")`` rather than the whole map.
+    """
+    # type: (Dict, Dict, Tuple) -> Tuple[List[Tuple[Tuple, object]], List[Tuple]]
+    updates = []
+    removals = []
+    for key, value in new.items():
+        if key not in old:
+            updates.append((path + (key,), value))
+        elif value != old[key]:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                sub_updates, sub_removals = diff_attributes(
+                    old[key], value, path + (key,))
+                updates.extend(sub_updates)
+                removals.extend(sub_removals)
+            else:
+                updates.append((path + (key,), value))
+
+    for key in old:
+        if key not in new:
+            removals.append(path + (key,))
+
+    return updates, removals
+
+
+class WriteConflict(Exception):
+    """The item changed since its attributes were read."""
+
+
+class PartialUpdateDynamoDbAdapter(AbstractPersistenceAdapter):
+    """DynamoDb adapter that only writes the attributes that changed.
+
+    The attributes are snapshotted when they are read. On save, the
+    snapshot is compared with the current attributes and:
+
+        - nothing is written if they are equal,
+        - an UpdateItem with only the changed fields is sent otherwise,
+        - a full PutItem is sent for new users (no item was read).
+
+    The number of skipped, partial and full writes is kept in ``stats``,
+    with the number of ``update_attributes`` calls, which write without
+    reading the item first.
+
+    Unlike the SDK ``DynamoDbAdapter``, whose module creates a boto3
+    resource when it is imported, boto3 is imported and the resource
+    created on the first call to DynamoDb, so requests not using
+    persistence never pay for them. The table is expected to exist, see
+    ``alexa.provision``.
+    """
+    def __init__(self, table_name, partition_key_name="id",
+                 attribute_name="attributes",
+                 partition_keygen=user_id_partition_keygen,
+                 dynamodb_resource=None):
+        # type: (str, str, str, Callable[[RequestEnvelope], str], object) -> None
+        self.table_name = table_name
+        self.partition_key_name = partition_key_name
+        self.attribute_name = attribute_name
+        self.partition_keygen = partition_keygen
+        self.stats = {"skipped": 0, "partial": 0, "full": 0, "blind": 0}
+        self._dynamodb = dynamodb_resource
+        self._snapshots = {}  # type: Dict[str, Dict]
+
+    @property
+    def dynamodb(self):
+        """DynamoDb resource, created on first use."""
+        # type: () -> object
+        if self._dynamodb is None:
+            import boto3
+            self._dynamodb = boto3.resource("dynamodb")
+        return self._dynamodb
+
+    @dynamodb.setter
+    def dynamodb(self, dynamodb_resource):
+        # type: (object) -> None
+        self._dynamodb = dynamodb_resource
+
+    def connect(self):
+        """Create the resource now rather than on first use."""
+        # type: () -> None
+        self._table()
+
+    def _table(self):
+        # type: () -> object
+        return self.dynamodb.Table(self.table_name)
+
+    def _persistence_error(self, e, action):
+        # type: (Exception, str) -> Exception
+        if type(e).__name__ == "ConditionalCheckFailedException":
+            return WriteConflict(str(e))
+        if type(e).__name__ in ("ResourceNotFoundException",
+                                "ResourceNotExistsError"):
+            # The runtime never creates the table
+            return PersistenceException(
+                "DynamoDb table {} doesn't exist. Failed to {} DynamoDb "
+                "table. Create the table once with "
+                "'python -m alexa.provision'.".format(
+                    self.table_name, action))
+        return PersistenceException(
+            "Failed to {} DynamoDb table. Exception of type {} occurred: "
+            "{}".format(action, type(e).__name__, str(e)))
+
+    def _read_item(self, partition_key_val):
+        """Read the item of the partition key, None if there is none."""
+        # type: (str) -> Optional[Dict]
+        try:
+            response = self._table().get_item(
+                Key={self.partition_key_name: partition_key_val},
+                ConsistentRead=True)
+        except Exception as e:
+            raise self._persistence_error(
+                e, "retrieve attributes from")
+        return response.get("Item")
+
+    def _put_item(self, partition_key_val, attributes, item_updates=(),
+                  condition=None):
+        """Send a PutItem with the attributes.
+
+        ``item_updates`` and ``condition`` are as for ``_update_item``.
+        """
+        # type: (str, Dict, Sequence[Tuple[str, object]], Optional[Tuple[str, Dict, Dict]]) -> None
+        item = {self.partition_key_name: partition_key_val,
+                self.attribute_name: attributes}
+        item.update(item_updates)
+        kwargs = {"Item": item}
+        if condition is not None:
+            condition_expression, names, values = condition
+            kwargs["ConditionExpression"] = condition_expression
+            kwargs["ExpressionAttributeNames"] = names
+            if values:
+                kwargs["ExpressionAttributeValues"] = values
+
+        try:
+            self._table().put_item(**kwargs)
+        except Exception as e:
+            raise self._persistence_error(e, "save attributes to")
+
+    def get_attributes(self, request_envelope):
+        # type: (RequestEnvelope) -> Dict[str, object]
+        partition_key_val = self.partition_keygen(request_envelope)
+        item = self._read_item(partition_key_val)
+        attributes = item[self.attribute_name] if item is not None else {}
+        self._snapshots[partition_key_val] = deepcopy(attributes)
+        return attributes
+
+    def save_attributes(self, request_envelope, attributes):
+        # type: (RequestEnvelope, Dict[str, object]) -> None
+        partition_key_val = self.partition_keygen(request_envelope)
+        snapshot = self._snapshots.pop(partition_key_val, None)
+
+        if not snapshot:
+            # New user, or attributes never read through this adapter
+            self.stats["full"] += 1
+            self._put_item(partition_key_val, attributes)
+            return
+
+        updates, removals = diff_attributes(snapshot, attributes)
+        if not updates and not removals:
+            self.stats["skipped"] += 1
+            logger.debug("Persistent attributes unchanged, skipping write")
+            return
+
+        self.stats["partial"] += 1
+        self._update_item(partition_key_val, updates, removals)
+
+    def update_attributes(self, request_envelope, updates):
+        """Set attribute paths of an existing item without reading it.
+
+        ``updates`` maps attribute paths, like ``("playback_info",
+        "offset_in_ms")``, to their value. Returns False, and writes
+        nothing, if the user has no item.
+        """
+        # type: (RequestEnvelope, Dict[Tuple, object]) -> bool
+        partition_key_val = self.partition_keygen(request_envelope)
+        return self._blind_update(partition_key_val, list(updates.items()))
+
+    def _blind_update(self, partition_key_val, updates, item_increments=()):
+        # type: (str, List[Tuple[Tuple, object]], Sequence[Tuple[str, int]]) -> bool
+        self.stats["blind"] += 1
+        try:
+            self._update_item(
+                partition_key_val, updates, [],
+                condition=("attribute_exists(#key)",
+                           {"#key": self.partition_key_name}, {}),
+                item_increments=item_increments)
+        except WriteConflict:
+            logger.warning("No persistent attributes to update for "
+                           "{}".format(partition_key_val))
+            return False
+        return True
+
+    def delete_attributes(self, request_envelope):
+        # type: (RequestEnvelope) -> None
+        partition_key_val = self.partition_keygen(request_envelope)
+        self._snapshots.pop(partition_key_val, None)
+        try:
+            self._table().delete_item(
+                Key={self.partition_key_name: partition_key_val})
+        except Exception as e:
+            raise self._persistence_error(e, "delete attributes in")
+
+    def _update_item(self, partition_key_val, updates, removals,
+                     item_updates=(), condition=None, item_increments=()):
+        """Send an UpdateItem for the changed attribute paths.
+
+        ``item_updates`` are (name, value) pairs set on the item itself,
+        next to the attributes map, and ``item_increments`` (name,
+        amount) pairs added to numbers of the item. ``condition`` is an
+        optional (expression, names, values) tuple the write is
+        conditional on.
+        """
+        # type: (str, List[Tuple[Tuple, object]], List[Tuple], Sequence[Tuple[str, object]], Optional[Tuple[str, Dict, Dict]], Sequence[Tuple[str, int]]) -> None
+        names = {"#attr": self.attribute_name}
+        values = {}
+        aliases = {}
+
+        def alias(path):
+            segments = ["#attr"]
+            for segment in path:
+                if segment not in aliases:
+                    aliases[segment] = "#n{}".format(len(aliases))
+                    names[aliases[segment]] = segment
+                segments.append(aliases[segment])
+            return ".".join(segments)
+
+        set_clauses = []
+        for i, (path, value) in enumerate(updates):
+            values[":v{}".format(i)] = value
+            set_clauses.append("{} = :v{}".format(alias(path), i))
+        for i, (name, value) in enumerate(item_updates):
+            names["#i{}".format(i)] = name
+            values[":i{}".format(i)] = value
+            set_clauses.append("#i{0} = :i{0}".format(i))
+        add_clauses = []
+        for i, (name, amount) in enumerate(item_increments):
+            names["#a{}".format(i)] = name
+            values[":a{}".format(i)] = amount
+            add_clauses.append("#a{0} :a{0}".format(i))
+        remove_clauses = [alias(path) for path in removals]
+
+        expression = ""
+        if set_clauses:
+            expression += "SET " + ", ".join(set_clauses)
+        if add_clauses:
+            expression += " ADD " + ", ".join(add_clauses)
+        if remove_clauses:
+            expression += " REMOVE " + ", ".join(remove_clauses)
+
+        kwargs = {
+            "Key": {self.partition_key_name: partition_key_val},
+            "UpdateExpression": expression.strip(),
+            "ExpressionAttributeNames": names
+        }
+        if condition is not None:
+            condition_expression, condition_names, condition_values = (
+                condition)
+            kwargs["ConditionExpression"] = condition_expression
+            names.update(condition_names)
+            values.update(condition_values)
+        if values:
+            kwargs["ExpressionAttributeValues"] = values
+
+        logger.debug("Updating persistent attributes: {}".format(
+            kwargs["UpdateExpression"]))
+        try:
+            self._table().update_item(**kwargs)
+        except Exception as e:
+            raise self._persistence_error(e, "update attributes in")
+
+
+class VersionedCacheDynamoDbAdapter(PartialUpdateDynamoDbAdapter):
+    """Partial update adapter with a per-container cache of attributes.
+
+    Attributes read or written are kept in a bounded LRU cache keyed by
+    partition key, so a warm container serving the same user again
+    does not read the table. Requests matched by the ``read_through``
+    predicate, whose handlers act on the latest state of the user, read
+    the item from the table even when it is cached.
+
+    To never act on stale attributes, every item carries a ``version``
+    number, incremented on each write and checked by a condition on the
+    write. When the check fails, the item was written elsewhere since
+    it was read: the entry is dropped and ``WriteConflict`` raised, as
+    changes made from stale attributes can't be merged with newer ones.
+    ``handle`` runs the request again on the item read from the table,
+    up to ``max_conflict_retries`` times.
+
+    Cache hits, misses, reads through the cache, evictions and write
+    conflicts are counted in ``stats`` next to the write counters.
+    """
+    def __init__(self, table_name, cache_size=1000, version_name="version",
+                 max_conflict_retries=3, read_through=None, **kwargs):
+        # type: (str, int, str, int, Optional[Callable[[RequestEnvelope], bool]], object) -> None
+        super(VersionedCacheDynamoDbAdapter, self).__init__(
+            table_name, **kwargs)
+        self.cache_size = cache_size
+        self.version_name = version_name
+        self.max_conflict_retries = max_conflict_retries
+        self.read_through = read_through
+        self.stats.update(hits=0, misses=0, read_throughs=0, evictions=0,
+                          conflicts=0)
+        # partition key -> (version, attributes); cached attributes are
+        # never handed out, only copies of them
+        self._cache = OrderedDict()  # type: OrderedDict
+        self._versions = {}  # type: Dict[str, Optional[int]]
+
+    @property
+    def hit_rate(self):
+        # type: () -> float
+        reads = self.stats["hits"] + self.stats["misses"]
+        return float(self.stats["hits"]) / reads if reads else 0.0
+
+    def _read_version(self, partition_key_val):
+        """Read the version and attributes of the item.
+
+        The version is None when there is no item, and 0 for items
+        written before versioning.
+        """
+        # type: (str) -> Tuple[Optional[int], Dict]
+        item = self._read_item(partition_key_val)
+        if item is None:
+            return None, {}
+        return (int(item.get(self.version_name, 0)),
+                item[self.attribute_name])
+
+    def _cache_put(self, partition_key_val, version, attributes):
+        # type: (str, Optional[int], Dict) -> None
+        self._cache[partition_key_val] = (version, attributes)
+        self._cache.move_to_end(partition_key_val)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_attributes(self, request_envelope):
+        # type: (RequestEnvelope) -> Dict[str, object]
+        partition_key_val = self.partition_keygen(request_envelope)
+        fresh = (self.read_through is not None and
+                 self.read_through(request_envelope))
+        entry = None if fresh else self._cache.get(partition_key_val)
+        if entry is None:
+            self.stats["read_throughs" if fresh else "misses"] += 1
+            entry = self._read_version(partition_key_val)
+            self._cache_put(partition_key_val, *entry)
+        else:
+            self.stats["hits"] += 1
+            self._cache.move_to_end(partition_key_val)
+
+        version, attributes = entry
+        self._versions[partition_key_val] = version
+        self._snapshots[partition_key_val] = attributes
+        return deepcopy(attributes)
+
+    def update_attributes(self, request_envelope, updates):
+        """Set attribute paths of an existing item without reading it.
+
+        The item version is incremented, so writes based on attributes
+        read before conflict, and the cached attributes of the user are
+        dropped.
+        """
+        # type: (RequestEnvelope, Dict[Tuple, object]) -> bool
+        partition_key_val = self.partition_keygen(request_envelope)
+        self._cache.pop(partition_key_val, None)
+        return self._blind_update(
+            partition_key_val, list(updates.items()),
+            item_increments=[(self.version_name, 1)])
+
+    def _condition(self, version):
+        # type: (Optional[int]) -> Tuple[str, Dict, Dict]
+        if version is None:
+            return ("attribute_not_exists(#key)",
+                    {"#key": self.partition_key_name}, {})
+        if version == 0:
+            return ("attribute_not_exists(#version)",
+                    {"#version": self.version_name}, {})
+        return ("#version = :version", {"#version": self.version_name},
+                {":version": version})
+
+    def _write(self, partition_key_val, version, snapshot, attributes):
+        """Write the attributes if the item is still at ``version``.
+
+        Returns the version of the item after the write.
+        """
+        # type: (str, Optional[int], Dict, Dict) -> Optional[int]
+        if not snapshot:
+            self.stats["full"] += 1
+            self._put_item(
+                partition_key_val, attributes,
+                item_updates=[(self.version_name, (version or 0) + 1)],
+                condition=self._condition(version))
+            return (version or 0) + 1
+
+        updates, removals = diff_attributes(snapshot, attributes)
+        if not updates and not removals:
+            self.stats["skipped"] += 1
+            logger.debug("Persistent attributes unchanged, skipping write")
+            return version
+
+        self.stats["partial"] += 1
+        self._update_item(
+            partition_key_val, updates, removals,
+            item_updates=[(self.version_name, (version or 0) + 1)],
+            condition=self._condition(version))
+        return (version or 0) + 1
+
+    def save_attributes(self, request_envelope, attributes):
+        # type: (RequestEnvelope, Dict[str, object]) -> None
+        partition_key_val = self.partition_keygen(request_envelope)
+        snapshot = self._snapshots.pop(partition_key_val, None)
+        version = self._versions.pop(partition_key_val, None)
+        if snapshot is None:
+            # Attributes never read in this request, or already saved
+            version, snapshot = (self._cache.get(partition_key_val) or
+                                 self._read_version(partition_key_val))
+
+        try:
+            written = self._write(
+                partition_key_val, version, snapshot, attributes)
+        except WriteConflict:
+            self.stats["conflicts"] += 1
+            logger.debug("Persistent attributes changed since read")
+            self._cache.pop(partition_key_val, None)
+            raise
+
+        if written != version:
+            self._cache_put(partition_key_val, written, deepcopy(attributes))
+
+    def handle(self, invoke):
+        """Return ``invoke()``, called again while saving the attributes
+        it read conflicts with a write made elsewhere.
+
+        ``invoke`` handles the whole request, reading the attributes
+        again on each call, from the table since the conflicting entry
+        was dropped. Its side effects outside the attributes must be
+        idempotent per request. The attributes read and not saved, when
+        ``invoke`` raises, are forgotten after each call, as a container
+        handles one request at a time.
+        """
+        # type: (Callable[[], object]) -> object
+        for attempt in range(self.max_conflict_retries + 1):
+            try:
+                return invoke()
+            except WriteConflict:
+                if attempt == self.max_conflict_retries:
+                    raise PersistenceException(
+                        "Failed to save attributes to DynamoDb table. The "
+                        "item kept changing after {} attempts.".format(
+                            self.max_conflict_retries + 1))
+                logger.info("Persistent attributes changed while handling "
+                            "the request, handling it again")
+            finally:
+                self._snapshots.clear()
+                self._versions.clear()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import random
+import sys
+from array import array
+from typing import Dict, Iterator, Optional, Sequence, Union
+
+# Stored form of the play order in ``playback_info["play_order"]``:
+#   - identity order: {"length": n}
+#   - shuffled order: {"length": n, "seed": s}, see FeistelPermutation
+#   - any other order: {"length": n, "packed": <order>, "inverse": <inverse>}
+#     where both are little-endian uint arrays and ``inverse[token]`` is
+#     the position of catalog index ``token`` in the order.
+# Lists of numbers written by older versions of the skill are still
+# accepted by ``decode``.
+
+FEISTEL_ROUNDS = 4
+
+
+class FeistelPermutation(object):
+    """Seeded permutation of ``range(length)`` computed on demand.
+
+    A balanced Feistel network is a bijection over ``[0, 2 ** bits)``;
+    values falling outside ``range(length)`` are walked through the
+    network again until they land inside it ("cycle walking"). As
+    ``2 ** bits < 4 * length``, an item and its position are found in
+    a few rounds, without building or storing the shuffled list.
+
+    With ``inverse`` set, indexing maps an item back to its position.
+    """
+    def __init__(self, length, seed, inverse=False):
+        # type: (int, int, bool) -> None
+        self.length = length
+        self.seed = seed
+        self.inverse = inverse
+        half_bits = (max(length - 1, 1).bit_length() + 1) // 2
+        self._half_bits = half_bits
+        self._mask = (1 << half_bits) - 1
+        rng = random.Random(seed)
+        self._keys = [rng.getrandbits(32) for _ in range(FEISTEL_ROUNDS)]
+
+    def _round(self, value, key):
+        # type: (int, int) -> int
+        value = ((value + key) * 0x9E3779B1) & 0xFFFFFFFF
+        value ^= value >> 15
+        value = (value * 0x85EBCA6B) & 0xFFFFFFFF
+        value ^= value >> 13
+        return value & self._mask
+
+    def _encrypt(self, value):
+        # type: (int) -> int
+        left, right = value >> self._half_bits, value & self._mask
+        for key in self._keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self._half_bits) | right
+
+    def _decrypt(self, value):
+        # type: (int) -> int
+        left, right = value >> self._half_bits, value & self._mask
+        for key in reversed(self._keys):
+            left, right = right ^ self._round(left, key), left
+        return (left << self._half_bits) | right
+
+    def __len__(self):
+        # type: () -> int
+        return self.length
+
+    def __getitem__(self, i):
+        # type: (int) -> int
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("permutation index out of range")
+        step = self._decrypt if self.inverse else self._encrypt
+        value = step(i)
+        while value >= self.length:
+            value = step(value)
+        return value
+
+    def __iter__(self):
+        # type: () -> Iterator[int]
+        return (self[i] for i in range(self.length))
+
+
+class PlayOrder(object):
+    """Play order together with its inverse permutation.
+
+    ``order[position]`` gives the catalog index played at ``position``
+    and ``order.index(token)`` the position of catalog index ``token``,
+    both in constant time.
+    """
+    def __init__(self, order, inverse=None):
+        # type: (Sequence[int], Optional[Sequence[int]]) -> None
+        self.order = order
+        self.inverse = inverse if inverse is not None else _invert(order)
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.order)
+
+    def __getitem__(self, position):
+        # type: (int) -> int
+        return self.order[position]
+
+    def __iter__(self):
+        # type: () -> Iterator[int]
+        return iter(self.order)
+
+    def index(self, token):
+        # type: (int) -> int
+        if not 0 <= token < len(self.inverse):
+            raise ValueError("{} is not in play order".format(token))
+        return self.inverse[token]
+
+    @property
+    def is_identity(self):
+        # type: () -> bool
+        return isinstance(self.order, range)
+
+
+def _typecode(length):
+    # type: (int) -> str
+    return "H" if length <= 0xFFFF else "I"
+
+
+def _invert(order):
+    # type: (Sequence[int]) -> Sequence[int]
+    if isinstance(order, range) and order.start == 0 and order.step == 1:
+        return order
+    inverse = array(_typecode(len(order)), [0]) * len(order)
+    for position, token in enumerate(order):
+        inverse[token] = position
+    return inverse
+
+
+def _pack(values):
+    # type: (Sequence[int]) -> bytes
+    packed = array(_typecode(len(values)), values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(packed, length):
+    # type: (object, int) -> array
+    # boto3 returns binary attributes wrapped in a Binary object
+    packed = getattr(packed, "value", packed)
+    values = array(_typecode(length))
+    values.frombytes(bytes(packed))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def identity(length):
+    # type: (int) -> PlayOrder
+    return PlayOrder(range(length), range(length))
+
+
+def shuffled(length, seed=None):
+    """Return a shuffled play order defined only by its seed."""
+    # type: (int, Optional[int]) -> PlayOrder
+    if seed is None:
+        seed = random.getrandbits(32)
+    return PlayOrder(FeistelPermutation(length, seed),
+                     FeistelPermutation(length, seed, inverse=True))
+
+
+def encode(order):
+    """Return the compact stored form of a play order."""
+    # type: (Sequence[int]) -> Dict
+    if not isinstance(order, PlayOrder):
+        order = PlayOrder(order)
+
+    length = len(order)
+    if isinstance(order.order, FeistelPermutation):
+        return {"length": length, "seed": order.order.seed}
+    if order.is_identity or all(
+            i == token for i, token in enumerate(order)):
+        return {"length": length}
+
+    return {"length": length,
+            "packed": _pack(order.order),
+            "inverse": _pack(order.inverse)}
+
+
+def decode(stored):
+    """Build the play order from its stored form.
+
+    Identity orders decode to ranges, shuffled orders to Feistel
+    permutations and packed orders to arrays, so decoding never
+    converts element by element.
+    """
+    # type: (Union[Dict, Sequence]) -> PlayOrder
+    if not isinstance(stored, dict):
+        # Legacy list of DynamoDB Decimals
+        return PlayOrder([int(l) for l in stored])
+
+    length = int(stored["length"])
+    if stored.get("seed") is not None:
+        return shuffled(length, int(stored["seed"]))
+    if stored.get("packed") is None:
+        return identity(length)
+
+    order = _unpack(stored["packed"], length)
+    if stored.get("inverse") is None:
+        return PlayOrder(order)
+    return PlayOrder(order, _unpack(stored["inverse"], length))
+
+
+def stored_length(stored):
+    """Length of a play order in stored form, without decoding it."""
+    # type: (Union[Dict, Sequence]) -> int
+    if isinstance(stored, dict):
+        return int(stored["length"])
+    return len(stored)
+
+
+def signature(stored):
+    """Short string naming a play order in stored form.
+
+    Two stored forms with the same signature decode to the same order.
+    """
+    # type: (Dict) -> str
+    if stored.get("seed") is not None:
+        return "{}:{}".format(int(stored["length"]), int(stored["seed"]))
+    if stored.get("packed") is None:
+        return str(int(stored["length"]))
+    packed = getattr(stored["packed"], "value", stored["packed"])
+    return "{}:{}".format(int(stored["length"]), hashlib.blake2b(
+        bytes(packed), digest_size=8).hexdigest())
+
+
+def needs_upgrade(stored):
+    """Check if the stored form was written by an older version."""
+    # type: (Union[Dict, Sequence]) -> bool
+    return not isinstance(stored, dict) or (
+        stored.get("packed") is not None and stored.get("inverse") is None)
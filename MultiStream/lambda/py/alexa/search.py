@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""Episode title search.
+
+The index is built offline, with the catalog by ``alexa.catalog`` and
+``alexa.feed``, or again from the catalog, from the ``lambda/py``
+directory::
+
+    python -m alexa.search [--output PATH]
+
+and memory-mapped by the skill on the first search. Titles and queries are
+normalised to lowercase ascii words, numbers written in words become
+digits, and each query word matches the title words equal to it,
+starting with it, or sharing most of their trigrams with it, so titles
+misheard by speech recognition are still found.
+"""
+
+import argparse
+import heapq
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import unicodedata
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import catalog
+
+logger = logging.getLogger(__name__)
+
+# File layout, little-endian:
+#   header:    magic, version, title count, term count, trigram count,
+#              the offset of each section, and the catalog revision
+#   terms:     per term in sorted order, the offset and length of the
+#              term in the string table, and the offset and count of
+#              its titles in the postings
+#   trigrams:  per trigram hash in sorted order, the offset and count of
+#              its terms in the trigram postings
+#   titles:    per title, the offset and count of its terms in the title
+#              terms
+#   strings, postings, trigram postings and title terms: utf-8 terms and
+#              uint32 arrays
+MAGIC = b"ASRC"
+VERSION = 1
+HEADER = struct.Struct("<4sIIII7QQ")
+TERM = struct.Struct("<IIII")
+TRIGRAM = struct.Struct("<III")
+TITLE = struct.Struct("<II")
+UINT = struct.Struct("<I")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "search.bin")
+
+# Matches scoring below this share of the query are not returned
+MIN_SCORE = 0.5
+PREFIX_WEIGHT = 0.8
+MIN_SIMILARITY = 0.5
+MAX_EXPANSIONS = 10
+# Words in more titles than this only score the RESCORED best titles
+# found with the rarer words, unless the query has no rarer word
+MAX_CANDIDATES = 1000
+RESCORED = 20
+
+_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19}
+_TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60,
+    "seventy": 70, "eighty": 80, "ninety": 90}
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _numbers(groups):
+    """Digits of a run of numbers said in words, eg "twenty eighteen"."""
+    # type: (List[int]) -> List[str]
+    words = []
+    i = 0
+    while i < len(groups):
+        if (i + 1 < len(groups) and 10 <= groups[i] <= 99 and
+                10 <= groups[i + 1] <= 99):
+            # A year
+            words.append(str(groups[i] * 100 + groups[i + 1]))
+            i += 2
+        else:
+            words.append(str(groups[i]))
+            i += 1
+    return words
+
+
+def normalize(text):
+    """Words of ``text``, as indexed and searched."""
+    # type: (str) -> List[str]
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = text.encode("ascii", "ignore").decode("ascii")
+    words = []  # type: List[str]
+    groups = []  # type: List[int]
+    after_tens = False
+    for word in _WORD.findall(text):
+        if word in _TENS:
+            groups.append(_TENS[word])
+            after_tens = True
+            continue
+        if word in _UNITS:
+            if after_tens and _UNITS[word] < 10:
+                # "twenty two"
+                groups[-1] += _UNITS[word]
+            else:
+                groups.append(_UNITS[word])
+            after_tens = False
+            continue
+
+        after_tens = False
+        words.extend(_numbers(groups))
+        groups = []
+        words.append(str(int(word)) if word.isdigit() else word)
+    words.extend(_numbers(groups))
+    return words
+
+
+def trigrams(term):
+    # type: (str) -> List[str]
+    padded = "${}$".format(term)
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _trigram_hash(trigram):
+    # type: (str) -> int
+    return zlib.crc32(trigram.encode("utf-8"))
+
+
+def _uints(values):
+    # type: (Iterable[int]) -> bytes
+    packed = array("I", values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def build(titles, revision):
+    """Serialized index of ``titles``, the catalog titles in order."""
+    # type: (Iterable[str], str) -> bytes
+    title_terms = []  # type: List[List[str]]
+    postings = defaultdict(list)  # type: Dict[str, List[int]]
+    for position, title in enumerate(titles):
+        terms = sorted(set(normalize(title)))
+        title_terms.append(terms)
+        for term in terms:
+            postings[term].append(position)
+
+    terms = sorted(postings)
+    term_ids = {term: term_id for term_id, term in enumerate(terms)}
+    trigram_terms = defaultdict(set)  # type: Dict[int, set]
+    for term_id, term in enumerate(terms):
+        for trigram in trigrams(term):
+            trigram_terms[_trigram_hash(trigram)].add(term_id)
+    trigram_hashes = sorted(trigram_terms)
+
+    strings = bytearray()
+    posting_blob = bytearray()
+    term_table = bytearray()
+    for term in terms:
+        encoded = term.encode("utf-8")
+        term_table += TERM.pack(len(strings), len(encoded),
+                                len(posting_blob) // UINT.size,
+                                len(postings[term]))
+        strings += encoded
+        posting_blob += _uints(postings[term])
+
+    trigram_blob = bytearray()
+    trigram_table = bytearray()
+    for trigram_hash in trigram_hashes:
+        ids = sorted(trigram_terms[trigram_hash])
+        trigram_table += TRIGRAM.pack(
+            trigram_hash, len(trigram_blob) // UINT.size, len(ids))
+        trigram_blob += _uints(ids)
+
+    title_blob = bytearray()
+    title_table = bytearray()
+    for terms_of_title in title_terms:
+        title_table += TITLE.pack(len(title_blob) // UINT.size,
+                                  len(terms_of_title))
+        title_blob += _uints(term_ids[term] for term in terms_of_title)
+
+    sections = [term_table, trigram_table, title_table, strings,
+                posting_blob, trigram_blob, title_blob]
+    offsets = []
+    offset = HEADER.size
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+    header = HEADER.pack(MAGIC, VERSION, len(title_terms), len(terms),
+                         len(trigram_hashes), *(offsets + [int(revision, 16)]))
+    return header + b"".join(bytes(section) for section in sections)
+
+
+class SearchIndex(object):
+    """Title search over a serialized index, mapped or in memory."""
+    def __init__(self, buffer):
+        # type: (object) -> None
+        (magic, version, self.title_count, self.term_count,
+         self.trigram_count, self._terms, self._trigrams, self._titles,
+         self._strings, self._postings, self._trigram_postings,
+         self._title_terms, revision) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(
+                "Not a version {} search index".format(VERSION))
+        self.revision = "{:016x}".format(revision)
+        self._buffer = buffer
+
+    def _uint_array(self, section, start, count):
+        # type: (int, int, int) -> array
+        offset = section + start * UINT.size
+        values = array("I")
+        values.frombytes(self._buffer[offset:offset + count * UINT.size])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def term(self, term_id):
+        # type: (int) -> str
+        offset, length, _, _ = TERM.unpack_from(
+            self._buffer, self._terms + term_id * TERM.size)
+        start = self._strings + offset
+        return self._buffer[start:start + length].decode("utf-8")
+
+    def frequency(self, term_id):
+        # type: (int) -> int
+        return TERM.unpack_from(
+            self._buffer, self._terms + term_id * TERM.size)[3]
+
+    def postings(self, term_id):
+        # type: (int) -> array
+        _, _, start, count = TERM.unpack_from(
+            self._buffer, self._terms + term_id * TERM.size)
+        return self._uint_array(self._postings, start, count)
+
+    def title_terms(self, position):
+        # type: (int) -> array
+        start, count = TITLE.unpack_from(
+            self._buffer, self._titles + position * TITLE.size)
+        return self._uint_array(self._title_terms, start, count)
+
+    def _lower_bound(self, word):
+        # type: (str) -> int
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term(middle) < word:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _trigram_terms(self, trigram_hash):
+        # type: (int) -> array
+        low, high = 0, self.trigram_count
+        while low < high:
+            middle = (low + high) // 2
+            entry = TRIGRAM.unpack_from(
+                self._buffer, self._trigrams + middle * TRIGRAM.size)
+            if entry[0] < trigram_hash:
+                low = middle + 1
+            elif entry[0] > trigram_hash:
+                high = middle
+            else:
+                return self._uint_array(
+                    self._trigram_postings, entry[1], entry[2])
+        return array("I")
+
+    def expand(self, word):
+        """Terms matching a query word, with the weight of the match."""
+        # type: (str) -> Dict[int, float]
+        start = self._lower_bound(word)
+        if start < self.term_count and self.term(start) == word:
+            return {start: 1.0}
+
+        matches = {}  # type: Dict[int, float]
+        if len(word) >= 3:
+            term_id = start
+            while (term_id < self.term_count and
+                   len(matches) < MAX_EXPANSIONS and
+                   self.term(term_id).startswith(word)):
+                matches[term_id] = PREFIX_WEIGHT
+                term_id += 1
+
+        word_trigrams = set(trigrams(word))
+        overlaps = Counter()  # type: Dict[int, int]
+        for trigram in word_trigrams:
+            overlaps.update(self._trigram_terms(_trigram_hash(trigram)))
+        # A term of length L matches when 2 * overlap / (q + L) reaches
+        # MIN_SIMILARITY, q the number of trigrams of the word; L >= 1
+        min_overlap = MIN_SIMILARITY * (len(word_trigrams) + 1) / 2
+        similar = []
+        for term_id, overlap in overlaps.items():
+            if overlap < min_overlap or term_id in matches:
+                continue
+            # Terms are ascii: their length is their number of trigrams
+            length = TERM.unpack_from(
+                self._buffer, self._terms + term_id * TERM.size)[1]
+            similarity = 2.0 * overlap / (len(word_trigrams) + length)
+            if similarity >= MIN_SIMILARITY:
+                similar.append((similarity, term_id))
+        for similarity, term_id in heapq.nlargest(MAX_EXPANSIONS, similar):
+            matches[term_id] = min(similarity, PREFIX_WEIGHT)
+        return matches
+
+    def search(self, query):
+        """Catalog position of the title best matching ``query``, None
+        if no title matches well enough.
+
+        Titles are scored from the postings of the rarer words of the
+        query; the words in many titles, which weigh little, only add
+        to the score of the best of them.
+        """
+        # type: (str) -> Optional[int]
+        words = normalize(query)
+        if not words or not self.title_count:
+            return None
+
+        total = 0.0
+        # (title count, weights of the matching terms) per word
+        expansions = []  # type: List[Tuple[int, Dict[int, float]]]
+        for word in words:
+            matches = self.expand(word)
+            if not matches:
+                # Words no title has still count against the match
+                total += math.log(1 + self.title_count)
+                continue
+            weights = {}
+            count = 0
+            for term_id, weight in matches.items():
+                frequency = self.frequency(term_id)
+                weights[term_id] = weight * math.log(
+                    1 + float(self.title_count) / frequency)
+                count += frequency
+            total += max(weights.values())
+            expansions.append((count, weights))
+        if not expansions:
+            return None
+
+        expansions.sort(key=lambda expansion: expansion[0])
+        rare = [weights for count, weights in expansions
+                if count <= MAX_CANDIDATES] or [expansions[0][1]]
+        common = [weights for _, weights in expansions[len(rare):]]
+
+        scores = defaultdict(float)  # type: Dict[int, float]
+        for weights in rare:
+            best = {}  # type: Dict[int, float]
+            for term_id, weight in weights.items():
+                for position in self.postings(term_id):
+                    if best.get(position, 0.0) < weight:
+                        best[position] = weight
+            for position, weight in best.items():
+                scores[position] += weight
+
+        best_rank = None  # type: Optional[Tuple[float, int, int]]
+        for position, score in heapq.nlargest(
+                RESCORED, scores.items(), key=lambda item: item[1]):
+            title_terms = self.title_terms(position)
+            for weights in common:
+                score += max([weights[term_id] for term_id in title_terms
+                              if term_id in weights] or [0.0])
+            rank = (score, -len(title_terms), -position)
+            if best_rank is None or rank > best_rank:
+                best_rank = rank
+
+        if best_rank is None or best_rank[0] < MIN_SCORE * total:
+            return None
+        return -best_rank[2]
+
+
+_index = None  # type: Optional[SearchIndex]
+
+
+def get_index():
+    """Search index of the catalog, loaded on first use.
+
+    The index file is ``SEARCH_INDEX_PATH``, ``search.bin`` next to this
+    module by default, written with the catalog. Without a file, or when
+    the file was built for another catalog revision, the index is built
+    in memory.
+    """
+    # type: () -> SearchIndex
+    global _index
+    if _index is None:
+        episodes = catalog.get_catalog()
+        path = os.environ.get("SEARCH_INDEX_PATH", DEFAULT_PATH)
+        if not os.path.exists(path):
+            logger.warning(
+                "No search index {}, building it in memory. Run "
+                "'python -m alexa.search' after updating the "
+                "catalog.".format(path))
+        else:
+            with open(path, "rb") as index_file:
+                index = SearchIndex(mmap.mmap(
+                    index_file.fileno(), 0, access=mmap.ACCESS_READ))
+            if index.revision == episodes.revision:
+                _index = index
+                return _index
+            logger.warning(
+                "Search index {} was built for another catalog, building "
+                "it in memory. Run 'python -m alexa.search' after "
+                "updating the catalog.".format(path))
+        _index = SearchIndex(build(
+            (episodes[position].get("title")
+             for position in range(len(episodes))),
+            episodes.revision))
+    return _index
+
+
+def write(episodes, path):
+    """Write the search index file of the ``episodes`` catalog."""
+    # type: (catalog.Catalog, str) -> None
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as index_file:
+        index_file.write(build(
+            (episodes[position].get("title")
+             for position in range(len(episodes))),
+            episodes.revision))
+    os.replace(temporary_path, path)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    parser = argparse.ArgumentParser(
+        description="Build the episode title search index of the "
+                    "catalog.")
+    parser.add_argument("--output", default=DEFAULT_PATH,
+                        help="index file, {} by default".format(
+                            DEFAULT_PATH))
+    args = parser.parse_args(argv)
+
+    episodes = catalog.get_catalog()
+    write(episodes, args.output)
+    print("Indexed {} titles to {}".format(len(episodes), args.output))
+
+
+if __name__ == "__main__":
+    main()
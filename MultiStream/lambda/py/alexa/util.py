@@ -1,13 +1,18 @@
 # -*- coding: utf-8 -*-
 
-import random
-from typing import List, Dict
-from ask_sdk_model import IntentRequest, Response
+import os
+from typing import Dict, List, Mapping, Optional, Sequence
+from ask_sdk_model import Response
 from ask_sdk_model.ui import SimpleCard
 from ask_sdk_model.interfaces.audioplayer import (
     PlayDirective, PlayBehavior, AudioItem, Stream, StopDirective)
 from ask_sdk_core.handler_input import HandlerInput
-from . import data
+from . import catalog, cursor, data, envelope, failover, play_order
+
+
+# Number of streams after the current one kept resolved in
+# playback_info["up_next"]
+UP_NEXT_SIZE = int(os.environ.get("UP_NEXT_SIZE", "3"))
 
 
 def get_playback_info(handler_input):
@@ -16,10 +21,38 @@ def get_playback_info(handler_input):
     return persistence_attr.get('playback_info')
 
 
+def in_playback_session(handler_input):
+    # type: (HandlerInput) -> bool
+    return bool(get_playback_info(handler_input).get("in_playback_session"))
+
+
+def get_play_order(handler_input):
+    """Decode the stored play order, once per request."""
+    # type: (HandlerInput) -> play_order.PlayOrder
+    stored = get_playback_info(handler_input).get("play_order")
+    request_attr = handler_input.attributes_manager.request_attributes
+    cached = request_attr.get("play_order")
+    if cached is None or cached[0] is not stored:
+        cached = (stored, play_order.decode(stored))
+        request_attr["play_order"] = cached
+    return cached[1]
+
+
+def set_play_order(handler_input, order):
+    """Store the play order, with its inverse, in compact form."""
+    # type: (HandlerInput, Sequence[int]) -> None
+    if not isinstance(order, play_order.PlayOrder):
+        order = play_order.PlayOrder(order)
+    stored = play_order.encode(order)
+    get_playback_info(handler_input)["play_order"] = stored
+    handler_input.attributes_manager.request_attributes["play_order"] = (
+        stored, order)
+
+
 def can_throw_card(handler_input):
     # type: (HandlerInput) -> bool
     playback_info = get_playback_info(handler_input)
-    if (isinstance(handler_input.request_envelope.request, IntentRequest)
+    if (envelope.get_request_type(handler_input) == "IntentRequest"
             and playback_info.get('playback_index_changed')):
         playback_info['playback_index_changed'] = False
         return True
@@ -30,47 +63,300 @@ def can_throw_card(handler_input):
 def get_token(handler_input):
     """Extracting token received in the request."""
     # type: (HandlerInput) -> str
-    return handler_input.request_envelope.request.token
+    return envelope.get_token(handler_input)
 
 
 def get_index(handler_input):
-    """Extracting index from the token received in the request."""
+    """Extracting index from the token received in the request.
+
+    The token is resolved by the catalog index and its position found
+    with the inverse permutation kept with the play order, so neither
+    lookup scans. Tokens of episodes no longer in the catalog keep the
+    stored index.
+    """
     # type: (HandlerInput) -> int
-    token = int(get_token(handler_input))
-    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    position = token_position(get_token(handler_input))
+    if position is None:
+        return get_playback_info(handler_input).get("index")
+    return get_play_order(handler_input).index(position)
+
+
+def sync_catalog(handler_input):
+    """Move the playback info to the current revision of the catalog.
 
-    return persistent_attr.get("playback_info").get("play_order").index(token)
+    The play order is rebuilt if the catalog length changed, and the
+    index set back to the episode of the stored token, so a catalog
+    update doesn't resume users on another episode.
+    """
+    # type: (HandlerInput) -> None
+    episodes = catalog.get_catalog()
+    playback_info = get_playback_info(handler_input)
+    if play_order.stored_length(
+            playback_info.get("play_order")) != len(episodes):
+        setting = handler_input.attributes_manager.persistent_attributes.get(
+            "playback_setting")
+        set_play_order(handler_input, shuffle_order()
+                       if setting.get("shuffle") else range(len(episodes)))
+
+    position = token_position(playback_info.get("token"))
+    if position is not None:
+        # The token itself is kept: it is the expected previous token of
+        # the next enqueue, and must match the one the device plays.
+        playback_info["index"] = get_play_order(handler_input).index(position)
+    else:
+        if playback_info.get("token") is not None:
+            # The episode left the catalog
+            playback_info["offset_in_ms"] = 0
+        if not 0 <= playback_info.get("index") < len(episodes):
+            playback_info["index"] = 0
+    playback_info["catalog_revision"] = episodes.revision
+
+
+def token_position(token):
+    """Catalog position of the episode of a stream token, None if
+    unknown."""
+    # type: (Optional[str]) -> Optional[int]
+    codec = cursor.get_codec()
+    if codec is not None:
+        decoded = codec.decode(token)
+        if decoded is not None:
+            return catalog.get_catalog().position(decoded.key)
+    return catalog.get_catalog().resolve(token)
+
+
+def stream_token(handler_input, position):
+    """Token of the stream of the episode at catalog ``position``.
+
+    In stateless mode, the token is a cursor with the play order of the
+    user, unless the play order is neither the catalog order nor a
+    shuffle, which a cursor can't carry.
+    """
+    # type: (HandlerInput, int) -> str
+    episodes = catalog.get_catalog()
+    codec = cursor.get_codec()
+    stored = get_playback_info(handler_input).get("play_order")
+    if (codec is None or not isinstance(stored, dict) or
+            stored.get("packed") is not None):
+        return episodes.token(position)
+
+    seed = stored.get("seed")
+    return codec.encode(cursor.Cursor(
+        key=episodes.key(position), seed=int(seed or 0),
+        shuffle=seed is not None, revision=int(episodes.revision, 16)))
+
+
+def get_cursor(handler_input):
+    """Cursor of the token of an AudioPlayer event, in stateless mode.
+
+    None outside of stateless mode, and for tokens that aren't a cursor
+    of the current catalog revision, whose events are handled from the
+    persistent attributes.
+    """
+    # type: (HandlerInput) -> Optional[cursor.Cursor]
+    codec = cursor.get_codec()
+    if codec is None:
+        return None
+    request_attr = handler_input.attributes_manager.request_attributes
+    if "cursor" not in request_attr:
+        decoded = codec.decode(get_token(handler_input))
+        if decoded is not None and decoded.revision != int(
+                catalog.get_catalog().revision, 16):
+            decoded = None
+        request_attr["cursor"] = decoded
+    return request_attr["cursor"]
+
+
+def cursor_play_order(playback_cursor):
+    # type: (cursor.Cursor) -> play_order.PlayOrder
+    length = len(catalog.get_catalog())
+    if playback_cursor.shuffle:
+        return play_order.shuffled(length, playback_cursor.seed)
+    return play_order.identity(length)
+
+
+def cursor_index(playback_cursor):
+    """Position of the stream of the cursor in its play order."""
+    # type: (cursor.Cursor) -> int
+    return cursor_play_order(playback_cursor).index(
+        catalog.get_catalog().position(playback_cursor.key))
+
+
+def next_cursor(handler_input, playback_cursor):
+    """Cursor of the stream after the one of ``playback_cursor``.
+
+    None at the end of the play order, unless looping. Only then are the
+    persistent attributes read, for the loop setting.
+    """
+    # type: (HandlerInput, cursor.Cursor) -> Optional[cursor.Cursor]
+    episodes = catalog.get_catalog()
+    order = cursor_play_order(playback_cursor)
+    next_index = (order.index(episodes.position(playback_cursor.key)) +
+                  1) % len(episodes)
+    if next_index == 0 and not (
+            handler_input.attributes_manager.persistent_attributes.get(
+                "playback_setting") or {}).get("loop"):
+        return None
+    return playback_cursor._replace(key=episodes.key(order[next_index]))
+
+
+def sync_player_token(handler_input):
+    """Move the playback info to the stream the device plays.
+
+    In stateless mode, streams enqueued from a cursor don't update the
+    playback info: the token the device reports is used instead.
+    """
+    # type: (HandlerInput) -> None
+    playback_info = get_playback_info(handler_input)
+    token = envelope.get_player_token(handler_input)
+    if token is None or token == playback_info.get("token"):
+        return
+    decoded = cursor.get_codec().decode(token)
+    if decoded is None:
+        return
+    position = catalog.get_catalog().position(decoded.key)
+    if position is not None:
+        playback_info["token"] = token
+        playback_info["index"] = get_play_order(handler_input).index(
+            position)
+
+
+def _step(index, length, loop, delta):
+    """Index ``delta`` streams away in a play order, None past its ends
+    when not looping."""
+    # type: (int, int, bool, int) -> Optional[int]
+    stepped = index + delta
+    if 0 <= stepped < length:
+        return stepped
+    return stepped % length if loop else None
+
+
+def get_stream(handler_input, position):
+    """Stream of the episode at catalog ``position``: the position, token,
+    url and mirrors to play it with."""
+    # type: (HandlerInput, int) -> Dict
+    position = int(position)
+    episode = catalog.get_catalog()[position]
+    stream = {"position": position,
+              "token": stream_token(handler_input, position),
+              "url": episode.get("url")}
+    if episode.get("mirrors"):
+        stream["mirrors"] = episode["mirrors"]
+    return stream
+
+
+def stream_url(token, record, attributes=None):
+    """Url to play the stream of ``token`` from, the first healthy one of
+    its episode or stream ``record``, for the user of the persistent
+    ``attributes`` when they were read."""
+    # type: (str, Mapping, Optional[Mapping]) -> str
+    url = failover.pick(record, attributes)
+    failover.remember(token, url, record)
+    return url
+
+
+def get_up_next(handler_input):
+    """Catalog positions of the streams around the current index.
+
+    ``playback_info["up_next"]`` holds the ``previous`` and ``current``
+    positions and the ``UP_NEXT_SIZE`` next ``positions`` of the play
+    order, for an index, play order, loop setting and size: when the
+    index moved one stream forward it slides by one stream, and it is
+    worked out again when any of them, or the catalog, changed otherwise,
+    eg after a deployment changing ``UP_NEXT_SIZE``. Only
+    positions are stored, ``get_stream`` resolves the stream to play.
+    """
+    # type: (HandlerInput) -> Dict
+    playback_info = get_playback_info(handler_input)
+    loop = bool(handler_input.attributes_manager.persistent_attributes.get(
+        "playback_setting").get("loop"))
+    order_signature = play_order.signature(playback_info.get("play_order"))
+    revision = catalog.get_catalog().revision
+    index = playback_info.get("index")
+    window = playback_info.get("up_next")
+    if window is not None and ("positions" not in window or
+                               window.get("order") != order_signature or
+                               window.get("loop") != loop or
+                               window.get("size") != UP_NEXT_SIZE or
+                               window.get("catalog") != revision):
+        window = None
+    if window is not None and window.get("index") == index:
+        return window
+
+    order = get_play_order(handler_input)
+    length = len(order)
+
+    def position(delta):
+        # type: (int) -> Optional[int]
+        stepped = _step(index, length, loop, delta)
+        return None if stepped is None else order[stepped]
+
+    if (window is not None and window["positions"] and
+            _step(int(window["index"]), length, loop, 1) == index):
+        positions = window["positions"][1:]  # type: List[int]
+        if len(window["positions"]) == UP_NEXT_SIZE:
+            last = position(UP_NEXT_SIZE)
+            if last is not None:
+                positions.append(last)
+        window = {"previous": window["current"],
+                  "current": window["positions"][0],
+                  "positions": positions}
+    else:
+        positions = []
+        for delta in range(1, UP_NEXT_SIZE + 1):
+            next_position = position(delta)
+            if next_position is None:
+                break
+            positions.append(next_position)
+        window = {"previous": position(-1),
+                  "current": order[index],
+                  "positions": positions}
+
+    window.update(index=index, order=order_signature, loop=loop,
+                  size=UP_NEXT_SIZE, catalog=revision)
+    playback_info["up_next"] = window
+    return window
 
 
 def get_offset_in_ms(handler_input):
     """Extracting offset in milliseconds received in the request"""
     # type: (HandlerInput) -> int
-    return handler_input.request_envelope.request.offset_in_milliseconds
+    return envelope.get_offset_in_milliseconds(handler_input)
 
 
 def shuffle_order():
-    # type: () -> List
-    podcast_indices = [l for l in range(0, len(data.AUDIO_DATA))]
-    random.shuffle(podcast_indices)
-    return podcast_indices
+    """Shuffled play order over the catalog, stored as a seed only."""
+    # type: () -> play_order.PlayOrder
+    return play_order.shuffled(len(catalog.get_catalog()))
 
 
 class Controller:
     """Audioplayer and Playback Controller."""
     @staticmethod
-    def play(handler_input, is_playback=False):
-        # type: (HandlerInput) -> Response
+    def play(handler_input, is_playback=False, stream=None):
+        """Play the stream at the current index.
+
+        ``stream`` is its ``get_stream``, if already resolved.
+        """
+        # type: (HandlerInput, bool, Optional[Dict]) -> Response
+        persistent_attr = handler_input.attributes_manager.persistent_attributes
         playback_info = get_playback_info(handler_input)
         response_builder = handler_input.response_builder
 
-        play_order = playback_info.get("play_order")
         offset_in_ms = playback_info.get("offset_in_ms")
-        index = playback_info.get("index")
+        if stream is None:
+            order = get_play_order(handler_input)
+            stream = get_stream(
+                handler_input, order[playback_info.get("index")])
 
         play_behavior = PlayBehavior.REPLACE_ALL
-        podcast = data.AUDIO_DATA[play_order[index]]
-        token = play_order[index]
+        podcast = catalog.get_catalog()[int(stream["position"])]
+        token = stream["token"]
         playback_info['next_stream_enqueued'] = False
+        if cursor.get_codec() is not None:
+            # PlaybackStarted doesn't write in stateless mode
+            playback_info["token"] = token
+            playback_info["in_playback_session"] = True
+            playback_info["has_previous_playback_session"] = True
 
         response_builder.add_directive(
             PlayDirective(
@@ -78,7 +364,7 @@ class Controller:
                 audio_item=AudioItem(
                     stream=Stream(
                         token=token,
-                        url=podcast.get("url"),
+                        url=stream_url(token, stream, persistent_attr),
                         offset_in_milliseconds=offset_in_ms,
                         expected_previous_token=None),
                     metadata=None))
@@ -111,21 +397,24 @@ class Controller:
         persistent_attr = handler_input.attributes_manager.persistent_attributes
 
         playback_info = persistent_attr.get("playback_info")
-        playback_setting = persistent_attr.get("playback_setting")
-        next_index = (playback_info.get("index") + 1) % len(data.AUDIO_DATA)
+        up_next = get_up_next(handler_input)
 
-        if next_index == 0 and not playback_setting.get("loop"):
+        if not up_next["positions"]:
             if not is_playback:
                 handler_input.response_builder.speak(data.PLAYBACK_NEXT_END)
 
             return handler_input.response_builder.add_directive(
                 StopDirective()).response
 
-        playback_info["index"] = next_index
+        playback_info["index"] = _step(
+            playback_info.get("index"), len(get_play_order(handler_input)),
+            True, 1)
         playback_info["offset_in_ms"] = 0
         playback_info["playback_index_changed"] = True
 
-        return Controller.play(handler_input, is_playback)
+        return Controller.play(
+            handler_input, is_playback,
+            stream=get_stream(handler_input, up_next["positions"][0]))
 
     @staticmethod
     def play_previous(handler_input, is_playback=False):
@@ -133,22 +422,22 @@ class Controller:
         persistent_attr = handler_input.attributes_manager.persistent_attributes
 
         playback_info = persistent_attr.get("playback_info")
-        playback_setting = persistent_attr.get("playback_setting")
-        prev_index = playback_info.get("index") - 1
+        up_next = get_up_next(handler_input)
 
-        if prev_index == -1:
-            if playback_setting.get("loop"):
-                prev_index += len(data.AUDIO_DATA)
-            else:
-                if not is_playback:
-                    handler_input.response_builder.speak(
-                        data.PLAYBACK_PREVIOUS_END)
+        if up_next["previous"] is None:
+            if not is_playback:
+                handler_input.response_builder.speak(
+                    data.PLAYBACK_PREVIOUS_END)
 
-                return handler_input.response_builder.add_directive(
-                    StopDirective()).response
+            return handler_input.response_builder.add_directive(
+                StopDirective()).response
 
-        playback_info["index"] = prev_index
+        playback_info["index"] = _step(
+            playback_info.get("index"), len(get_play_order(handler_input)),
+            True, -1)
         playback_info["offset_in_ms"] = 0
         playback_info["playback_index_changed"] = True
 
-        return Controller.play(handler_input, is_playback)
+        return Controller.play(
+            handler_input, is_playback,
+            stream=get_stream(handler_input, up_next["previous"]))
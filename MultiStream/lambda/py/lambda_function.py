@@ -1,17 +1,26 @@
 # -*- coding: utf-8 -*-
 
+import json
 import logging
-from ask_sdk.standard import StandardSkillBuilder
+import os
+from typing import TYPE_CHECKING, Dict, Tuple
+from ask_sdk_core.skill import CustomSkill
+from ask_sdk_core.skill_builder import CustomSkillBuilder
 from ask_sdk_core.dispatch_components import (
     AbstractRequestHandler, AbstractExceptionHandler,
     AbstractRequestInterceptor, AbstractResponseInterceptor)
 from ask_sdk_core.utils import is_request_type, is_intent_name
 from ask_sdk_core.handler_input import HandlerInput
-from ask_sdk_model import Response
+from ask_sdk_model import RequestEnvelope, Response
 from ask_sdk_model.interfaces.audioplayer import (
     PlayDirective, PlayBehavior, AudioItem, Stream)
 
-from alexa import data, util
+from alexa import (
+    catalog, data, envelope, util, dispatch, logs, persistence, play_order,
+    responses, serializer)
+
+if TYPE_CHECKING:
+    from alexa import cursor
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -21,7 +30,7 @@ logger.setLevel(logging.DEBUG)
 # request handlers like launch, session end, skill events etc.
 
 
-class CheckAudioInterfaceHandler(AbstractRequestHandler):
+class CheckAudioInterfaceHandler(responses.StaticResponseHandler):
     """Check if device supports audio play.
 
     This can be used as the first handler to be checked, before invoking
@@ -39,6 +48,10 @@ class CheckAudioInterfaceHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In CheckAudioInterfaceHandler")
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         handler_input.response_builder.speak(
             data.DEVICE_NOT_SUPPORTED).set_should_end_session(True)
         return handler_input.response_builder.response
@@ -46,6 +59,8 @@ class CheckAudioInterfaceHandler(AbstractRequestHandler):
 
 class LaunchRequestHandler(AbstractRequestHandler):
     """Launch radio for skill launch or PlayAudio intent."""
+    request_types = ("LaunchRequest",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("LaunchRequest")(handler_input)
@@ -62,8 +77,8 @@ class LaunchRequestHandler(AbstractRequestHandler):
         else:
             playback_info['in_playback_session'] = False
             message = data.WELCOME_PLAYBACK_MSG.format(
-                data.AUDIO_DATA[
-                    playback_info.get("play_order")[
+                catalog.get_catalog()[
+                    util.get_play_order(handler_input)[
                         playback_info.get("index")]].get("title"))
             reprompt = data.WELCOME_PLAYBACK_REPROMPT_MSG
 
@@ -74,8 +89,11 @@ class LaunchRequestHandler(AbstractRequestHandler):
 class StartPlaybackHandler(AbstractRequestHandler):
     """Handler for Playing audio on different events.
 
-    Handles PlayAudio Intent, Resume Intent.
+    Handles PlayAudio Intent, Resume Intent. PlayAudio with an episode
+    name plays the episode whose title best matches it.
     """
+    intent_names = ("AMAZON.ResumeIntent", "PlayAudio")
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return (is_intent_name("AMAZON.ResumeIntent")(handler_input)
@@ -84,6 +102,21 @@ class StartPlaybackHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In StartPlaybackHandler")
+        episode_name = envelope.get_slot_value(handler_input, "EpisodeName")
+        if episode_name:
+            from alexa import search
+            position = search.get_index().search(episode_name)
+            if position is None:
+                return handler_input.response_builder.speak(
+                    data.EPISODE_NOT_FOUND_MSG.format(episode_name)).ask(
+                    data.EPISODE_NOT_FOUND_REPROMPT_MSG).response
+
+            playback_info = util.get_playback_info(handler_input)
+            playback_info["index"] = util.get_play_order(
+                handler_input).index(position)
+            playback_info["offset_in_ms"] = 0
+            playback_info["playback_index_changed"] = True
+
         return util.Controller.play(handler_input)
 
 
@@ -92,6 +125,9 @@ class NextPlaybackHandler(AbstractRequestHandler):
 
     Handles Next Intent and NextCommandIssued event.
     """
+    intent_names = ("AMAZON.NextIntent",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -110,6 +146,9 @@ class PreviousPlaybackHandler(AbstractRequestHandler):
 
     Handles Previous Intent and PreviousCommandIssued event.
     """
+    intent_names = ("AMAZON.PreviousIntent",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -128,6 +167,10 @@ class PausePlaybackHandler(AbstractRequestHandler):
 
     Handles Stop, Cancel and Pause Intents and PauseCommandIssued event.
     """
+    intent_names = ("AMAZON.StopIntent", "AMAZON.CancelIntent",
+                    "AMAZON.PauseIntent")
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -143,8 +186,11 @@ class PausePlaybackHandler(AbstractRequestHandler):
         return util.Controller.stop(handler_input)
 
 
-class LoopOnHandler(AbstractRequestHandler):
+class LoopOnHandler(responses.StaticResponseHandler):
     """Handler for setting the audio loop on."""
+    intent_names = ("AMAZON.LoopOnIntent",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -159,11 +205,18 @@ class LoopOnHandler(AbstractRequestHandler):
         playback_setting = persistent_attr.get("playback_setting")
         playback_setting["loop"] = True
 
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         return handler_input.response_builder.speak(data.LOOP_ON_MSG).response
 
 
-class LoopOffHandler(AbstractRequestHandler):
+class LoopOffHandler(responses.StaticResponseHandler):
     """Handler for setting the audio loop off."""
+    intent_names = ("AMAZON.LoopOffIntent",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -178,12 +231,19 @@ class LoopOffHandler(AbstractRequestHandler):
         playback_setting = persistent_attr.get("playback_setting")
         playback_setting["loop"] = False
 
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         return handler_input.response_builder.speak(
             data.LOOP_OFF_MSG).response
 
 
 class ShuffleOnHandler(AbstractRequestHandler):
     """Handler for setting the audio shuffle on."""
+    intent_names = ("AMAZON.ShuffleOnIntent",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -200,7 +260,7 @@ class ShuffleOnHandler(AbstractRequestHandler):
         playback_info = persistent_attr.get("playback_info")
 
         playback_setting["shuffle"] = True
-        playback_info["play_order"] = util.shuffle_order()
+        util.set_play_order(handler_input, util.shuffle_order())
         playback_info["index"] = 0
         playback_info["offset_in_ms"] = 0
         playback_info["playback_index_changed"] = True
@@ -209,6 +269,9 @@ class ShuffleOnHandler(AbstractRequestHandler):
 
 class ShuffleOffHandler(AbstractRequestHandler):
     """Handler for setting the audio shuffle off."""
+    intent_names = ("AMAZON.ShuffleOffIntent",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -225,15 +288,18 @@ class ShuffleOffHandler(AbstractRequestHandler):
         playback_info = persistent_attr.get("playback_info")
 
         playback_setting["shuffle"] = False
-        playback_info["index"] = playback_info["play_order"][
+        playback_info["index"] = util.get_play_order(handler_input)[
             playback_info["index"]]
-        playback_info["play_order"] = [l for l in range(
-            0, len(data.AUDIO_DATA))]
+        util.set_play_order(
+            handler_input, range(0, len(catalog.get_catalog())))
         return util.Controller.play(handler_input)
 
 
 class StartOverHandler(AbstractRequestHandler):
     """Handler for start over."""
+    intent_names = ("AMAZON.StartOverIntent",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -253,6 +319,9 @@ class StartOverHandler(AbstractRequestHandler):
 
 class YesHandler(AbstractRequestHandler):
     """Handler for Yes intent when audio is not playing."""
+    intent_names = ("AMAZON.YesIntent",)
+    state = {"in_playback_session": False}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -269,6 +338,9 @@ class YesHandler(AbstractRequestHandler):
 
 class NoHandler(AbstractRequestHandler):
     """Handler for No intent when audio is not playing."""
+    intent_names = ("AMAZON.NoIntent",)
+    state = {"in_playback_session": False}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -290,8 +362,11 @@ class NoHandler(AbstractRequestHandler):
         return util.Controller.play(handler_input)
 
 
-class CancelOrStopIntentHandler(AbstractRequestHandler):
+class CancelOrStopIntentHandler(responses.StaticResponseHandler):
     """Handler for cancel, stop intents when not playing an audio."""
+    intent_names = ("AMAZON.CancelIntent", "AMAZON.StopIntent")
+    state = {"in_playback_session": False}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -303,11 +378,17 @@ class CancelOrStopIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In CancelOrStopIntentHandler")
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         return handler_input.response_builder.speak(data.STOP_MSG).response
 
 
-class SessionEndedRequestHandler(AbstractRequestHandler):
+class SessionEndedRequestHandler(responses.StaticResponseHandler):
     """Handler for session end."""
+    request_types = ("SessionEndedRequest",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("SessionEndedRequest")(handler_input)
@@ -315,13 +396,15 @@ class SessionEndedRequestHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In SessionEndedRequestHandler")
-        logger.info("Session ended with reason: {}".format(
-            handler_input.request_envelope.request.reason))
-        return handler_input.response_builder.response
+        logs.log(logger, logging.INFO, handler_input, "session_ended",
+                 reason=handler_input.request_envelope.request.reason)
+        return self.cached_response(handler_input)
 
 
-class HelpIntentHandler(AbstractRequestHandler):
+class HelpIntentHandler(responses.StaticResponseHandler):
     """Handler for providing help information to user."""
+    intent_names = ("AMAZON.HelpIntent",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_intent_name("AMAZON.HelpIntent")(handler_input)
@@ -329,7 +412,16 @@ class HelpIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In HelpIntentHandler")
+        return self.cached_response(handler_input)
 
+    def response_state(self, handler_input):
+        # type: (HandlerInput) -> Tuple[bool, bool]
+        playback_info = util.get_playback_info(handler_input)
+        return (bool(playback_info.get('has_previous_playback_session')),
+                bool(playback_info.get('in_playback_session')))
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         playback_info = util.get_playback_info(handler_input)
 
         if not playback_info.get('has_previous_playback_session'):
@@ -343,7 +435,7 @@ class HelpIntentHandler(AbstractRequestHandler):
             message).response
 
 
-class FallbackIntentHandler(AbstractRequestHandler):
+class FallbackIntentHandler(responses.StaticResponseHandler):
     """Handler for fallback intent, for unmatched utterances.
 
     2018-July-12: AMAZON.FallbackIntent is currently available in all
@@ -352,6 +444,8 @@ class FallbackIntentHandler(AbstractRequestHandler):
     on the fallback intent can be found here:
     https://developer.amazon.com/docs/custom-skills/standard-built-in-intents.html#fallback
     """
+    intent_names = ("AMAZON.FallbackIntent",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_intent_name("AMAZON.FallbackIntent")(handler_input)
@@ -359,7 +453,10 @@ class FallbackIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In FallbackIntentHandler")
+        return self.cached_response(handler_input)
 
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         handler_input.response_builder.speak(
             data.EXCEPTION_MSG).ask(data.EXCEPTION_MSG)
         return handler_input.response_builder.response
@@ -368,12 +465,14 @@ class FallbackIntentHandler(AbstractRequestHandler):
 # ########## AUDIOPLAYER INTERFACE HANDLERS #########################
 # This section contains handlers related to Audioplayer interface
 
-class PlaybackStartedEventHandler(AbstractRequestHandler):
+class PlaybackStartedEventHandler(responses.StaticResponseHandler):
     """AudioPlayer.PlaybackStarted Directive received.
 
     Confirming that the requested audio file began playing.
     Do not send any specific response.
     """
+    request_types = ("AudioPlayer.PlaybackStarted",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackStarted")(handler_input)
@@ -382,21 +481,30 @@ class PlaybackStartedEventHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         logger.info("In PlaybackStartedHandler")
 
+        if util.get_cursor(handler_input) is not None:
+            # Stateless mode: Controller.play already stored the playback
+            # info, and later streams are found from the device token
+            return self.cached_response(handler_input)
+
         playback_info = util.get_playback_info(handler_input)
 
         playback_info["token"] = util.get_token(handler_input)
         playback_info["index"] = util.get_index(handler_input)
         playback_info["in_playback_session"] = True
         playback_info["has_previous_playback_session"] = True
+        # Resolve the next stream now rather than on PlaybackNearlyFinished
+        util.get_up_next(handler_input)
 
-        return handler_input.response_builder.response
+        return self.cached_response(handler_input)
 
-class PlaybackFinishedEventHandler(AbstractRequestHandler):
+class PlaybackFinishedEventHandler(responses.StaticResponseHandler):
     """AudioPlayer.PlaybackFinished Directive received.
 
     Confirming that the requested audio file completed playing.
     Do not send any specific response.
     """
+    request_types = ("AudioPlayer.PlaybackFinished",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackFinished")(handler_input)
@@ -405,21 +513,30 @@ class PlaybackFinishedEventHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         logger.info("In PlaybackFinishedHandler")
 
+        playback_cursor = util.get_cursor(handler_input)
+        if (playback_cursor is not None and
+                util.next_cursor(handler_input, playback_cursor)
+                is not None):
+            # Stateless mode: only the end of the play order is stored
+            return self.cached_response(handler_input)
+
         playback_info = util.get_playback_info(handler_input)
 
         playback_info["in_playback_session"] = False
         playback_info["has_previous_playback_session"] = False
         playback_info["next_stream_enqueued"] = False
 
-        return handler_input.response_builder.response
+        return self.cached_response(handler_input)
 
 
-class PlaybackStoppedEventHandler(AbstractRequestHandler):
+class PlaybackStoppedEventHandler(responses.StaticResponseHandler):
     """AudioPlayer.PlaybackStopped Directive received.
 
     Confirming that the requested audio file stopped playing.
     Do not send any specific response.
     """
+    request_types = ("AudioPlayer.PlaybackStopped",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackStopped")(handler_input)
@@ -428,6 +545,20 @@ class PlaybackStoppedEventHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         logger.info("In PlaybackStoppedHandler")
 
+        playback_cursor = util.get_cursor(handler_input)
+        if playback_cursor is not None:
+            # Stateless mode: write the resume point without reading
+            persistence_adapter.update_attributes(
+                handler_input.request_envelope, {
+                    ("playback_info", "token"): util.get_token(
+                        handler_input),
+                    ("playback_info", "index"): util.cursor_index(
+                        playback_cursor),
+                    ("playback_info", "offset_in_ms"): util.get_offset_in_ms(
+                        handler_input)
+                })
+            return self.cached_response(handler_input)
+
         playback_info = util.get_playback_info(handler_input)
 
         playback_info["token"] = util.get_token(handler_input)
@@ -435,7 +566,7 @@ class PlaybackStoppedEventHandler(AbstractRequestHandler):
         playback_info["offset_in_ms"] = util.get_offset_in_ms(
             handler_input)
 
-        return handler_input.response_builder.response
+        return self.cached_response(handler_input)
 
 
 class PlaybackNearlyFinishedEventHandler(AbstractRequestHandler):
@@ -443,6 +574,8 @@ class PlaybackNearlyFinishedEventHandler(AbstractRequestHandler):
 
     Replacing queue with the URL again. This should not happen on live streams.
     """
+    request_types = ("AudioPlayer.PlaybackNearlyFinished",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackNearlyFinished")(handler_input)
@@ -451,21 +584,23 @@ class PlaybackNearlyFinishedEventHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         logger.info("In PlaybackNearlyFinishedHandler")
 
-        persistent_attr = handler_input.attributes_manager.persistent_attributes
-        playback_info = persistent_attr.get("playback_info")
-        playback_setting = persistent_attr.get("playback_setting")
+        playback_cursor = util.get_cursor(handler_input)
+        if playback_cursor is not None:
+            return self.handle_stateless(handler_input, playback_cursor)
+
+        playback_info = util.get_playback_info(handler_input)
 
         if playback_info.get("next_stream_enqueued"):
             return handler_input.response_builder.response
 
-        enqueue_index = (playback_info.get("index") + 1) % len(data.AUDIO_DATA)
-        if enqueue_index == 0 and not playback_setting.get("loop"):
+        up_next = util.get_up_next(handler_input)
+        if not up_next["positions"]:
             return handler_input.response_builder.response
 
         playback_info["next_stream_enqueued"] = True
-        enqueue_token = playback_info.get("play_order")[enqueue_index]
+        enqueue = util.get_stream(handler_input, up_next["positions"][0])
+        persistent_attr = handler_input.attributes_manager.persistent_attributes
         play_behavior = PlayBehavior.ENQUEUE
-        podcast = data.AUDIO_DATA[enqueue_token]
         expected_previous_token = playback_info.get("token")
         offset_in_ms = 0
 
@@ -474,41 +609,105 @@ class PlaybackNearlyFinishedEventHandler(AbstractRequestHandler):
                 play_behavior=play_behavior,
                 audio_item=AudioItem(
                     stream=Stream(
-                        token=enqueue_token,
-                        url=podcast.get("url"),
+                        token=enqueue["token"],
+                        url=util.stream_url(
+                            enqueue["token"], enqueue, persistent_attr),
                         offset_in_milliseconds=offset_in_ms,
                         expected_previous_token=expected_previous_token),
                     metadata=None)))
 
         return handler_input.response_builder.response
 
+    def handle_stateless(self, handler_input, playback_cursor):
+        """Enqueue the stream after the one of the cursor, without
+        persistence."""
+        # type: (HandlerInput, cursor.Cursor) -> Response
+        from alexa import cursor
+
+        enqueue_cursor = util.next_cursor(handler_input, playback_cursor)
+        if enqueue_cursor is None:
+            return handler_input.response_builder.response
+
+        episodes = catalog.get_catalog()
+        podcast = episodes[episodes.position(enqueue_cursor.key)]
+        token = cursor.get_codec().encode(enqueue_cursor)
+        handler_input.response_builder.add_directive(
+            PlayDirective(
+                play_behavior=PlayBehavior.ENQUEUE,
+                audio_item=AudioItem(
+                    stream=Stream(
+                        token=token,
+                        # Container breakers only, the persistent
+                        # attributes aren't read
+                        url=util.stream_url(token, podcast),
+                        offset_in_milliseconds=0,
+                        expected_previous_token=util.get_token(
+                            handler_input)),
+                    metadata=None)))
+
+        return handler_input.response_builder.response
+
 
-class PlaybackFailedEventHandler(AbstractRequestHandler):
+class PlaybackFailedEventHandler(responses.StaticResponseHandler):
     """AudioPlayer.PlaybackFailed Directive received.
 
-    Logging the error and restarting playing with no output speech.
+    Logging the error and restarting the stream from the next healthy url
+    of its episode, with no output speech. Playback stops when no url is
+    healthy or the user ran out of retries.
     """
+    request_types = ("AudioPlayer.PlaybackFailed",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackFailed")(handler_input)
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
-        logger.info("In PlaybackFailedHandler")
+        from alexa import failover
 
-        playback_info = util.get_playback_info(handler_input)
-        playback_info["in_playback_session"] = False
-
-        logger.info("Playback Failed: {}".format(
-            handler_input.request_envelope.request.error))
-
-        return handler_input.response_builder.response
+        logger.info("In PlaybackFailedHandler")
+        request = handler_input.request_envelope.request
+        token = util.get_token(handler_input)
+        position = util.token_position(token)
+        url = None
+        if position is not None:
+            podcast = catalog.get_catalog()[position]
+            url = failover.fail_over(
+                podcast, failover.played_url(token, podcast),
+                handler_input.attributes_manager.persistent_attributes,
+                envelope.get_request_id(handler_input))
+
+        logs.log(logger, logging.INFO, handler_input, "playback_failed",
+                 error=request.error, retry_url=url)
+
+        if url is None:
+            playback_info = util.get_playback_info(handler_input)
+            playback_info["in_playback_session"] = False
+            return self.cached_response(handler_input)
+
+        failover.remember(token, url, podcast)
+        state = request.current_playback_state
+        offset_in_ms = (state.offset_in_milliseconds
+                        if state is not None and state.token == token
+                        else 0)
+        return handler_input.response_builder.add_directive(
+            PlayDirective(
+                play_behavior=PlayBehavior.REPLACE_ALL,
+                audio_item=AudioItem(
+                    stream=Stream(
+                        token=token,
+                        url=url,
+                        offset_in_milliseconds=offset_in_ms or 0,
+                        expected_previous_token=None),
+                    metadata=None))).response
 
 
-class ExceptionEncounteredHandler(AbstractRequestHandler):
+class ExceptionEncounteredHandler(responses.StaticResponseHandler):
     """Handler to handle exceptions from responses sent by AudioPlayer
     request.
     """
+    request_types = ("System.ExceptionEncountered",)
+
     def can_handle(self, handler_input):
         # type; (HandlerInput) -> bool
         return is_request_type("System.ExceptionEncountered")(handler_input)
@@ -516,9 +715,10 @@ class ExceptionEncounteredHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In ExceptionEncounteredHandler")
-        logger.info("System exception encountered: {}".format(
-            handler_input.request_envelope.request))
-        return handler_input.response_builder.response
+        logs.log(logger, logging.ERROR, handler_input,
+                 "system_exception_encountered",
+                 request=handler_input.request_envelope.request)
+        return self.cached_response(handler_input)
 
 # ###################################################################
 
@@ -532,6 +732,8 @@ class PlayCommandHandler(AbstractRequestHandler):
     This handler handles the play command sent through hardware buttons such
     as remote control or the play control from Alexa-devices with a screen.
     """
+    request_types = ("PlaybackController.PlayCommandIssued",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type(
@@ -551,6 +753,9 @@ class NextCommandHandler(AbstractRequestHandler):
     buttons such as remote control or the next control from
     Alexa-devices with a screen.
     """
+    request_types = ("PlaybackController.NextCommandIssued",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -573,6 +778,9 @@ class PreviousCommandHandler(AbstractRequestHandler):
     buttons such as remote control or the previous control from
     Alexa-devices with a screen.
     """
+    request_types = ("PlaybackController.PreviousCommandIssued",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -594,6 +802,9 @@ class PauseCommandHandler(AbstractRequestHandler):
     buttons such as remote control or the pause control from
     Alexa-devices with a screen.
     """
+    request_types = ("PlaybackController.PauseCommandIssued",)
+    state = {"in_playback_session": True}
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         playback_info = util.get_playback_info(handler_input)
@@ -615,7 +826,8 @@ class CatchAllExceptionHandler(AbstractExceptionHandler):
     """
     def can_handle(self, handler_input, exception):
         # type: (HandlerInput, Exception) -> bool
-        return True
+        # Conflicting writes are handled again by lambda_handler
+        return not isinstance(exception, persistence.WriteConflict)
 
     def handle(self, handler_input, exception):
         # type: (HandlerInput, Exception) -> Response
@@ -633,14 +845,27 @@ class RequestLogger(AbstractRequestInterceptor):
     """Log the alexa requests."""
     def process(self, handler_input):
         # type: (HandlerInput) -> None
-        logger.debug("Alexa Request: {}".format(
-            handler_input.request_envelope.request))
+        logs.log(logger, logging.DEBUG, handler_input, "request",
+                 request=envelope.get_request(handler_input))
 
 
 class LoadPersistenceAttributesRequestInterceptor(AbstractRequestInterceptor):
-    """Check if user is invoking skill for first time and initialize preset."""
+    """Check if user is invoking skill for first time and initialize preset.
+
+    In stateless mode, the AudioPlayer events carrying a cursor are
+    answered without the persistent attributes, which aren't read.
+    """
+    stateless_request_types = frozenset((
+        "AudioPlayer.PlaybackStarted", "AudioPlayer.PlaybackFinished",
+        "AudioPlayer.PlaybackStopped", "AudioPlayer.PlaybackNearlyFinished"))
+
     def process(self, handler_input):
         # type: (HandlerInput) -> None
+        if (envelope.get_request_type(handler_input) in
+                self.stateless_request_types and
+                util.get_cursor(handler_input) is not None):
+            return
+
         persistence_attr = handler_input.attributes_manager.persistent_attributes
 
         if len(persistence_attr) == 0:
@@ -651,14 +876,16 @@ class LoadPersistenceAttributesRequestInterceptor(AbstractRequestInterceptor):
             }
 
             persistence_attr["playback_info"] = {
-                "play_order": [l for l in range(0, len(data.AUDIO_DATA))],
+                "play_order": play_order.encode(
+                    range(0, len(catalog.get_catalog()))),
                 "index": 0,
                 "offset_in_ms": 0,
                 "playback_index_changed": False,
                 "token": None,
                 "next_stream_enqueued": False,
                 "in_playback_session": False,
-                "has_previous_playback_session": False
+                "has_previous_playback_session": False,
+                "catalog_revision": catalog.get_catalog().revision
             }
         else:
             # Convert decimals to integers, because of AWS SDK DynamoDB issue
@@ -667,27 +894,61 @@ class LoadPersistenceAttributesRequestInterceptor(AbstractRequestInterceptor):
             playback_info["index"] = int(playback_info.get("index"))
             playback_info["offset_in_ms"] = int(playback_info.get(
                 "offset_in_ms"))
-            playback_info["play_order"] = [
-                int(l) for l in playback_info.get("play_order")]
+            # play_order is kept in its compact stored form, and only
+            # decoded by util.get_play_order when a handler needs it.
+            if play_order.needs_upgrade(playback_info.get("play_order")):
+                playback_info["play_order"] = play_order.encode(
+                    play_order.decode(playback_info.get("play_order")))
+            if (playback_info.get("catalog_revision") !=
+                    catalog.get_catalog().revision):
+                util.sync_catalog(handler_input)
+            from alexa import cursor
+            if cursor.get_codec() is not None:
+                util.sync_player_token(handler_input)
 
 
 class ResponseLogger(AbstractResponseInterceptor):
     """Log the alexa responses."""
     def process(self, handler_input, response):
         # type: (HandlerInput, Response) -> None
-        logger.debug("Alexa Response: {}".format(response))
+        logs.log(logger, logging.DEBUG, handler_input, "response",
+                 response=response)
 
 
 class SavePersistenceAttributesResponseInterceptor(AbstractResponseInterceptor):
-    """Save persistence attributes before sending response to user."""
+    """Save persistence attributes before sending response to user.
+
+    The persistence adapter skips the write when nothing changed and
+    only sends the changed fields otherwise, conditional on the version
+    of the item read.
+    """
     def process(self, handler_input, response):
         # type: (HandlerInput, Response) -> None
         handler_input.attributes_manager.save_persistent_attributes()
+        logs.log(logger, logging.DEBUG, handler_input, "persistence",
+                 hit_rate=persistence_adapter.hit_rate,
+                 **persistence_adapter.stats)
 # ###################################################################
 
 
-sb = StandardSkillBuilder(
-    table_name=data.DYNAMODB_TABLE_NAME, auto_create_table=True)
+# Requests that can race a write from another device of the user, whose
+# attributes are read from the table even when cached: resuming and
+# failing over a stream. The other lifecycle events use the cache.
+READ_THROUGH_REQUESTS = frozenset((
+    "AMAZON.ResumeIntent", "PlaybackController.PlayCommandIssued",
+    "AudioPlayer.PlaybackFailed"))
+
+
+def is_state_request(request_envelope):
+    # type: (RequestEnvelope) -> bool
+    return envelope.request_name(request_envelope) in READ_THROUGH_REQUESTS
+
+
+persistence_adapter = persistence.VersionedCacheDynamoDbAdapter(
+    table_name=data.DYNAMODB_TABLE_NAME,
+    cache_size=int(os.environ.get("ATTRIBUTES_CACHE_SIZE", "1000")),
+    read_through=is_state_request)
+sb = CustomSkillBuilder(persistence_adapter=persistence_adapter)
 
 # ############# REGISTER HANDLERS #####################
 # Request Handlers
@@ -728,5 +989,61 @@ sb.add_global_request_interceptor(LoadPersistenceAttributesRequestInterceptor())
 sb.add_global_response_interceptor(ResponseLogger())
 sb.add_global_response_interceptor(SavePersistenceAttributesResponseInterceptor())
 
+# Skill built once per container, on the first request, with handlers
+# looked up by request type and intent name and responses written by the
+# fast serializer. Set VERIFY_DISPATCH=true or VERIFY_SERIALIZER=true to
+# check each decision or response against the SDK implementation.
+_skill = None
+
+
+def get_skill():
+    # type: () -> CustomSkill
+    global _skill
+    if _skill is None:
+        from alexa import api_client, cursor
+        # With STATELESS_PLAYBACK=true, stream tokens carry the playback
+        # cursor, signed with PLAYBACK_TOKEN_SECRET; fail before handling
+        # any request when the secret is missing.
+        cursor.get_codec()
+        sb.api_client = api_client.LazyApiClient()
+        skill = sb.create()
+        skill.request_dispatcher.request_mappers = [
+            dispatch.IndexedRequestMapper(
+                skill.request_dispatcher.request_mappers[
+                    0].request_handler_chains,
+                state_predicates={
+                    "in_playback_session": util.in_playback_session},
+                verify=os.environ.get("VERIFY_DISPATCH") == "true")]
+        if os.environ.get("FAST_SERIALIZER", "true") == "true":
+            skill.serializer = serializer.ResponseSerializer(
+                verify=os.environ.get("VERIFY_SERIALIZER") == "true")
+        _skill = skill
+    return _skill
+
+
+# With LAZY_INIT=false, the skill and the DynamoDb connection are set up
+# when the function is loaded, eg for provisioned concurrency.
+if os.environ.get("LAZY_INIT", "true") != "true":
+    get_skill()
+    persistence_adapter.connect()
+
+
+# Request envelopes are deserialized part by part, when first read by
+# the skill. Set LAZY_ENVELOPE=false to deserialize them whole up front.
+LAZY_ENVELOPE = os.environ.get("LAZY_ENVELOPE", "true") == "true"
+
+
 # AWS Lambda handler
-lambda_handler = sb.lambda_handler()
+def lambda_handler(event, context):
+    # type: (Dict, object) -> Dict
+    skill = get_skill()
+    if LAZY_ENVELOPE:
+        request_envelope = envelope.LazyRequestEnvelope(
+            event, skill.serializer)  # type: RequestEnvelope
+    else:
+        request_envelope = skill.serializer.deserialize(
+            payload=json.dumps(event), obj_type=RequestEnvelope)
+    response_envelope = persistence_adapter.handle(
+        lambda: skill.invoke(
+            request_envelope=request_envelope, context=context))
+    return skill.serializer.serialize(response_envelope)
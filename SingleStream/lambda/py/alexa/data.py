@@ -28,6 +28,8 @@ en = {
         "small_image_url": 'https://alexademo.ninja/skills/logo-108.png'
     },
     "url": 'https://audio1.maxi80.com',
+    # Other urls of the stream, played when the ones before fail
+    "mirrors": [],
     "start_jingle": 'https://s3-eu-west-1.amazonaws.com/alexa.maxi80.com/assets/jingle.m4a'
 }
 
@@ -39,6 +41,7 @@ fr = {
         "small_image_url": 'https://alexademo.ninja/skills/logo-108.png'
     },
     "url": 'https://audio1.maxi80.com',
+    "mirrors": [],
     "start_jingle": 'https://s3-eu-west-1.amazonaws.com/alexa.maxi80.com/assets/jingle.m4a'
 }
 
@@ -50,6 +53,7 @@ it = {
         "small_image_url": 'https://alexademo.ninja/skills/logo-108.png'
     },
     "url": 'https://audio1.maxi80.com',
+    "mirrors": [],
     "start_jingle": 'https://s3-eu-west-1.amazonaws.com/alexa.maxi80.com/assets/jingle.m4a'
 }
 
@@ -61,5 +65,6 @@ es = {
         "small_image_url": 'https://alexademo.ninja/skills/logo-108.png'
     },
     "url": 'https://audio1.maxi80.com',
+    "mirrors": [],
     "start_jingle": 'https://s3-eu-west-1.amazonaws.com/alexa.maxi80.com/assets/jingle.m4a'
 }
\ No newline at end of file
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+import importlib
+import json
+from enum import Enum
+from typing import Dict, Optional
+from ask_sdk_core.handler_input import HandlerInput
+from ask_sdk_core.serialize import DefaultSerializer
+from ask_sdk_model import RequestEnvelope, IntentRequest
+
+_NATIVE_TYPES = {"str": str, "int": int, "float": float, "bool": bool}
+_model_classes = {}  # type: Dict[str, Optional[type]]
+_lazy_classes = {}  # type: Dict[type, type]
+
+
+class LazyModel(object):
+    """Model whose attributes are deserialized from the raw payload on
+    first access.
+
+    Nested models are lazy as well, except the ones with subtypes, like
+    ``Request``, lists and enums, which are built whole by the
+    serializer.
+    """
+    def __getattr__(self, name):
+        # type: (str) -> object
+        # Only called for the attributes not built yet
+        obj_type = self.deserialized_types.get(name)
+        if obj_type is None:
+            raise AttributeError(name)
+        key = self.attribute_map.get(name, name)
+        value = _deserialize(self.__dict__["_raw"].get(key), obj_type,
+                             self.__dict__["_serializer"])
+        setattr(self, name, value)
+        return value
+
+
+def _model_class(obj_type):
+    """Model class named by ``obj_type``, if it can be built lazily."""
+    # type: (str) -> Optional[type]
+    try:
+        return _model_classes[obj_type]
+    except KeyError:
+        pass
+
+    model_class = None
+    if "." in obj_type and not obj_type.startswith(("list[", "dict(")):
+        module_name, class_name = obj_type.rsplit(".", 1)
+        candidate = getattr(importlib.import_module(module_name), class_name)
+        if (hasattr(candidate, "deserialized_types") and
+                not hasattr(candidate, "get_real_child_model") and
+                not issubclass(candidate, Enum)):
+            model_class = candidate
+    _model_classes[obj_type] = model_class
+    return model_class
+
+
+def lazy_model(model_class, raw, serializer):
+    """Instance of ``model_class`` built from ``raw`` on demand."""
+    # type: (type, Dict, DefaultSerializer) -> object
+    lazy_class = _lazy_classes.get(model_class)
+    if lazy_class is None:
+        lazy_class = type("Lazy" + model_class.__name__,
+                          (LazyModel, model_class), {})
+        _lazy_classes[model_class] = lazy_class
+    model = lazy_class.__new__(lazy_class)
+    model.__dict__.update(_raw=raw, _serializer=serializer)
+    return model
+
+
+def _deserialize(value, obj_type, serializer):
+    # type: (object, str, DefaultSerializer) -> object
+    if value is None:
+        return None
+    native = _NATIVE_TYPES.get(obj_type)
+    if native is not None and type(value) is native:
+        return value
+    model_class = _model_class(obj_type)
+    if model_class is not None and type(value) is dict:
+        return lazy_model(model_class, value, serializer)
+    return serializer.deserialize(json.dumps(value), obj_type)
+
+
+class LazyRequestEnvelope(LazyModel, RequestEnvelope):
+    """RequestEnvelope over the raw Lambda event.
+
+    Session, context and request models are built when first read, so a
+    handler only pays for the parts of the envelope it uses. The request
+    type, intent name, token, offset and locale are read from the raw
+    event, through the functions of this module, without building the
+    request model.
+    """
+    def __init__(self, event, serializer):
+        # type: (Dict, DefaultSerializer) -> None
+        self.__dict__.update(_raw=event, _serializer=serializer)
+
+    @property
+    def raw_request(self):
+        # type: () -> Dict
+        return self.__dict__["_raw"].get("request", {})
+
+
+def get_request(handler_input):
+    """Raw request dict of a lazy envelope, else the request model.
+
+    Both serialize to the same JSON, for logs.
+    """
+    # type: (HandlerInput) -> object
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        return envelope.raw_request
+    return envelope.request
+
+
+def get_request_type(handler_input):
+    # type: (HandlerInput) -> str
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        return envelope.raw_request.get("type")
+    return envelope.request.object_type
+
+
+def request_name(request_envelope):
+    """Intent name of an intent request, request type of other requests."""
+    # type: (RequestEnvelope) -> Optional[str]
+    if isinstance(request_envelope, LazyRequestEnvelope):
+        request = request_envelope.raw_request
+        if request.get("type") == "IntentRequest":
+            return request.get("intent", {}).get("name")
+        return request.get("type")
+    if isinstance(request_envelope.request, IntentRequest):
+        return request_envelope.request.intent.name
+    return request_envelope.request.object_type
+
+
+def get_intent_name(handler_input):
+    """Intent name of an intent request, None for other requests."""
+    # type: (HandlerInput) -> Optional[str]
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        request = envelope.raw_request
+        if request.get("type") != "IntentRequest":
+            return None
+        return request.get("intent", {}).get("name")
+    if isinstance(envelope.request, IntentRequest):
+        return envelope.request.intent.name
+    return None
+
+
+def get_request_id(handler_input):
+    # type: (HandlerInput) -> Optional[str]
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        return envelope.raw_request.get("requestId")
+    return envelope.request.request_id
+
+
+def get_token(handler_input):
+    # type: (HandlerInput) -> Optional[str]
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        token = envelope.raw_request.get("token")
+        # Cast as the model does
+        return None if token is None else str(token)
+    return getattr(envelope.request, "token", None)
+
+
+def get_offset_in_milliseconds(handler_input):
+    # type: (HandlerInput) -> Optional[int]
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        offset = envelope.raw_request.get("offsetInMilliseconds")
+        return None if offset is None else int(offset)
+    return getattr(envelope.request, "offset_in_milliseconds", None)
+
+
+def get_locale(handler_input):
+    # type: (HandlerInput) -> Optional[str]
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        return envelope.raw_request.get("locale")
+    return getattr(envelope.request, "locale", None)
+
+
+def get_player_token(handler_input):
+    """Token of the stream the device is playing or last played."""
+    # type: (HandlerInput) -> Optional[str]
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        player = envelope.__dict__["_raw"].get("context", {}).get(
+            "AudioPlayer", {})
+        return player.get("token")
+    if envelope.context is None or envelope.context.audio_player is None:
+        return None
+    return envelope.context.audio_player.token
+
+
+def get_slot_value(handler_input, name):
+    """Value of the slot ``name`` of an intent request, None if unfilled."""
+    # type: (HandlerInput, str) -> Optional[str]
+    envelope = handler_input.request_envelope
+    if isinstance(envelope, LazyRequestEnvelope):
+        slots = envelope.raw_request.get("intent", {}).get("slots") or {}
+        return (slots.get(name) or {}).get("value")
+    intent = getattr(envelope.request, "intent", None)
+    if intent is None or not intent.slots or name not in intent.slots:
+        return None
+    return intent.slots[name].value
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import gettext
+import os
+from typing import Callable, Dict, Optional
+
+LOCALE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "locales")
+DOMAIN = "data"
+
+# Strings in data.py are written in English, so English needs no catalog
+FALLBACK = gettext.NullTranslations()
+
+
+def _load_catalogs():
+    """Load the catalog of every locale shipped under ``locales``."""
+    # type: () -> Dict[str, gettext.NullTranslations]
+    catalogs = {"en": FALLBACK}
+    for locale in sorted(os.listdir(LOCALE_DIR)):
+        if os.path.isdir(os.path.join(LOCALE_DIR, locale)):
+            catalogs[locale] = gettext.translation(
+                DOMAIN, localedir=LOCALE_DIR, languages=[locale],
+                fallback=True)
+    return catalogs
+
+
+# Loaded once per container. Exact locales (fr-FR) and their language
+# prefix (fr) both map to the catalog, so es-MX uses the es-ES strings.
+CATALOGS = _load_catalogs()
+LOCALE_TABLE = {}  # type: Dict[str, gettext.NullTranslations]
+for _locale, _catalog in CATALOGS.items():
+    LOCALE_TABLE[_locale] = _catalog
+    LOCALE_TABLE.setdefault(_locale.split("-")[0], _catalog)
+
+_gettext_by_locale = {}  # type: Dict[Optional[str], Callable[[str], str]]
+
+
+def get_gettext(locale):
+    """Return the ``gettext`` function for the locale, memoised."""
+    # type: (Optional[str]) -> Callable[[str], str]
+    try:
+        return _gettext_by_locale[locale]
+    except KeyError:
+        pass
+
+    catalog = FALLBACK
+    if locale:
+        catalog = LOCALE_TABLE.get(locale) or LOCALE_TABLE.get(
+            locale.split("-")[0], FALLBACK)
+    _gettext_by_locale[locale] = catalog.gettext
+    return catalog.gettext
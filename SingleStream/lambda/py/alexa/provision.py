@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Create the DynamoDb table of the skill.
+
+The skill never creates its table at runtime. Run once, from the
+``lambda/py`` directory, with credentials allowed to create tables::
+
+    python -m alexa.provision [--table NAME] [--region REGION]
+"""
+
+import argparse
+from typing import List, Optional
+from . import data
+
+PARTITION_KEY_NAME = "id"
+
+
+def create_table(dynamodb, table_name, partition_key_name=PARTITION_KEY_NAME,
+                 wait=True):
+    """Create the table unless it exists.
+
+    Returns False if the table already existed.
+    """
+    # type: (object, str, str, bool) -> bool
+    try:
+        table = dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[{
+                "AttributeName": partition_key_name,
+                "KeyType": "HASH"
+            }],
+            AttributeDefinitions=[{
+                "AttributeName": partition_key_name,
+                "AttributeType": "S"
+            }],
+            ProvisionedThroughput={
+                "ReadCapacityUnits": 5,
+                "WriteCapacityUnits": 5
+            })
+    except Exception as e:
+        if type(e).__name__ == "ResourceInUseException":
+            return False
+        raise
+
+    if wait:
+        table.wait_until_exists()
+    return True
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    parser = argparse.ArgumentParser(
+        description="Create the DynamoDb table of the skill.")
+    parser.add_argument("--table", default=data.jingle["db_table"],
+                        help="table name, {} by default".format(
+                            data.jingle["db_table"]))
+    parser.add_argument("--region",
+                        help="AWS region, the one of the AWS configuration "
+                             "by default")
+    args = parser.parse_args(argv)
+
+    import boto3
+    dynamodb = boto3.resource("dynamodb", region_name=args.region)
+    if create_table(dynamodb, args.table):
+        print("Created table {}".format(args.table))
+    else:
+        print("Table {} already exists".format(args.table))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from typing import Callable, Dict, Hashable, Optional, Tuple
+from ask_sdk_core.dispatch_components import AbstractRequestHandler
+from ask_sdk_core.handler_input import HandlerInput
+from ask_sdk_core.serialize import DefaultSerializer
+from ask_sdk_model import Response
+from . import envelope
+
+_serializer = DefaultSerializer()
+
+
+class CachedResponse(Response):
+    """Response shared by every request of a cache key.
+
+    ``serialized`` holds its serialized form, which the response
+    serializer returns as is. Neither must be modified.
+    """
+    def __init__(self, serialized=None, **kwargs):
+        # type: (Optional[Dict], object) -> None
+        super(CachedResponse, self).__init__(**kwargs)
+        self.serialized = serialized
+
+
+class ResponseCache(object):
+    """Responses of the static response handlers, built once per
+    container."""
+    def __init__(self):
+        # type: () -> None
+        self._responses = {}  # type: Dict[Tuple, CachedResponse]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        # type: (Tuple, Callable[[], Response]) -> CachedResponse
+        response = self._responses.get(key)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        self.misses += 1
+        built = build()
+        response = CachedResponse(
+            serialized=_serializer.serialize(built),
+            **{name: getattr(built, name)
+               for name in Response.deserialized_types})
+        self._responses[key] = response
+        return response
+
+
+response_cache = ResponseCache()
+
+
+class StaticResponseHandler(AbstractRequestHandler):
+    """Request handler whose response only depends on the locale and on
+    ``response_state``.
+
+    ``cached_response`` calls ``build_response`` the first time a locale
+    and state are seen, and returns the same response afterwards,
+    without going through the response builder. ``handle`` can still
+    update the attributes before returning it.
+    """
+    def response_state(self, handler_input):
+        """Values of the attributes the response depends on."""
+        # type: (HandlerInput) -> Hashable
+        return None
+
+    def build_response(self, handler_input):
+        """Build the response, the empty one by default."""
+        # type: (HandlerInput) -> Response
+        return handler_input.response_builder.response
+
+    def cached_response(self, handler_input):
+        # type: (HandlerInput) -> Response
+        key = (type(self).__name__, envelope.get_locale(handler_input),
+               self.response_state(handler_input))
+        return response_cache.get(
+            key, lambda: self.build_response(handler_input))
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+import decimal
+import logging
+from typing import Callable, Dict, List, Optional
+from ask_sdk_core.serialize import DefaultSerializer
+from ask_sdk_model import Response, ResponseEnvelope
+from ask_sdk_model.interfaces import display
+from ask_sdk_model.interfaces.audioplayer import (
+    PlayDirective, AudioItem, Stream, AudioItemMetadata, StopDirective,
+    ClearQueueDirective)
+from ask_sdk_model.ui import (
+    SsmlOutputSpeech, PlainTextOutputSpeech, Reprompt, SimpleCard,
+    StandardCard, Image)
+from .responses import CachedResponse
+
+logger = logging.getLogger(__name__)
+
+_PRIMITIVE_TYPES = frozenset((str, int, float, bool))
+
+
+class Unsupported(Exception):
+    """The response has a shape the fast path does not write."""
+    pass
+
+
+def _plain(value):
+    """Primitive value as written by the default serializer."""
+    # type: (object) -> object
+    if type(value) in _PRIMITIVE_TYPES:
+        return value
+    if type(value) is decimal.Decimal:
+        # Offsets read back from DynamoDb
+        return int(value) if value % 1 == 0 else float(value)
+    raise Unsupported(type(value).__name__)
+
+
+def _put(target, key, value):
+    # type: (Dict, str, object) -> None
+    if value is not None:
+        target[key] = _plain(value)
+
+
+def _enum(value):
+    # type: (object) -> Optional[str]
+    return None if value is None else value.value
+
+
+def _output_speech(speech):
+    # type: (object) -> Dict
+    if type(speech) is SsmlOutputSpeech:
+        result = {"type": "SSML"}
+        _put(result, "playBehavior", _enum(speech.play_behavior))
+        _put(result, "ssml", speech.ssml)
+        return result
+    if type(speech) is PlainTextOutputSpeech:
+        result = {"type": "PlainText"}
+        _put(result, "playBehavior", _enum(speech.play_behavior))
+        _put(result, "text", speech.text)
+        return result
+    raise Unsupported(type(speech).__name__)
+
+
+def _simple_card(card):
+    # type: (SimpleCard) -> Dict
+    result = {"type": "Simple"}
+    _put(result, "title", card.title)
+    _put(result, "content", card.content)
+    return result
+
+
+def _standard_card(card):
+    # type: (StandardCard) -> Dict
+    result = {"type": "Standard"}
+    _put(result, "title", card.title)
+    _put(result, "text", card.text)
+    image = card.image
+    if image is not None:
+        if type(image) is not Image:
+            raise Unsupported(type(image).__name__)
+        result["image"] = image_result = {}
+        _put(image_result, "smallImageUrl", image.small_image_url)
+        _put(image_result, "largeImageUrl", image.large_image_url)
+    return result
+
+
+def _display_image(image):
+    # type: (display.Image) -> Dict
+    if type(image) is not display.Image:
+        raise Unsupported(type(image).__name__)
+    result = {}  # type: Dict
+    _put(result, "contentDescription", image.content_description)
+    if image.sources is not None:
+        sources = []
+        for source in image.sources:
+            if type(source) is not display.ImageInstance:
+                raise Unsupported(type(source).__name__)
+            instance = {}  # type: Dict
+            _put(instance, "url", source.url)
+            _put(instance, "size", _enum(source.size))
+            _put(instance, "widthPixels", source.width_pixels)
+            _put(instance, "heightPixels", source.height_pixels)
+            sources.append(instance)
+        result["sources"] = sources
+    return result
+
+
+def _metadata(metadata):
+    # type: (AudioItemMetadata) -> Dict
+    if type(metadata) is not AudioItemMetadata:
+        raise Unsupported(type(metadata).__name__)
+    result = {}  # type: Dict
+    _put(result, "title", metadata.title)
+    _put(result, "subtitle", metadata.subtitle)
+    if metadata.art is not None:
+        result["art"] = _display_image(metadata.art)
+    if metadata.background_image is not None:
+        result["backgroundImage"] = _display_image(metadata.background_image)
+    return result
+
+
+def _play_directive(directive):
+    # type: (PlayDirective) -> Dict
+    result = {"type": "AudioPlayer.Play"}
+    _put(result, "playBehavior", _enum(directive.play_behavior))
+    audio_item = directive.audio_item
+    if audio_item is None:
+        return result
+    if type(audio_item) is not AudioItem:
+        raise Unsupported(type(audio_item).__name__)
+
+    result["audioItem"] = item = {}
+    stream = audio_item.stream
+    if stream is not None:
+        if type(stream) is not Stream or stream.caption_data is not None:
+            raise Unsupported("Stream")
+        item["stream"] = stream_result = {}
+        _put(stream_result, "expectedPreviousToken",
+             stream.expected_previous_token)
+        _put(stream_result, "token", stream.token)
+        _put(stream_result, "url", stream.url)
+        _put(stream_result, "offsetInMilliseconds",
+             stream.offset_in_milliseconds)
+    if audio_item.metadata is not None:
+        item["metadata"] = _metadata(audio_item.metadata)
+    return result
+
+
+def _stop_directive(directive):
+    # type: (StopDirective) -> Dict
+    return {"type": "AudioPlayer.Stop"}
+
+
+def _clear_queue_directive(directive):
+    # type: (ClearQueueDirective) -> Dict
+    result = {"type": "AudioPlayer.ClearQueue"}
+    _put(result, "clearBehavior", _enum(directive.clear_behavior))
+    return result
+
+
+_CARDS = {
+    SimpleCard: _simple_card,
+    StandardCard: _standard_card,
+}  # type: Dict[type, Callable[[object], Dict]]
+
+_DIRECTIVES = {
+    PlayDirective: _play_directive,
+    StopDirective: _stop_directive,
+    ClearQueueDirective: _clear_queue_directive,
+}  # type: Dict[type, Callable[[object], Dict]]
+
+
+def _directives(directives):
+    # type: (List) -> List[Dict]
+    result = []
+    for directive in directives:
+        write = _DIRECTIVES.get(type(directive))
+        if write is None:
+            raise Unsupported(type(directive).__name__)
+        result.append(write(directive))
+    return result
+
+
+def _response(response):
+    # type: (Response) -> Dict
+    if type(response) is CachedResponse:
+        return response.serialized
+    if (type(response) is not Response or
+            response.api_response is not None or
+            response.can_fulfill_intent is not None or
+            response.experimentation is not None):
+        raise Unsupported("Response")
+
+    result = {}  # type: Dict
+    if response.output_speech is not None:
+        result["outputSpeech"] = _output_speech(response.output_speech)
+    if response.card is not None:
+        write = _CARDS.get(type(response.card))
+        if write is None:
+            raise Unsupported(type(response.card).__name__)
+        result["card"] = write(response.card)
+    reprompt = response.reprompt
+    if reprompt is not None:
+        if type(reprompt) is not Reprompt:
+            raise Unsupported(type(reprompt).__name__)
+        result["reprompt"] = reprompt_result = {}
+        if reprompt.output_speech is not None:
+            reprompt_result["outputSpeech"] = _output_speech(
+                reprompt.output_speech)
+        if reprompt.directives is not None:
+            reprompt_result["directives"] = _directives(reprompt.directives)
+    if response.directives is not None:
+        result["directives"] = _directives(response.directives)
+    _put(result, "shouldEndSession", response.should_end_session)
+    return result
+
+
+class ResponseSerializer(DefaultSerializer):
+    """Serializer writing the response envelopes of the skill directly.
+
+    Speech, reprompt, cards and the AudioPlayer Play, Stop and
+    ClearQueue directives are turned into dicts without walking the
+    model attribute maps, and cached responses are written from their
+    serialized form. Any other shape, and any other object, goes
+    through the ``DefaultSerializer``. With ``verify`` set, every fast
+    result is compared with the default one; mismatches are logged and
+    the default result is used.
+    """
+    def __init__(self, verify=False):
+        # type: (bool) -> None
+        self.verify = verify
+        self.stats = {"fast": 0, "fallback": 0}
+
+    def serialize(self, obj):
+        # type: (object) -> object
+        if type(obj) is ResponseEnvelope:
+            try:
+                result = self.serialize_envelope(obj)
+            except Unsupported:
+                self.stats["fallback"] += 1
+            else:
+                self.stats["fast"] += 1
+                if self.verify:
+                    expected = super(ResponseSerializer, self).serialize(obj)
+                    if result != expected:
+                        logger.error(
+                            "Serializer mismatch: fast path wrote {}, "
+                            "default serializer {}".format(result, expected))
+                        return expected
+                return result
+        return super(ResponseSerializer, self).serialize(obj)
+
+    def serialize_envelope(self, envelope):
+        """Write the envelope, raise Unsupported for unknown shapes."""
+        # type: (ResponseEnvelope) -> Dict
+        result = {}  # type: Dict
+        _put(result, "version", envelope.version)
+        if envelope.session_attributes is not None:
+            result["sessionAttributes"] = super(
+                ResponseSerializer, self).serialize(
+                envelope.session_attributes)
+        _put(result, "userAgent", envelope.user_agent)
+        if envelope.response is not None:
+            result["response"] = _response(envelope.response)
+        return result
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+from ask_sdk_model.ui import StandardCard, Image
+from ask_sdk_model.interfaces.audioplayer import AudioItemMetadata
+from ask_sdk_model.interfaces import display
+from . import data
+
+DEFAULT_LOCALE = "en-US"
+
+# Locales of the interaction models under ./models
+SUPPORTED_LOCALES = (
+    "en-US", "en-GB", "en-AU", "en-CA", "en-IN",
+    "fr-FR", "it-IT", "es-ES", "es-MX")
+
+STATIONS_BY_LANGUAGE = {
+    "en": data.en,
+    "fr": data.fr,
+    "it": data.it,
+    "es": data.es
+}
+
+NO_STATION = MappingProxyType({})
+
+# id(card) -> (card, StandardCard, AudioItemMetadata), for registry cards
+_RENDERED = {}  # type: Dict[int, Tuple[Mapping, StandardCard, AudioItemMetadata]]
+
+
+def _freeze(value):
+    """Return a read-only view of nested station data."""
+    # type: (object) -> object
+    if isinstance(value, dict):
+        return MappingProxyType(
+            {key: _freeze(item) for key, item in value.items()})
+    return value
+
+
+def build_card(card_data):
+    # type: (Mapping) -> StandardCard
+    return StandardCard(
+        title=card_data["title"], text=card_data["text"],
+        image=Image(
+            small_image_url=card_data["small_image_url"],
+            large_image_url=card_data["large_image_url"])
+    )
+
+
+def build_metadata(card_data):
+    # type: (Mapping) -> AudioItemMetadata
+    return AudioItemMetadata(
+        title=card_data["title"],
+        subtitle=card_data["text"],
+        art=display.Image(
+            content_description=card_data["title"],
+            sources=[
+                display.ImageInstance(
+                    url="https://alexademo.ninja/skills/logo-512.png")
+            ]
+        )
+        , background_image=display.Image(
+            content_description=card_data["title"],
+            sources=[
+                display.ImageInstance(
+                    url="https://alexademo.ninja/skills/logo-512.png")
+            ]
+        )
+    )
+
+
+def rendered(card_data):
+    """Return the StandardCard and AudioItemMetadata for the card data.
+
+    Both are built once for the stations of the registry, and shared by
+    all responses. Card data from elsewhere is rendered on each call.
+    """
+    # type: (Mapping) -> Tuple[StandardCard, AudioItemMetadata]
+    entry = _RENDERED.get(id(card_data))
+    if entry is not None and entry[0] is card_data:
+        return entry[1], entry[2]
+    return build_card(card_data), build_metadata(card_data)
+
+
+def _compile_registry():
+    """Map every supported locale and language prefix to its station."""
+    # type: () -> Mapping[str, Mapping]
+    registry = {}
+    for language, station in STATIONS_BY_LANGUAGE.items():
+        registry[language] = _freeze(station)
+        card = registry[language]["card"]
+        _RENDERED[id(card)] = (card, build_card(card), build_metadata(card))
+    for locale in SUPPORTED_LOCALES:
+        registry[locale] = registry[locale.split("-")[0]]
+    return MappingProxyType(registry)
+
+
+REGISTRY = _compile_registry()
+
+
+def lookup(locale):
+    """Return the station for the locale, or an empty record."""
+    # type: (Optional[str]) -> Mapping
+    if locale is None:
+        locale = DEFAULT_LOCALE
+    station = REGISTRY.get(locale)
+    if station is None:
+        station = REGISTRY.get(locale.split("-")[0], NO_STATION)
+    return station
@@ -1,35 +1,32 @@
 # -*- coding: utf-8 -*-
 
 import datetime
-from typing import Dict, Optional
-from ask_sdk_model import Request, Response
-from ask_sdk_model.ui import StandardCard, Image
+from typing import Dict, Mapping, Optional
+from ask_sdk_model import Response
 from ask_sdk_model.interfaces.audioplayer import (
     PlayDirective, PlayBehavior, AudioItem, Stream, AudioItemMetadata,
     StopDirective, ClearQueueDirective, ClearBehavior)
-from ask_sdk_model.interfaces import display
 from ask_sdk_core.response_helper import ResponseFactory
 from ask_sdk_core.handler_input import HandlerInput
-from . import data
+from . import data, envelope, failover, stations
+
+def get_audio_data(handler_input):
+    """Station data for the request locale, looked up once per request."""
+    # type: (HandlerInput) -> Mapping
+    request_attr = handler_input.attributes_manager.request_attributes
+    station = request_attr.get("audio_data")
+    if station is None:
+        station = stations.lookup(envelope.get_locale(handler_input))
+        request_attr["audio_data"] = station
+    return station
 
-def audio_data(request):
-    # type: (Request) -> Dict
-    default_locale = "en-US"
-    if request.locale is None:
-        locale = default_locale
-    else:
-        locale = request.locale
-
-    if locale.startswith("en"):
-        return data.en
-    elif locale.startswith("fr"):
-        return data.fr
-    elif locale.startswith("it"):
-        return data.it
-    elif locale.startswith("es"):
-        return data.es
-    else:
-        return {}
+
+def stream_url(handler_input):
+    """Url to play the station from, the first one whose circuit is closed
+    in the container and for the user."""
+    # type: (HandlerInput) -> str
+    return failover.pick(get_audio_data(handler_input),
+                         handler_input.attributes_manager.persistent_attributes)
 
 
 def play(url, offset, text, card_data, response_builder):
@@ -46,14 +43,7 @@ def play(url, offset, text, card_data, response_builder):
     """
     # type: (str, int, str, Dict, ResponseFactory) -> Response
     if card_data:
-        response_builder.set_card(
-            StandardCard(
-                title=card_data["title"], text=card_data["text"],
-                image=Image(
-                    small_image_url=card_data["small_image_url"],
-                    large_image_url=card_data["large_image_url"])
-            )
-        )
+        response_builder.set_card(stations.rendered(card_data)[0])
 
     # Using URL as token as they are all unique
     response_builder.add_directive(
@@ -119,27 +109,9 @@ def clear(response_builder):
     return response_builder.response
 
 def add_screen_background(card_data):
-    # type: (Dict) -> Optional[AudioItemMetadata]
+    # type: (Mapping) -> Optional[AudioItemMetadata]
     if card_data:
-        metadata = AudioItemMetadata(
-            title=card_data["title"],
-            subtitle=card_data["text"],
-            art=display.Image(
-                content_description=card_data["title"],
-                sources=[
-                    display.ImageInstance(
-                        url="https://alexademo.ninja/skills/logo-512.png")
-                ]
-            )
-            , background_image=display.Image(
-                content_description=card_data["title"],
-                sources=[
-                    display.ImageInstance(
-                        url="https://alexademo.ninja/skills/logo-512.png")
-                ]
-            )
-        )
-        return metadata
+        return stations.rendered(card_data)[1]
     else:
         return None
 
@@ -148,13 +120,13 @@ def should_play_jingle(handler_input):
     # type: (HandlerInput) -> bool
     will_play_jingle = False
 
-    jingle_data = audio_data(handler_input.request_envelope.request)
+    jingle_data = get_audio_data(handler_input)
     if jingle_data is None or "start_jingle" not in jingle_data:
         return will_play_jingle
 
     attr = handler_input.attributes_manager.persistent_attributes
 
-    if attr is None or not attr.keys():
+    if attr is None or "last_played" not in attr:
         attr["last_played"] = "0001/01/01 00:00:00:000000"
         attr["played_count"] = 0
         handler_input.attributes_manager.persistent_attributes = attr
@@ -1,19 +1,39 @@
 # -*- coding: utf-8 -*-
 
+import json
 import logging
-import gettext
-from ask_sdk.standard import StandardSkillBuilder
+import os
+from typing import Dict, Optional
+from ask_sdk_core.skill_builder import CustomSkillBuilder
 from ask_sdk_core.dispatch_components import (
     AbstractRequestHandler, AbstractExceptionHandler,
     AbstractRequestInterceptor, AbstractResponseInterceptor)
 from ask_sdk_core.utils import is_request_type, is_intent_name
 from ask_sdk_core.handler_input import HandlerInput
-from ask_sdk_model import Response
-
-from alexa import data, util
-
-sb = StandardSkillBuilder(
-    table_name=data.jingle["db_table"], auto_create_table=True)
+from ask_sdk_core.serialize import DefaultSerializer
+from ask_sdk_core.skill import CustomSkill, RESPONSE_FORMAT_VERSION
+from ask_sdk_runtime.utils import UserAgentManager
+from ask_sdk_model import RequestEnvelope, Response, ResponseEnvelope
+
+from alexa import (
+    data, envelope, util, dispatch, localization, logs, persistence,
+    responses, serializer)
+
+
+def is_state_request(request_envelope):
+    """Whether the attributes of the request are read from the table even
+    when cached: resuming and failing over the stream, which can race a
+    write from another device of the user."""
+    # type: (RequestEnvelope) -> bool
+    return envelope.request_name(request_envelope) in (
+        "AMAZON.ResumeIntent", "AudioPlayer.PlaybackFailed")
+
+
+persistence_adapter = persistence.VersionedCacheDynamoDbAdapter(
+    table_name=data.jingle["db_table"],
+    cache_size=int(os.environ.get("ATTRIBUTES_CACHE_SIZE", "1000")),
+    read_through=is_state_request)
+sb = CustomSkillBuilder(persistence_adapter=persistence_adapter)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
@@ -21,7 +41,7 @@ logger.setLevel(logging.DEBUG)
 # This section contains handlers for the built-in intents and generic
 # request handlers like launch, session end, skill events etc.
 
-class CheckAudioInterfaceHandler(AbstractRequestHandler):
+class CheckAudioInterfaceHandler(responses.StaticResponseHandler):
     """Check if device supports audio play.
 
     This can be used as the first handler to be checked, before invoking
@@ -39,13 +59,17 @@ class CheckAudioInterfaceHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In CheckAudioInterfaceHandler")
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         _ = handler_input.attributes_manager.request_attributes["_"]
         handler_input.response_builder.speak(
             _(data.DEVICE_NOT_SUPPORTED)).set_should_end_session(True)
         return handler_input.response_builder.response
 
 
-class SkillEventHandler(AbstractRequestHandler):
+class SkillEventHandler(responses.StaticResponseHandler):
     """Close session for skill events or when session ends.
 
     Handler to handle session end or skill events (SkillEnabled,
@@ -53,18 +77,21 @@ class SkillEventHandler(AbstractRequestHandler):
     """
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
-        return (handler_input.request_envelope.request.object_type.startswith(
-            "AlexaSkillEvent") or
-                is_request_type("SessionEndedRequest")(handler_input))
+        request_type = envelope.get_request_type(handler_input)
+        return (request_type.startswith("AlexaSkillEvent") or
+                request_type == "SessionEndedRequest")
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In SkillEventHandler")
-        return handler_input.response_builder.response
+        return self.cached_response(handler_input)
 
 
 class LaunchRequestOrPlayAudioHandler(AbstractRequestHandler):
     """Launch radio for skill launch or PlayAudio intent."""
+    request_types = ("LaunchRequest",)
+    intent_names = ("PlayAudio",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return (is_request_type("LaunchRequest")(handler_input) or
@@ -75,27 +102,29 @@ class LaunchRequestOrPlayAudioHandler(AbstractRequestHandler):
         logger.info("In LaunchRequestOrPlayAudioHandler")
 
         _ = handler_input.attributes_manager.request_attributes["_"]
-        request = handler_input.request_envelope.request
+        audio_data = util.get_audio_data(handler_input)
 
-        if util.audio_data(request)["start_jingle"]:
+        if audio_data["start_jingle"]:
             if util.should_play_jingle(handler_input):
-                return util.play(url=util.audio_data(request)["start_jingle"],
+                return util.play(url=audio_data["start_jingle"],
                                  offset=0,
                                  text=_(data.WELCOME_MSG).format(
-                                     util.audio_data(request)["card"]["title"]),
-                                 card_data=util.audio_data(request)["card"],
+                                     audio_data["card"]["title"]),
+                                 card_data=audio_data["card"],
                                  response_builder=handler_input.response_builder)
 
-        return util.play(url=util.audio_data(request)["url"],
+        return util.play(url=util.stream_url(handler_input),
                          offset=0,
                          text=_(data.WELCOME_MSG).format(
-                             util.audio_data(request)["card"]["title"]),
-                         card_data=util.audio_data(request)["card"],
+                             audio_data["card"]["title"]),
+                         card_data=audio_data["card"],
                          response_builder=handler_input.response_builder)
 
 
-class HelpIntentHandler(AbstractRequestHandler):
+class HelpIntentHandler(responses.StaticResponseHandler):
     """Handler for providing help information to user."""
+    intent_names = ("AMAZON.HelpIntent",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_intent_name("AMAZON.HelpIntent")(handler_input)
@@ -103,16 +132,19 @@ class HelpIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In HelpIntentHandler")
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         _ = handler_input.attributes_manager.request_attributes["_"]
         handler_input.response_builder.speak(
             _(data.HELP_MSG).format(
-                util.audio_data(
-                    handler_input.request_envelope.request)["card"]["title"])
+                util.get_audio_data(handler_input)["card"]["title"])
         ).set_should_end_session(False)
         return handler_input.response_builder.response
 
 
-class UnhandledIntentHandler(AbstractRequestHandler):
+class UnhandledIntentHandler(responses.StaticResponseHandler):
     """Handler for fallback intent, for unmatched utterances.
 
     2018-July-12: AMAZON.FallbackIntent is currently available in all
@@ -121,6 +153,8 @@ class UnhandledIntentHandler(AbstractRequestHandler):
     on the fallback intent can be found here:
     https://developer.amazon.com/docs/custom-skills/standard-built-in-intents.html#fallback
     """
+    intent_names = ("AMAZON.FallbackIntent",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_intent_name("AMAZON.FallbackIntent")(handler_input)
@@ -128,14 +162,20 @@ class UnhandledIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In UnhandledIntentHandler")
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         _ = handler_input.attributes_manager.request_attributes["_"]
         handler_input.response_builder.speak(
             _(data.UNHANDLED_MSG)).set_should_end_session(True)
         return handler_input.response_builder.response
 
 
-class NextOrPreviousIntentHandler(AbstractRequestHandler):
+class NextOrPreviousIntentHandler(responses.StaticResponseHandler):
     """Handler for next or previous intents."""
+    intent_names = ("AMAZON.NextIntent", "AMAZON.PreviousIntent")
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return (is_intent_name("AMAZON.NextIntent")(handler_input) or
@@ -144,14 +184,21 @@ class NextOrPreviousIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In NextOrPreviousIntentHandler")
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         _ = handler_input.attributes_manager.request_attributes["_"]
         handler_input.response_builder.speak(
             _(data.CANNOT_SKIP_MSG)).set_should_end_session(True)
         return handler_input.response_builder.response
 
 
-class CancelOrStopIntentHandler(AbstractRequestHandler):
+class CancelOrStopIntentHandler(responses.StaticResponseHandler):
     """Handler for cancel, stop or pause intents."""
+    intent_names = ("AMAZON.CancelIntent", "AMAZON.StopIntent",
+                    "AMAZON.PauseIntent")
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return (is_intent_name("AMAZON.CancelIntent")(handler_input) or
@@ -161,12 +208,18 @@ class CancelOrStopIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In CancelOrStopIntentHandler")
+        return self.cached_response(handler_input)
+
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         _ = handler_input.attributes_manager.request_attributes["_"]
         return util.stop(_(data.STOP_MSG), handler_input.response_builder)
 
 
 class ResumeIntentHandler(AbstractRequestHandler):
     """Handler for resume intent."""
+    intent_names = ("AMAZON.ResumeIntent",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_intent_name("AMAZON.ResumeIntent")(handler_input)
@@ -174,18 +227,21 @@ class ResumeIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In ResumeIntentHandler")
-        request = handler_input.request_envelope.request
+        audio_data = util.get_audio_data(handler_input)
         _ = handler_input.attributes_manager.request_attributes["_"]
-        speech = _(data.RESUME_MSG).format(
-            util.audio_data(request)["card"]["title"])
+        speech = _(data.RESUME_MSG).format(audio_data["card"]["title"])
         return util.play(
-            url=util.audio_data(request)["url"], offset=0,
-            text=speech, card_data=util.audio_data(request)["card"],
+            url=util.stream_url(handler_input), offset=0,
+            text=speech, card_data=audio_data["card"],
             response_builder=handler_input.response_builder)
 
 
-class StartOverIntentHandler(AbstractRequestHandler):
+class StartOverIntentHandler(responses.StaticResponseHandler):
     """Handler for start over, loop on/off, shuffle on/off intent."""
+    intent_names = ("AMAZON.StartOverIntent", "AMAZON.LoopOnIntent",
+                    "AMAZON.LoopOffIntent", "AMAZON.ShuffleOnIntent",
+                    "AMAZON.ShuffleOffIntent")
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return (is_intent_name("AMAZON.StartOverIntent")(handler_input) or
@@ -197,7 +253,10 @@ class StartOverIntentHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In StartOverIntentHandler")
+        return self.cached_response(handler_input)
 
+    def build_response(self, handler_input):
+        # type: (HandlerInput) -> Response
         _ = handler_input.attributes_manager.request_attributes["_"]
         speech = _(data.NOT_POSSIBLE_MSG)
         return handler_input.response_builder.speak(speech).response
@@ -207,12 +266,14 @@ class StartOverIntentHandler(AbstractRequestHandler):
 # ########## AUDIOPLAYER INTERFACE HANDLERS #########################
 # This section contains handlers related to Audioplayer interface
 
-class PlaybackStartedHandler(AbstractRequestHandler):
+class PlaybackStartedHandler(responses.StaticResponseHandler):
     """AudioPlayer.PlaybackStarted Directive received.
 
     Confirming that the requested audio file began playing.
     Do not send any specific response.
     """
+    request_types = ("AudioPlayer.PlaybackStarted",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackStarted")(handler_input)
@@ -221,14 +282,16 @@ class PlaybackStartedHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         logger.info("In PlaybackStartedHandler")
         logger.info("Playback started")
-        return handler_input.response_builder.response
+        return self.cached_response(handler_input)
 
-class PlaybackFinishedHandler(AbstractRequestHandler):
+class PlaybackFinishedHandler(responses.StaticResponseHandler):
     """AudioPlayer.PlaybackFinished Directive received.
 
     Confirming that the requested audio file completed playing.
     Do not send any specific response.
     """
+    request_types = ("AudioPlayer.PlaybackFinished",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackFinished")(handler_input)
@@ -237,15 +300,17 @@ class PlaybackFinishedHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         logger.info("In PlaybackFinishedHandler")
         logger.info("Playback finished")
-        return handler_input.response_builder.response
+        return self.cached_response(handler_input)
 
 
-class PlaybackStoppedHandler(AbstractRequestHandler):
+class PlaybackStoppedHandler(responses.StaticResponseHandler):
     """AudioPlayer.PlaybackStopped Directive received.
 
     Confirming that the requested audio file stopped playing.
     Do not send any specific response.
     """
+    request_types = ("AudioPlayer.PlaybackStopped",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackStopped")(handler_input)
@@ -254,7 +319,7 @@ class PlaybackStoppedHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         logger.info("In PlaybackStoppedHandler")
         logger.info("Playback stopped")
-        return handler_input.response_builder.response
+        return self.cached_response(handler_input)
 
 
 class PlaybackNearlyFinishedHandler(AbstractRequestHandler):
@@ -262,6 +327,8 @@ class PlaybackNearlyFinishedHandler(AbstractRequestHandler):
 
     Replacing queue with the URL again. This should not happen on live streams.
     """
+    request_types = ("AudioPlayer.PlaybackNearlyFinished",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackNearlyFinished")(handler_input)
@@ -270,46 +337,65 @@ class PlaybackNearlyFinishedHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         logger.info("In PlaybackNearlyFinishedHandler")
         logger.info("Playback nearly finished")
-        request = handler_input.request_envelope.request
+        audio_data = util.get_audio_data(handler_input)
         return util.play_later(
-            url=util.audio_data(request)["url"],
-            card_data=util.audio_data(request)["card"],
+            url=util.stream_url(handler_input),
+            card_data=audio_data["card"],
             response_builder=handler_input.response_builder)
 
 
 class PlaybackFailedHandler(AbstractRequestHandler):
     """AudioPlayer.PlaybackFailed Directive received.
 
-    Logging the error and restarting playing with no output speech and card.
+    Logging the error and restarting playing from the next healthy url of
+    the station with no output speech and card. Playback stops when no url
+    is healthy or the user ran out of retries.
     """
+    request_types = ("AudioPlayer.PlaybackFailed",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("AudioPlayer.PlaybackFailed")(handler_input)
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
+        from alexa import failover
+
         logger.info("In PlaybackFailedHandler")
         request = handler_input.request_envelope.request
-        logger.info("Playback failed: {}".format(request.error))
+        attributes_manager = handler_input.attributes_manager
+        # The token of a stream is its url
+        url = failover.fail_over(
+            util.get_audio_data(handler_input), request.token,
+            attributes_manager.persistent_attributes,
+            envelope.get_request_id(handler_input))
+        attributes_manager.save_persistent_attributes()
+        logs.log(logger, logging.INFO, handler_input, "playback_failed",
+                 error=request.error, retry_url=url)
+        if url is None:
+            return handler_input.response_builder.response
         return util.play(
-            url=util.audio_data(request)["url"], offset=0, text=None,
+            url=url, offset=0, text=None,
             card_data=None,
             response_builder=handler_input.response_builder)
 
 
-class ExceptionEncounteredHandler(AbstractRequestHandler):
+class ExceptionEncounteredHandler(responses.StaticResponseHandler):
     """Handler to handle exceptions from responses sent by AudioPlayer
     request.
     """
+    request_types = ("System.ExceptionEncountered",)
+
     def can_handle(self, handler_input):
         # type; (HandlerInput) -> bool
         return is_request_type("System.ExceptionEncountered")(handler_input)
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
-        logger.info("\n**************** EXCEPTION *******************")
-        logger.info(handler_input.request_envelope)
-        return handler_input.response_builder.response
+        logs.log(logger, logging.ERROR, handler_input,
+                 "system_exception_encountered",
+                 request_envelope=handler_input.request_envelope)
+        return self.cached_response(handler_input)
 
 # ###################################################################
 
@@ -323,6 +409,8 @@ class PlayCommandHandler(AbstractRequestHandler):
     This handler handles the play command sent through hardware buttons such
     as remote control or the play control from Alexa-devices with a screen.
     """
+    request_types = ("PlaybackController.PlayCommandIssued",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type(
@@ -331,18 +419,17 @@ class PlayCommandHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         logger.info("In PlayCommandHandler")
-        _ = handler_input.attributes_manager.request_attributes["_"]
-        request = handler_input.request_envelope.request
+        audio_data = util.get_audio_data(handler_input)
 
-        if util.audio_data(request)["start_jingle"]:
+        if audio_data["start_jingle"]:
             if util.should_play_jingle(handler_input):
-                return util.play(url=util.audio_data(request)["start_jingle"],
+                return util.play(url=audio_data["start_jingle"],
                                  offset=0,
                                  text=None,
                                  card_data=None,
                                  response_builder=handler_input.response_builder)
 
-        return util.play(url=util.audio_data(request)["url"],
+        return util.play(url=util.stream_url(handler_input),
                          offset=0,
                          text=None,
                          card_data=None,
@@ -357,6 +444,9 @@ class NextOrPreviousCommandHandler(AbstractRequestHandler):
     buttons such as remote control or the next/previous control from
     Alexa-devices with a screen.
     """
+    request_types = ("PlaybackController.NextCommandIssued",
+                     "PlaybackController.PreviousCommandIssued")
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return (is_request_type(
@@ -377,6 +467,8 @@ class PauseCommandHandler(AbstractRequestHandler):
     buttons such as remote control or the pause control from
     Alexa-devices with a screen.
     """
+    request_types = ("PlaybackController.PauseCommandIssued",)
+
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
         return is_request_type("PlaybackController.PauseCommandIssued")(
@@ -397,7 +489,8 @@ class CatchAllExceptionHandler(AbstractExceptionHandler):
     """
     def can_handle(self, handler_input, exception):
         # type: (HandlerInput, Exception) -> bool
-        return True
+        # Conflicting writes are handled again by lambda_handler
+        return not isinstance(exception, persistence.WriteConflict)
 
     def handle(self, handler_input, exception):
         # type: (HandlerInput, Exception) -> Response
@@ -406,8 +499,7 @@ class CatchAllExceptionHandler(AbstractExceptionHandler):
         _ = handler_input.attributes_manager.request_attributes["_"]
         handler_input.response_builder.speak(_(data.UNHANDLED_MSG)).ask(
             _(data.HELP_MSG).format(
-                util.audio_data(
-                    handler_input.request_envelope.request)["card"]["title"]))
+                util.get_audio_data(handler_input)["card"]["title"]))
 
         return handler_input.response_builder.response
 
@@ -418,8 +510,8 @@ class RequestLogger(AbstractRequestInterceptor):
     """Log the alexa requests."""
     def process(self, handler_input):
         # type: (HandlerInput) -> None
-        logger.debug("Alexa Request: {}".format(
-            handler_input.request_envelope.request))
+        logs.log(logger, logging.DEBUG, handler_input, "request",
+                 request=envelope.get_request(handler_input))
 
 
 class LocalizationInterceptor(AbstractRequestInterceptor):
@@ -427,38 +519,24 @@ class LocalizationInterceptor(AbstractRequestInterceptor):
 
     This interceptors processes the locale in request, and loads the locale
     specific localization strings for the function `_`, that is used during
-    responses.
+    responses. Catalogs are loaded once per container, so this does no
+    file access on warm requests.
     """
     def process(self, handler_input):
         # type: (HandlerInput) -> None
-        locale = getattr(handler_input.request_envelope.request, 'locale', None)
-        logger.info("Locale is {}".format(locale))
-        if locale:
-            if locale.startswith("fr"):
-                locale_file_name = "fr-FR"
-            elif locale.startswith("it"):
-                locale_file_name = "it-IT"
-            elif locale.startswith("es"):
-                locale_file_name = "es-ES"
-            else:
-                locale_file_name = locale
-
-            logger.info("Loading locale file: {}".format(locale_file_name))
-            i18n = gettext.translation(
-                'data', localedir='locales', languages=[locale_file_name],
-                fallback=True)
-            handler_input.attributes_manager.request_attributes[
-                "_"] = i18n.gettext
-        else:
-            handler_input.attributes_manager.request_attributes[
-                "_"] = gettext.gettext
+        locale = envelope.get_locale(handler_input)
+        logs.log(logger, logging.INFO, handler_input, "locale",
+                 locale=locale)
+        handler_input.attributes_manager.request_attributes[
+            "_"] = localization.get_gettext(locale)
 
 
 class ResponseLogger(AbstractResponseInterceptor):
     """Log the alexa responses."""
     def process(self, handler_input, response):
         # type: (HandlerInput, Response) -> None
-        logger.debug("Alexa Response: {}".format(response))
+        logs.log(logger, logging.DEBUG, handler_input, "response",
+                 response=response)
 
 # ###################################################################
 
@@ -492,5 +570,94 @@ sb.add_global_request_interceptor(RequestLogger())
 sb.add_global_request_interceptor(LocalizationInterceptor())
 sb.add_global_response_interceptor(ResponseLogger())
 
+# Skill built once per container, on the first request, with handlers
+# looked up by request type and intent name and responses written by the
+# fast serializer. Set VERIFY_DISPATCH=true or VERIFY_SERIALIZER=true to
+# check each decision or response against the SDK implementation.
+_skill = None
+
+
+def get_skill():
+    # type: () -> CustomSkill
+    global _skill
+    if _skill is None:
+        from alexa import api_client
+        sb.api_client = api_client.LazyApiClient()
+        skill = sb.create()
+        skill.request_dispatcher.request_mappers = [
+            dispatch.IndexedRequestMapper(
+                skill.request_dispatcher.request_mappers[
+                    0].request_handler_chains,
+                verify=os.environ.get("VERIFY_DISPATCH") == "true")]
+        if os.environ.get("FAST_SERIALIZER", "true") == "true":
+            skill.serializer = serializer.ResponseSerializer(
+                verify=os.environ.get("VERIFY_SERIALIZER") == "true")
+        _skill = skill
+    return _skill
+
+
+# With LAZY_INIT=false, the skill and the DynamoDb connection are set up
+# when the function is loaded, eg for provisioned concurrency.
+if os.environ.get("LAZY_INIT", "true") != "true":
+    get_skill()
+    persistence_adapter.connect()
+
+
+# AudioPlayer lifecycle events only get an empty response, which is
+# returned straight from the raw event, before deserialization,
+# interceptors and persistence. Disable with FAST_LIFECYCLE_EVENTS=false.
+FAST_LIFECYCLE_EVENTS = os.environ.get(
+    "FAST_LIFECYCLE_EVENTS", "true") == "true"
+LIFECYCLE_EVENTS = frozenset((
+    "AudioPlayer.PlaybackStarted",
+    "AudioPlayer.PlaybackFinished",
+    "AudioPlayer.PlaybackStopped"))
+EMPTY_RESPONSE_ENVELOPE = DefaultSerializer().serialize(ResponseEnvelope(
+    response=Response(), version=RESPONSE_FORMAT_VERSION,
+    user_agent=UserAgentManager.get_user_agent()))
+fast_path_stats = dict.fromkeys(LIFECYCLE_EVENTS, 0)
+
+
+def fast_lifecycle_response(event):
+    """Return the empty response for a lifecycle event, else None."""
+    # type: (Dict) -> Optional[Dict]
+    request_type = event.get("request", {}).get("type")
+    if request_type not in LIFECYCLE_EVENTS:
+        return None
+
+    fast_path_stats[request_type] += 1
+    if logger.isEnabledFor(logging.DEBUG) and logs.sampled(request_type):
+        logger.debug("%s", logs.JsonLine(
+            "fast_path", request_type=request_type,
+            hits=fast_path_stats[request_type]))
+    response_envelope = dict(EMPTY_RESPONSE_ENVELOPE)
+    session = event.get("session")
+    if session is not None:
+        response_envelope["sessionAttributes"] = session.get("attributes")
+    return response_envelope
+
+
+# Request envelopes are deserialized part by part, when first read by
+# the skill. Set LAZY_ENVELOPE=false to deserialize them whole up front.
+LAZY_ENVELOPE = os.environ.get("LAZY_ENVELOPE", "true") == "true"
+
+
 # AWS Lambda handler
-lambda_handler = sb.lambda_handler()
+def lambda_handler(event, context):
+    # type: (Dict, object) -> Dict
+    if FAST_LIFECYCLE_EVENTS:
+        response_envelope = fast_lifecycle_response(event)
+        if response_envelope is not None:
+            return response_envelope
+
+    skill = get_skill()
+    if LAZY_ENVELOPE:
+        request_envelope = envelope.LazyRequestEnvelope(
+            event, skill.serializer)  # type: RequestEnvelope
+    else:
+        request_envelope = skill.serializer.deserialize(
+            payload=json.dumps(event), obj_type=RequestEnvelope)
+    response_envelope = persistence_adapter.handle(
+        lambda: skill.invoke(
+            request_envelope=request_envelope, context=context))
+    return skill.serializer.serialize(response_envelope)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Break the cold start of the skills down by step and by import.
+
+Run from the repository root::
+
+    python -m benchmarks.coldstart --request LaunchRequest
+
+For every skill and first request type, a fresh interpreter started
+with ``-X importtime`` imports ``lambda_function``, builds the skill and
+handles the first request, then a second one. The report gives the
+time of each step, including the creation of the DynamoDb resource when
+the request uses persistence, and the slowest modules imported during
+each step. DynamoDb calls go to the in-memory stand-in
+of ``benchmarks.dynamodb``; the boto3 resource is created for real, to
+time it, but not used.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKILLS = ("MultiStream", "SingleStream")
+DEFAULT_REQUESTS = ("LaunchRequest", "AudioPlayer.PlaybackStarted")
+
+ENTER = "coldstart-enter: "
+EXIT = "coldstart-exit: "
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+_steps = []  # type: List[Tuple[str, int, float]]
+_depth = [0]
+
+
+@contextmanager
+def step(name):
+    """Time a step and mark it in the import time log."""
+    # type: (str) -> Iterator[None]
+    sys.stderr.write(ENTER + name + "\n")
+    sys.stderr.flush()
+    index = len(_steps)
+    _steps.append((name, _depth[0], 0.0))
+    _depth[0] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _steps[index] = (name, _depth[0] - 1, time.perf_counter() - start)
+        _depth[0] -= 1
+        sys.stderr.write(EXIT + name + "\n")
+        sys.stderr.flush()
+
+
+def run_child(skill, request_type):
+    """Cold start the skill with a request, print the step times."""
+    # type: (str, str) -> None
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    sys.path.insert(0, os.path.join(REPO_ROOT, skill, "lambda", "py"))
+
+    with step("import lambda_function"):
+        lambda_function = importlib.import_module("lambda_function")
+    with step("build skill"):
+        lambda_function.get_skill()
+
+    from benchmarks.dynamodb import InMemoryDynamoDb
+    from benchmarks.envelopes import envelope
+
+    adapter_class = type(lambda_function.persistence_adapter)
+
+    def dynamodb(adapter):
+        if adapter._dynamodb is None:
+            with step("create DynamoDb resource"):
+                import boto3
+                boto3.resource("dynamodb")
+            adapter._dynamodb = InMemoryDynamoDb()
+        return adapter._dynamodb
+
+    adapter_class.dynamodb = property(
+        dynamodb, adapter_class.dynamodb.fset)
+
+    token = "https://example.com/stream.mp3"
+    audio_player = request_type.startswith("AudioPlayer.")
+    request = envelope(
+        "coldstart-user", request_type,
+        token=token if audio_player else None,
+        activity="PLAYING" if audio_player else "IDLE",
+        session=not audio_player)
+    with step("first request"):
+        lambda_function.lambda_handler(request, None)
+    with step("second request"):
+        lambda_function.lambda_handler(request, None)
+
+    json.dump(_steps, sys.stdout)
+
+
+def parse_imports(log):
+    """Top-level imports by step, from the ``-X importtime`` log."""
+    # type: (str) -> Dict[str, List[Tuple[str, float]]]
+    imports = {}  # type: Dict[str, List[Tuple[str, float]]]
+    stack = ["interpreter"]
+    top_indent = {}  # type: Dict[str, int]
+    for line in log.splitlines():
+        if line.startswith(ENTER):
+            stack.append(line[len(ENTER):])
+            continue
+        if line.startswith(EXIT):
+            stack.pop()
+            continue
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        current = stack[-1]
+        indent = len(match.group(3))
+        # importtime prints nested imports first, so the top-level
+        # import of a step is the least indented one
+        entries = imports.setdefault(current, [])
+        entries.append((indent, match.group(4),
+                        int(match.group(2)) / 1000.0))
+        top_indent[current] = min(top_indent.get(current, indent), indent)
+
+    return {
+        name: sorted(((module, ms) for indent, module, ms in entries
+                      if indent == top_indent[name]),
+                     key=lambda entry: -entry[1])
+        for name, entries in imports.items()}
+
+
+def cold_start(skill, request_type, lazy=True):
+    # type: (str, str, bool) -> Tuple[List, Dict[str, List[Tuple[str, float]]]]
+    env = dict(os.environ, LAZY_INIT="true" if lazy else "false")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "benchmarks.coldstart",
+         "--child", skill, "--request", request_type],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, check=True)
+    steps = json.loads(process.stdout.decode("utf-8"))
+    return steps, parse_imports(process.stderr.decode("utf-8"))
+
+
+def print_report(skill, request_type, steps, imports, top):
+    # type: (str, str, List, Dict[str, List[Tuple[str, float]]], int) -> None
+    print("\n{}, first request {}".format(skill, request_type))
+    print("{:<40} {:>10} {:>12}".format("step", "ms", "imports ms"))
+    for name, depth, seconds in steps:
+        print("{:<40} {:>10.1f} {:>12.1f}".format(
+            "  " * depth + name, seconds * 1000,
+            sum(ms for _, ms in imports.get(name, []))))
+    for name, _, _ in steps:
+        slowest = imports.get(name, [])[:top]
+        if slowest:
+            print("  imports of {}: {}".format(name, ", ".join(
+                "{} {:.1f}".format(module, ms) for module, ms in slowest)))
+
+
+def parse_args(argv=None):
+    # type: (Optional[List[str]]) -> argparse.Namespace
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--skill", choices=SKILLS, action="append",
+                        help="skill to profile, both by default")
+    parser.add_argument("--request", action="append",
+                        help="type of the first request, repeatable; {} "
+                             "by default".format(
+                                 " and ".join(DEFAULT_REQUESTS)))
+    parser.add_argument("--top", type=int, default=5,
+                        help="number of imports listed per step")
+    parser.add_argument("--child", choices=SKILLS, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    args = parse_args(argv)
+    if args.child:
+        run_child(args.child, args.request[0])
+        return
+
+    for skill in args.skill or SKILLS:
+        for request_type in args.request or DEFAULT_REQUESTS:
+            steps, imports = cold_start(skill, request_type)
+            print_report(skill, request_type, steps, imports, args.top)
+
+
+if __name__ == "__main__":
+    main()
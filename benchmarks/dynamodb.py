@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+from collections import Counter
+from copy import deepcopy
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+
+class ConditionalCheckFailedException(Exception):
+    """Raised when the condition of a write is not met."""
+
+
+class ResourceInUseException(Exception):
+    """Raised when creating a table that already exists."""
+
+
+def _to_dynamodb(value):
+    """Convert numbers to Decimal, as boto3 returns them."""
+    # type: (object) -> object
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {key: _to_dynamodb(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_dynamodb(item) for item in value]
+    return value
+
+
+def item_size(value):
+    """Approximate DynamoDB size in bytes of an attribute value."""
+    # type: (object) -> int
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        return len(str(value)) // 2 + 2
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, "value"):
+        # boto3 Binary
+        return len(value.value)
+    if isinstance(value, dict):
+        return 3 + sum(len(str(key)) + item_size(item) + 1
+                       for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(item_size(item) + 1 for item in value)
+    return len(str(value))
+
+
+class _Exceptions(object):
+    ConditionalCheckFailedException = ConditionalCheckFailedException
+    ResourceInUseException = ResourceInUseException
+
+
+class _Client(object):
+    exceptions = _Exceptions
+
+
+class _Meta(object):
+    client = _Client
+
+
+class InMemoryTable(object):
+    """Table of an :class:`InMemoryDynamoDb`.
+
+    Supports the item operations and expressions used by the skills'
+    persistence adapters: ``SET``, ``ADD`` and ``REMOVE`` of attribute
+    paths, ``attribute_exists``, ``attribute_not_exists`` and equality
+    conditions.
+    """
+    def __init__(self, resource, name):
+        # type: (InMemoryDynamoDb, str) -> None
+        self.resource = resource
+        self.name = name
+        self.meta = _Meta
+
+    @property
+    def _items(self):
+        # type: () -> Dict[str, Dict]
+        return self.resource.tables[self.name]
+
+    def _key(self, key):
+        # type: (Dict) -> str
+        return next(iter(key.values()))
+
+    def _check(self, item, condition, names, values):
+        # type: (Optional[Dict], Optional[str], Dict, Dict) -> None
+        if not condition:
+            return
+        match = re.match(r"attribute_(not_)?exists\((#\w+)\)$", condition)
+        if match:
+            exists = item is not None and names[match.group(2)] in item
+            met = exists != bool(match.group(1))
+        else:
+            match = re.match(r"(#\w+)\s*=\s*(:\w+)$", condition)
+            if not match:
+                raise ValueError(
+                    "Unsupported condition: {}".format(condition))
+            met = item is not None and item.get(
+                names[match.group(1)]) == _to_dynamodb(
+                values[match.group(2)])
+        if not met:
+            raise ConditionalCheckFailedException(
+                "The conditional request failed")
+
+    def get_item(self, Key, ConsistentRead=False):
+        # type: (Dict, bool) -> Dict
+        self.resource.call("get_item")
+        item = self._items.get(self._key(Key))
+        return {"Item": deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item, ConditionExpression=None,
+                 ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None):
+        # type: (Dict, Optional[str], Optional[Dict], Optional[Dict]) -> Dict
+        self.resource.call("put_item")
+        key = Item[self.resource.key_names.get(self.name, "id")]
+        self.resource.count_write(key, item_size(Item))
+        self._check(self._items.get(key), ConditionExpression,
+                    ExpressionAttributeNames or {},
+                    ExpressionAttributeValues or {})
+        self._items[key] = _to_dynamodb(deepcopy(Item))
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames,
+                    ExpressionAttributeValues=None, ConditionExpression=None):
+        # type: (Dict, str, Dict, Optional[Dict], Optional[str]) -> Dict
+        self.resource.call("update_item")
+        values = ExpressionAttributeValues or {}
+        key = self._key(Key)
+        self.resource.count_write(key, item_size(values))
+        self._check(self._items.get(key), ConditionExpression,
+                    ExpressionAttributeNames, values)
+        item = self._items.setdefault(key, _to_dynamodb(dict(Key)))
+
+        def resolve(path):
+            # type: (str) -> Tuple[Dict, str]
+            segments = [ExpressionAttributeNames[s.strip()]
+                        for s in path.split(".")]
+            target = item
+            for segment in segments[:-1]:
+                target = target[segment]
+            return target, segments[-1]
+
+        for action, clauses in re.findall(
+                r"(SET|ADD|REMOVE)\s+(.*?)(?=\s+(?:SET|ADD|REMOVE)\s+|$)",
+                UpdateExpression):
+            for clause in clauses.split(","):
+                if action == "SET":
+                    path, value = clause.split("=")
+                    target, name = resolve(path)
+                    target[name] = _to_dynamodb(
+                        deepcopy(values[value.strip()]))
+                elif action == "ADD":
+                    # Numbers only
+                    path, value = clause.split()
+                    target, name = resolve(path)
+                    target[name] = target.get(name, 0) + _to_dynamodb(
+                        values[value])
+                else:
+                    target, name = resolve(clause)
+                    target.pop(name, None)
+        return {}
+
+    def delete_item(self, Key):
+        # type: (Dict) -> Dict
+        self.resource.call("delete_item")
+        self._items.pop(self._key(Key), None)
+        return {}
+
+
+class InMemoryDynamoDb(object):
+    """Stand-in for the boto3 DynamoDB service resource.
+
+    Every call sleeps for ``latency`` seconds, plus up to ``jitter``
+    seconds, to account for the round trip to DynamoDB, and is counted
+    in ``calls``. Writes and the approximate number of bytes they send
+    are counted per partition key in ``writes`` and ``written_bytes``.
+    """
+    def __init__(self, latency=0.0, jitter=0.0):
+        # type: (float, float) -> None
+        self.latency = latency
+        self.jitter = jitter
+        self.tables = {}  # type: Dict[str, Dict[str, Dict]]
+        self.key_names = {}  # type: Dict[str, str]
+        self.calls = Counter()  # type: Counter
+        self.writes = Counter()  # type: Counter
+        self.written_bytes = Counter()  # type: Counter
+        self.meta = _Meta
+        self._jitter_step = 0
+
+    def call(self, operation):
+        # type: (str) -> None
+        self.calls[operation] += 1
+        delay = self.latency
+        if self.jitter:
+            # Deterministic spread over [0, jitter)
+            self._jitter_step = (self._jitter_step + 7) % 16
+            delay += self.jitter * self._jitter_step / 16.0
+        if delay:
+            time.sleep(delay)
+
+    def count_write(self, key, size):
+        # type: (str, int) -> None
+        self.writes[key] += 1
+        self.written_bytes[key] += size
+
+    def Table(self, name):
+        # type: (str) -> InMemoryTable
+        self.tables.setdefault(name, {})
+        return InMemoryTable(self, name)
+
+    def create_table(self, TableName, KeySchema, **kwargs):
+        # type: (str, List[Dict], object) -> InMemoryTable
+        self.call("create_table")
+        if TableName in self.tables:
+            raise ResourceInUseException(
+                "Table already exists: {}".format(TableName))
+        self.tables[TableName] = {}
+        self.key_names[TableName] = KeySchema[0]["AttributeName"]
+        return InMemoryTable(self, TableName)
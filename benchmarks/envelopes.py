@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+from typing import Callable, Dict, Generator, Optional
+
+# A scenario is a generator function of the user id, yielding request
+# envelopes and receiving the response envelope of each, so later
+# requests can carry the stream token the skill sent.
+Scenario = Callable[[str], Generator[Dict, Optional[Dict], None]]
+
+
+def envelope(user_id, request_type, intent=None, token=None, offset=0,
+             activity="IDLE", locale="en-US", session=True):
+    """Build a request envelope as sent by an Echo device."""
+    # type: (str, str, Optional[str], Optional[str], int, str, str, bool) -> Dict
+    request = {
+        "type": request_type,
+        "requestId": "amzn1.echo-api.request.bench",
+        "timestamp": "2026-01-01T00:00:00Z",
+        "locale": locale
+    }
+    if intent is not None:
+        request["intent"] = {"name": intent, "confirmationStatus": "NONE"}
+    if request_type.startswith("AudioPlayer."):
+        request["token"] = token
+        request["offsetInMilliseconds"] = offset
+    if request_type == "AudioPlayer.PlaybackFailed":
+        request["error"] = {"type": "MEDIA_ERROR_UNKNOWN",
+                            "message": "Benchmark failure"}
+
+    audio_player = {"playerActivity": activity}
+    if token is not None:
+        audio_player["token"] = token
+        audio_player["offsetInMilliseconds"] = offset
+
+    system = {
+        "application": {"applicationId": "amzn1.ask.skill.bench"},
+        "user": {"userId": user_id},
+        "device": {
+            "deviceId": "device-" + user_id,
+            "supportedInterfaces": {"AudioPlayer": {}}
+        },
+        "apiEndpoint": "https://api.amazonalexa.com",
+        "apiAccessToken": "bench"
+    }
+    result = {
+        "version": "1.0",
+        "context": {"System": system, "AudioPlayer": audio_player},
+        "request": request
+    }
+    if session:
+        result["session"] = {
+            "new": request_type == "LaunchRequest",
+            "sessionId": "amzn1.echo-api.session.bench",
+            "application": system["application"],
+            "user": system["user"],
+            "attributes": {}
+        }
+    return result
+
+
+def stream_token(response_envelope, default=None):
+    """Token of the stream played or enqueued by the response."""
+    # type: (Optional[Dict], Optional[str]) -> Optional[str]
+    response = (response_envelope or {}).get("response", {})
+    for directive in response.get("directives", []):
+        if "audioItem" in directive:
+            return str(directive["audioItem"]["stream"]["token"])
+    return default
+
+
+def request_key(request_envelope):
+    """Intent name for intent requests, request type otherwise."""
+    # type: (Dict) -> str
+    request = request_envelope["request"]
+    if request["type"] == "IntentRequest":
+        return request["intent"]["name"]
+    return request["type"]
+
+
+def multistream_listen(user_id):
+    """Launch, play, move to the next episode, pause and resume."""
+    # type: (str) -> Generator[Dict, Optional[Dict], None]
+    yield envelope(user_id, "LaunchRequest")
+    response = yield envelope(user_id, "IntentRequest", "PlayAudio")
+    token = stream_token(response)
+    yield envelope(user_id, "AudioPlayer.PlaybackStarted", token=token,
+                   activity="PLAYING", session=False)
+    response = yield envelope(
+        user_id, "AudioPlayer.PlaybackNearlyFinished", token=token,
+        offset=1800000, activity="PLAYING", session=False)
+    next_token = stream_token(response)
+    yield envelope(user_id, "AudioPlayer.PlaybackFinished", token=token,
+                   offset=1860000, activity="FINISHED", session=False)
+    if next_token is None:
+        # End of the play order, the device stops
+        return
+    token = next_token
+    yield envelope(user_id, "AudioPlayer.PlaybackStarted", token=token,
+                   activity="PLAYING", session=False)
+    yield envelope(user_id, "IntentRequest", "AMAZON.PauseIntent",
+                   token=token, offset=42000, activity="PLAYING")
+    yield envelope(user_id, "AudioPlayer.PlaybackStopped", token=token,
+                   offset=42000, activity="STOPPED", session=False)
+    response = yield envelope(user_id, "IntentRequest",
+                              "AMAZON.ResumeIntent", token=token,
+                              offset=42000, activity="STOPPED")
+    token = stream_token(response, token)
+    yield envelope(user_id, "AudioPlayer.PlaybackStarted", token=token,
+                   offset=42000, activity="PLAYING", session=False)
+
+
+def multistream_browse(user_id):
+    """Skip through episodes with shuffle and loop switched on."""
+    # type: (str) -> Generator[Dict, Optional[Dict], None]
+    response = yield envelope(user_id, "IntentRequest", "PlayAudio")
+    token = stream_token(response)
+    for intent in ("AMAZON.ShuffleOnIntent", "AMAZON.NextIntent",
+                   "AMAZON.LoopOnIntent", "AMAZON.PreviousIntent",
+                   "AMAZON.ShuffleOffIntent"):
+        yield envelope(user_id, "AudioPlayer.PlaybackStarted",
+                       token=token, activity="PLAYING", session=False)
+        response = yield envelope(user_id, "IntentRequest", intent,
+                                  token=token, activity="PLAYING")
+        token = stream_token(response, token)
+    response = yield envelope(
+        user_id, "PlaybackController.NextCommandIssued", token=token,
+        activity="PLAYING", session=False)
+    token = stream_token(response, token)
+    yield envelope(user_id, "PlaybackController.PauseCommandIssued",
+                   token=token, activity="PLAYING", session=False)
+    yield envelope(user_id, "AudioPlayer.PlaybackStopped", token=token,
+                   offset=5000, activity="STOPPED", session=False)
+
+
+def singlestream_listen(user_id):
+    """Launch the radio, stop it and resume it."""
+    # type: (str) -> Generator[Dict, Optional[Dict], None]
+    response = yield envelope(user_id, "LaunchRequest")
+    token = stream_token(response)
+    yield envelope(user_id, "AudioPlayer.PlaybackStarted", token=token,
+                   activity="PLAYING", session=False)
+    yield envelope(user_id, "AudioPlayer.PlaybackNearlyFinished",
+                   token=token, activity="PLAYING", session=False)
+    yield envelope(user_id, "IntentRequest", "AMAZON.StopIntent",
+                   token=token, activity="PLAYING")
+    yield envelope(user_id, "AudioPlayer.PlaybackStopped", token=token,
+                   offset=60000, activity="STOPPED", session=False)
+    response = yield envelope(user_id, "IntentRequest",
+                              "AMAZON.ResumeIntent", token=token,
+                              activity="STOPPED")
+    token = stream_token(response, token)
+    yield envelope(user_id, "AudioPlayer.PlaybackStarted", token=token,
+                   activity="PLAYING", session=False)
+
+
+def singlestream_remote(user_id):
+    """Play and pause the radio from the buttons of a remote."""
+    # type: (str) -> Generator[Dict, Optional[Dict], None]
+    response = yield envelope(user_id, "PlaybackController.PlayCommandIssued",
+                              session=False)
+    token = stream_token(response)
+    yield envelope(user_id, "AudioPlayer.PlaybackStarted", token=token,
+                   activity="PLAYING", session=False)
+    yield envelope(user_id, "PlaybackController.PauseCommandIssued",
+                   token=token, activity="PLAYING", session=False)
+    yield envelope(user_id, "AudioPlayer.PlaybackStopped", token=token,
+                   offset=30000, activity="STOPPED", session=False)
+
+
+SCENARIOS = {
+    "MultiStream": {
+        "listen": multistream_listen,
+        "browse": multistream_browse
+    },
+    "SingleStream": {
+        "listen": singlestream_listen,
+        "remote": singlestream_remote
+    }
+}  # type: Dict[str, Dict[str, Scenario]]
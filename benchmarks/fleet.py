@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""Simulate a fleet of devices playing the MultiStream skill.
+
+Run from the repository root::
+
+    python -m benchmarks.fleet --devices 2000 --workers 1,2,4
+
+Every virtual device runs a listening session: it plays episodes to
+the end, skips with the Next and Previous buttons, switches shuffle and
+loop, pauses and resumes, with a think time before each event. Each
+worker process of the pool is a warm Lambda container with its own
+DynamoDB stand-in, and serves the interleaved events of its share of
+the devices as fast as it can, so the report gives the throughput
+ceiling for every number of workers, and the write amplification per
+user: DynamoDB writes and bytes written per request.
+"""
+
+import argparse
+import heapq
+import multiprocessing
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Generator, List, Optional, Sequence, Tuple
+
+from benchmarks.dynamodb import InMemoryDynamoDb, item_size
+from benchmarks.envelopes import envelope, request_key, stream_token
+from benchmarks.replay import LAMBDA_LOG_FORMAT, load_skill, percentile
+
+SKILL = "MultiStream"
+
+# Weights of what a listening device does next
+ACTIONS = (
+    ("finish", 40),
+    ("next", 20),
+    ("previous", 5),
+    ("pause", 15),
+    ("shuffle", 8),
+    ("loop", 7),
+    ("stop", 5),
+)  # type: Tuple[Tuple[str, int], ...]
+
+# Event generator of a device: yields (think time in seconds, request
+# envelope) and receives the response envelope of each request.
+Device = Generator[Tuple[float, Dict], Optional[Dict], None]
+
+_worker = {}  # type: Dict[str, object]
+
+
+def device(user_id, rng):
+    """Events of a device for one listening session."""
+    # type: (str, random.Random) -> Device
+    actions = [name for name, weight in ACTIONS for _ in range(weight)]
+    shuffle = loop = False
+
+    yield rng.uniform(0, 60), envelope(user_id, "LaunchRequest")
+    response = yield rng.uniform(2, 6), envelope(
+        user_id, "IntentRequest", "PlayAudio")
+    token = stream_token(response)
+
+    while token is not None:
+        yield rng.uniform(0.2, 1), envelope(
+            user_id, "AudioPlayer.PlaybackStarted", token=token,
+            activity="PLAYING", session=False)
+        action = rng.choice(actions)
+        listened = int(rng.uniform(10, 600) * 1000)
+
+        if action == "finish":
+            response = yield listened / 1000.0, envelope(
+                user_id, "AudioPlayer.PlaybackNearlyFinished", token=token,
+                offset=listened, activity="PLAYING", session=False)
+            next_token = stream_token(response)
+            yield rng.uniform(10, 30), envelope(
+                user_id, "AudioPlayer.PlaybackFinished", token=token,
+                offset=listened, activity="FINISHED", session=False)
+            token = next_token
+        elif action in ("next", "previous"):
+            command = ("PlaybackController.NextCommandIssued"
+                       if action == "next" else
+                       "PlaybackController.PreviousCommandIssued")
+            response = yield listened / 1000.0, envelope(
+                user_id, command, token=token, offset=listened,
+                activity="PLAYING", session=False)
+            token = stream_token(response, token)
+        elif action == "pause":
+            yield listened / 1000.0, envelope(
+                user_id, "PlaybackController.PauseCommandIssued",
+                token=token, offset=listened, activity="PLAYING",
+                session=False)
+            yield rng.uniform(0.1, 0.5), envelope(
+                user_id, "AudioPlayer.PlaybackStopped", token=token,
+                offset=listened, activity="STOPPED", session=False)
+            response = yield rng.uniform(5, 900), envelope(
+                user_id, "PlaybackController.PlayCommandIssued",
+                token=token, offset=listened, activity="STOPPED",
+                session=False)
+            token = stream_token(response, token)
+        elif action in ("shuffle", "loop"):
+            if action == "shuffle":
+                shuffle = not shuffle
+                intent = ("AMAZON.ShuffleOnIntent" if shuffle
+                          else "AMAZON.ShuffleOffIntent")
+            else:
+                loop = not loop
+                intent = ("AMAZON.LoopOnIntent" if loop
+                          else "AMAZON.LoopOffIntent")
+            response = yield listened / 1000.0, envelope(
+                user_id, "IntentRequest", intent, token=token,
+                offset=listened, activity="PLAYING")
+            token = stream_token(response, token)
+        else:
+            yield listened / 1000.0, envelope(
+                user_id, "IntentRequest", "AMAZON.StopIntent", token=token,
+                offset=listened, activity="PLAYING")
+            yield rng.uniform(0.1, 0.5), envelope(
+                user_id, "AudioPlayer.PlaybackStopped", token=token,
+                offset=listened, activity="STOPPED", session=False)
+            return
+
+
+def _init_worker(latency):
+    # type: (float) -> None
+    import logging
+    logging.basicConfig(stream=open(os.devnull, "w"),
+                        format=LAMBDA_LOG_FORMAT)
+    resource = InMemoryDynamoDb(latency=latency)
+    _worker["resource"] = resource
+    _worker["handler"] = load_skill(SKILL, resource).lambda_handler
+
+
+def simulate(user_ids, seed, max_events):
+    """Serve the events of the devices in the order of their clocks."""
+    # type: (Sequence[str], int, int) -> Dict
+    resource = _worker["resource"]  # type: InMemoryDynamoDb
+    handler = _worker["handler"]
+    writes_before = Counter(resource.writes)
+    bytes_before = Counter(resource.written_bytes)
+
+    # (time the event is sent, device number, device, envelope)
+    queue = []  # type: List[Tuple[float, int, Device, Dict]]
+    for number, user_id in enumerate(user_ids):
+        events = device(user_id, random.Random("{}-{}".format(
+            seed, user_id)))
+        think_time, request = next(events)
+        queue.append((think_time, number, events, request))
+    heapq.heapify(queue)
+
+    requests = Counter()  # type: Counter
+    requests_per_user = Counter()  # type: Counter
+    errors = 0
+    clock = 0.0
+    start = time.perf_counter()
+    while queue and sum(requests.values()) < max_events:
+        clock, number, events, request = heapq.heappop(queue)
+        requests[request_key(request)] += 1
+        requests_per_user[user_ids[number]] += 1
+        try:
+            response = handler(request, None)
+        except Exception:
+            errors += 1
+            response = None
+        try:
+            think_time, request = events.send(response)
+        except StopIteration:
+            continue
+        heapq.heappush(queue, (clock + think_time, number, events, request))
+    elapsed = time.perf_counter() - start
+
+    users = {}
+    for user_id, count in requests_per_user.items():
+        users[user_id] = {
+            "requests": count,
+            "writes": resource.writes[user_id] - writes_before[user_id],
+            "written_bytes": (resource.written_bytes[user_id] -
+                              bytes_before[user_id])
+        }
+    item_sizes = [
+        item_size(item) for key, item in
+        resource.tables.get(_table_name(resource), {}).items()
+        if key in requests_per_user]
+    return {
+        "elapsed": elapsed,
+        "simulated_seconds": clock,
+        "requests": dict(requests),
+        "errors": errors,
+        "users": users,
+        "item_sizes": item_sizes
+    }
+
+
+def _table_name(resource):
+    # type: (InMemoryDynamoDb) -> Optional[str]
+    return next(iter(resource.tables), None)
+
+
+def run_fleet(devices, workers, latency, seed, max_events):
+    """Share the devices between the workers and merge their results."""
+    # type: (int, int, float, int, int) -> Dict
+    user_ids = ["fleet-user-{}".format(i) for i in range(devices)]
+    shares = [user_ids[i::workers] for i in range(workers)]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(latency,)) as pool:
+        # Load the skill in every worker before the clock starts
+        list(pool.map(time.sleep, [0.1] * workers))
+        start = time.perf_counter()
+        results = list(pool.map(
+            simulate, shares, [seed] * workers,
+            [max_events // workers] * workers))
+        elapsed = time.perf_counter() - start
+
+    requests = Counter()  # type: Counter
+    users = {}
+    item_sizes = []
+    for result in results:
+        requests.update(result["requests"])
+        users.update(result["users"])
+        item_sizes.extend(result["item_sizes"])
+    total = sum(requests.values())
+    return {
+        "workers": workers,
+        "requests": total,
+        "errors": sum(result["errors"] for result in results),
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "worker_throughput": [
+            sum(result["requests"].values()) / result["elapsed"]
+            for result in results if result["elapsed"]],
+        "fleet_rate": total / max(
+            result["simulated_seconds"] for result in results),
+        "by_request": dict(requests),
+        "users": users,
+        "item_sizes": item_sizes
+    }
+
+
+def print_report(result):
+    # type: (Dict) -> None
+    users = list(result["users"].values())
+    writes = [float(u["writes"]) / u["requests"] for u in users]
+    written = [float(u["written_bytes"]) / u["requests"] for u in users]
+    print("\n{} worker(s): {} requests in {:.2f}s, {:.0f} requests/s "
+          "({} errors)".format(
+              result["workers"], result["requests"], result["elapsed"],
+              result["throughput"], result["errors"]))
+    print("  per worker: {}".format(", ".join(
+        "{:.0f}/s".format(rate) for rate in result["worker_throughput"])))
+    print("  the simulated fleet sends {:.1f} requests/s".format(
+        result["fleet_rate"]))
+    print("  DynamoDB writes per request and user: p50 {:.2f}, p95 {:.2f}, "
+          "max {:.2f}".format(percentile(writes, 0.5),
+                              percentile(writes, 0.95), max(writes or [0])))
+    print("  bytes written per request and user: p50 {:.0f}, p95 {:.0f}, "
+          "item size p50 {:.0f}".format(
+              percentile(written, 0.5), percentile(written, 0.95),
+              percentile(result["item_sizes"], 0.5)))
+
+
+def parse_args(argv=None):
+    # type: (Optional[List[str]]) -> argparse.Namespace
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--devices", type=int, default=1000,
+                        help="number of virtual devices")
+    parser.add_argument("--workers", default=str(os.cpu_count() or 1),
+                        help="comma separated numbers of worker processes "
+                             "to measure")
+    parser.add_argument("--max-events", type=int, default=50000,
+                        help="number of requests sent per run")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="latency injected in every DynamoDB call")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the device behaviour")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    args = parse_args(argv)
+    for workers in [int(w) for w in args.workers.split(",")]:
+        print_report(run_fleet(args.devices, workers,
+                               args.latency_ms / 1000.0, args.seed,
+                               args.max_events))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""Replay request envelopes through the skills' ``lambda_handler``.
+
+Run from the repository root::
+
+    python -m benchmarks.replay --sessions 200 --users 20 --latency-ms 5
+
+Each skill runs in its own process, as both define the ``alexa`` and
+``lambda_function`` modules, with DynamoDB replaced by the in-memory
+stand-in of ``benchmarks.dynamodb``. Synthetic sessions come from
+``benchmarks.envelopes``; recorded envelopes, one JSON object per
+line, are replayed with ``--events``.
+
+For every request type the report gives the p50, p95 and p99 latency,
+the memory allocated while handling the request and the number of
+DynamoDB calls.
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from benchmarks.dynamodb import InMemoryDynamoDb
+from benchmarks.envelopes import SCENARIOS, request_key
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKILLS = ("MultiStream", "SingleStream")
+
+# Log line format of the Python Lambda runtime, so formatting costs the
+# same as in production. Lines are written to os.devnull.
+LAMBDA_LOG_FORMAT = "[%(levelname)s]\t%(asctime)s\t%(name)s\t%(message)s"
+
+
+def skill_path(skill):
+    # type: (str) -> str
+    return os.path.join(REPO_ROOT, skill, "lambda", "py")
+
+
+def load_skill(skill, resource):
+    """Import the skill's ``lambda_function`` using ``resource`` for
+    DynamoDB.
+
+    boto3 is patched for the whole run: the persistence adapters create
+    their resource on first use, or when the module is loaded with
+    ``LAZY_INIT=false``.
+    """
+    # type: (str, InMemoryDynamoDb) -> object
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    import boto3
+
+    create_resource = boto3.resource
+
+    def resource_factory(service_name, *args, **kwargs):
+        if service_name == "dynamodb":
+            return resource
+        return create_resource(service_name, *args, **kwargs)
+
+    boto3.resource = resource_factory
+    sys.path.insert(0, skill_path(skill))
+    return importlib.import_module("lambda_function")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of the values."""
+    # type: (Sequence[float], float) -> float
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Recorder(object):
+    """Measurements of the replayed requests, by request key."""
+    def __init__(self):
+        # type: () -> None
+        self.latencies = {}  # type: Dict[str, List[float]]
+        self.allocations = {}  # type: Dict[str, List[int]]
+        self.calls = {}  # type: Dict[str, Counter]
+        self.errors = Counter()  # type: Counter
+
+    def add(self, key, latency, calls):
+        # type: (str, float, Counter) -> None
+        self.latencies.setdefault(key, []).append(latency)
+        self.calls.setdefault(key, Counter()).update(calls)
+
+    def add_allocation(self, key, size):
+        # type: (str, int) -> None
+        self.allocations.setdefault(key, []).append(size)
+
+    def report(self):
+        # type: () -> Dict
+        requests = OrderedDict()
+        for key in sorted(self.latencies):
+            latencies = self.latencies[key]
+            allocations = self.allocations.get(key, [])
+            count = len(latencies)
+            requests[key] = {
+                "count": count,
+                "p50_ms": percentile(latencies, 0.50) * 1000,
+                "p95_ms": percentile(latencies, 0.95) * 1000,
+                "p99_ms": percentile(latencies, 0.99) * 1000,
+                "alloc_p50_kib": percentile(allocations, 0.50) / 1024.0,
+                "alloc_max_kib": max(allocations or [0]) / 1024.0,
+                "dynamodb_calls": {
+                    operation: float(total) / count
+                    for operation, total in sorted(self.calls[key].items())},
+                "errors": self.errors[key]
+            }
+        return requests
+
+
+def synthetic_sessions(skill, sessions, users, scenarios):
+    """Sessions cycling through the scenarios and users of the skill."""
+    # type: (str, int, int, Sequence[str]) -> Iterator[Iterator[Dict]]
+    scenario_cycle = itertools.cycle(
+        [SCENARIOS[skill][name] for name in scenarios])
+    for i in range(sessions):
+        yield next(scenario_cycle)("bench-user-{}".format(i % users))
+
+
+def recorded_sessions(path):
+    """A single session replaying the envelopes of a JSON lines file."""
+    # type: (str) -> Iterator[Iterator[Dict]]
+    def session():
+        with open(path) as events:
+            for line in events:
+                if line.strip():
+                    yield json.loads(line)
+    yield session()
+
+
+class HandledExceptions(object):
+    """Count of the exceptions the skill's ``CatchAllExceptionHandler``
+    turned into its error response, which never reach the caller of
+    ``lambda_handler``."""
+    def __init__(self, lambda_function):
+        # type: (object) -> None
+        self.count = 0
+        handler_class = lambda_function.CatchAllExceptionHandler
+        handle = handler_class.handle
+
+        def counting_handle(handler, handler_input, exception):
+            self.count += 1
+            return handle(handler, handler_input, exception)
+
+        handler_class.handle = counting_handle
+
+
+def replay(handler, resource, sessions, recorder, trace=False,
+           handled=None):
+    """Send the requests of the sessions to the handler.
+
+    Requests are counted as errors when the handler raises, or when the
+    ``handled`` exceptions grew while handling them, in the timed pass
+    only.
+    """
+    # type: (Callable, InMemoryDynamoDb, Iterator[Iterator[Dict]], Recorder, bool, Optional[HandledExceptions]) -> None
+    for session in sessions:
+        response = None
+        while True:
+            try:
+                request = session.send(response)
+            except StopIteration:
+                break
+
+            key = request_key(request)
+            calls = Counter(resource.calls)
+            if trace:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            handled_before = handled.count if handled is not None else 0
+            start = time.perf_counter()
+            try:
+                response = handler(request, None)
+                failed = (handled is not None and
+                          handled.count != handled_before)
+            except Exception:
+                response = None
+                failed = True
+            latency = time.perf_counter() - start
+
+            if trace:
+                recorder.add_allocation(
+                    key, tracemalloc.get_traced_memory()[1] - baseline)
+            else:
+                calls = Counter(resource.calls) - calls
+                recorder.add(key, latency, calls)
+                if failed:
+                    recorder.errors[key] += 1
+
+
+def run_worker(args):
+    """Benchmark one skill and print the results as JSON."""
+    # type: (argparse.Namespace) -> None
+    logging.basicConfig(stream=open(os.devnull, "w"),
+                        format=LAMBDA_LOG_FORMAT)
+    resource = InMemoryDynamoDb(latency=args.latency_ms / 1000.0,
+                                jitter=args.jitter_ms / 1000.0)
+    lambda_function = load_skill(args.worker, resource)
+    handler = lambda_function.lambda_handler
+    handled = HandledExceptions(lambda_function)
+
+    def sessions(count):
+        if args.events:
+            return recorded_sessions(args.events)
+        return synthetic_sessions(
+            args.worker, count, args.users,
+            args.scenario or sorted(SCENARIOS[args.worker]))
+
+    # Warm up the caches of the container, then time, then measure
+    # allocations in a separate pass, as tracing slows every request.
+    warmup = Recorder()
+    replay(handler, resource, sessions(args.warmup), warmup,
+           handled=handled)
+    recorder = Recorder()
+    replay(handler, resource, sessions(args.sessions), recorder,
+           handled=handled)
+    if not args.no_allocations:
+        tracemalloc.start()
+        replay(handler, resource, sessions(args.sessions), recorder,
+               trace=True, handled=handled)
+        tracemalloc.stop()
+
+    json.dump({"skill": args.worker, "requests": recorder.report()},
+              sys.stdout)
+
+
+def run_skill(skill, argv):
+    """Run the benchmark of the skill in a child process."""
+    # type: (str, List[str]) -> Dict
+    output = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.replay", "--worker", skill] +
+        argv, cwd=REPO_ROOT)
+    return json.loads(output.decode("utf-8"))
+
+
+def print_report(result):
+    # type: (Dict) -> None
+    print("\n{}".format(result["skill"]))
+    header = "{:<40} {:>6} {:>8} {:>8} {:>8} {:>9} {:>6}  {}".format(
+        "request", "count", "p50 ms", "p95 ms", "p99 ms", "alloc KiB",
+        "errors", "dynamodb calls / request")
+    print(header)
+    print("-" * len(header))
+    for key, stats in result["requests"].items():
+        calls = ", ".join(
+            "{} {:.2f}".format(operation, average)
+            for operation, average in stats["dynamodb_calls"].items())
+        print("{:<40} {:>6} {:>8.3f} {:>8.3f} {:>8.3f} {:>9.1f} {:>6}  "
+              "{}".format(key, stats["count"], stats["p50_ms"],
+                          stats["p95_ms"], stats["p99_ms"],
+                          stats["alloc_p50_kib"], stats["errors"],
+                          calls or "-"))
+
+
+def parse_args(argv=None):
+    # type: (Optional[List[str]]) -> argparse.Namespace
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--skill", choices=SKILLS, action="append",
+                        help="skill to benchmark, both by default")
+    parser.add_argument("--scenario", action="append",
+                        help="synthetic scenario to replay, all by default")
+    parser.add_argument("--events",
+                        help="JSON lines file of request envelopes to "
+                             "replay instead of the synthetic sessions")
+    parser.add_argument("--sessions", type=int, default=200,
+                        help="number of synthetic sessions")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="number of sessions replayed before timing")
+    parser.add_argument("--users", type=int, default=20,
+                        help="number of distinct users of the sessions")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="latency injected in every DynamoDB call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0,
+                        help="extra latency spread over DynamoDB calls")
+    parser.add_argument("--no-allocations", action="store_true",
+                        help="skip the allocation measurement pass")
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as JSON")
+    parser.add_argument("--worker", choices=SKILLS, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(args)
+        return
+
+    skills = args.skill or list(SKILLS)
+    if args.events and len(skills) != 1:
+        sys.exit("--events replays the envelopes of a single --skill")
+
+    # The child processes get the same options, minus the skill choice
+    worker_argv = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == "--skill":
+            skip = True
+        elif not arg.startswith("--skill="):
+            worker_argv.append(arg)
+
+    results = [run_skill(skill, worker_argv) for skill in skills]
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print("")
+    else:
+        for result in results:
+            print_report(result)
+
+
+if __name__ == "__main__":
+    main()
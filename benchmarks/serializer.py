@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Compare the fast response serializer with the SDK serializer.
+
+Run from the repository root::
+
+    python -m benchmarks.serializer --rounds 2000
+
+The synthetic sessions of ``benchmarks.envelopes`` are replayed once
+through each skill to collect the response envelopes it builds, then
+every envelope is serialized ``--rounds`` times by the SDK
+``DefaultSerializer`` and by ``alexa.serializer.ResponseSerializer``.
+The report gives the time per response of both, by request type, and
+checks that they write the same dict.
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.dynamodb import InMemoryDynamoDb
+from benchmarks.envelopes import SCENARIOS
+from benchmarks.replay import (
+    LAMBDA_LOG_FORMAT, REPO_ROOT, SKILLS, load_skill, replay, Recorder,
+    synthetic_sessions)
+
+
+def collect_responses(lambda_function, resource, skill_name, sessions):
+    """Response envelope models built by the skill, by request key."""
+    # type: (object, InMemoryDynamoDb, str, int) -> Dict[str, List]
+    skill = lambda_function.get_skill()
+    invoke = skill.invoke
+    responses = OrderedDict()  # type: Dict[str, List]
+
+    def capture(request_envelope, context=None):
+        request = request_envelope.request
+        key = (request.intent.name if request.object_type == "IntentRequest"
+               else request.object_type)
+        response_envelope = invoke(request_envelope, context)
+        responses.setdefault(key, []).append(response_envelope)
+        return response_envelope
+
+    skill.invoke = capture
+    replay(lambda_function.lambda_handler, resource, synthetic_sessions(
+        skill_name, sessions, sessions, sorted(SCENARIOS[skill_name])),
+        Recorder())
+    skill.invoke = invoke
+    return responses
+
+
+def time_per_call(serialize, envelopes, rounds):
+    """Seconds per serialized envelope."""
+    # type: (Callable, List, int) -> float
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for envelope in envelopes:
+            serialize(envelope)
+    return (time.perf_counter() - start) / (rounds * len(envelopes))
+
+
+def run_worker(args):
+    """Benchmark one skill and print the results as JSON."""
+    # type: (argparse.Namespace) -> None
+    logging.basicConfig(stream=open(os.devnull, "w"),
+                        format=LAMBDA_LOG_FORMAT)
+    os.environ["FAST_SERIALIZER"] = "false"
+    resource = InMemoryDynamoDb()
+    lambda_function = load_skill(args.worker, resource)
+    from ask_sdk_core.serialize import DefaultSerializer
+    from alexa.serializer import ResponseSerializer
+
+    default = DefaultSerializer()
+    fast = ResponseSerializer()
+    results = OrderedDict()
+    for key, envelopes in collect_responses(
+            lambda_function, resource, args.worker,
+            args.sessions).items():
+        fast.stats = {"fast": 0, "fallback": 0}
+        results[key] = {
+            "responses": len(envelopes),
+            "default_us": time_per_call(
+                default.serialize, envelopes, args.rounds) * 1e6,
+            "fast_us": time_per_call(
+                fast.serialize, envelopes, args.rounds) * 1e6,
+            "fallback": fast.stats["fallback"] > 0,
+            "same": all(fast.serialize(envelope) ==
+                        default.serialize(envelope)
+                        for envelope in envelopes)
+        }
+    json.dump({"skill": args.worker, "requests": results}, sys.stdout)
+
+
+def print_report(result):
+    # type: (Dict) -> None
+    print("\n{}".format(result["skill"]))
+    header = "{:<40} {:>10} {:>10} {:>8}  {}".format(
+        "request", "sdk us", "fast us", "speedup", "output")
+    print(header)
+    print("-" * len(header))
+    for key, stats in result["requests"].items():
+        print("{:<40} {:>10.1f} {:>10.1f} {:>7.1f}x  {}".format(
+            key, stats["default_us"], stats["fast_us"],
+            stats["default_us"] / stats["fast_us"],
+            ("same" if stats["same"] else "DIFFERENT") +
+            (", fallback" if stats["fallback"] else "")))
+
+
+def parse_args(argv=None):
+    # type: (Optional[List[str]]) -> argparse.Namespace
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--skill", choices=SKILLS, action="append",
+                        help="skill to benchmark, both by default")
+    parser.add_argument("--sessions", type=int, default=4,
+                        help="number of synthetic sessions replayed to "
+                             "collect responses")
+    parser.add_argument("--rounds", type=int, default=1000,
+                        help="number of times every response is serialized")
+    parser.add_argument("--worker", choices=SKILLS, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(args)
+        return
+
+    for skill in args.skill or SKILLS:
+        output = subprocess.check_output(
+            [sys.executable, "-m", "benchmarks.serializer", "--worker", skill,
+             "--sessions", str(args.sessions), "--rounds", str(args.rounds)],
+            cwd=REPO_ROOT)
+        print_report(json.loads(output.decode("utf-8")))
+
+
+if __name__ == "__main__":
+    main()
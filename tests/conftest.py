@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""Tests of the MultiStream modules, the ``alexa`` package of
+``MultiStream/lambda/py``; ``persistence`` is shared by both skills."""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "MultiStream", "lambda", "py"))
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from alexa import catalog
+
+EPISODES = [
+    {"title": "Episode {}".format(i),
+     "url": "https://example.com/episodes/{}.mp3".format(i)}
+    for i in range(50)
+]
+EPISODES[3]["mirrors"] = ["https://mirror.example.com/episodes/3.mp3",
+                          "https://backup.example.com/episodes/3.mp3"]
+EPISODES[7]["title"] = "Épisode sept"
+
+
+def write_v2(episodes, path):
+    """Catalog file in version 2 of the format, without mirrors."""
+    record_format = catalog.RECORDS[2]
+    records = []
+    strings = bytearray()
+    for episode in episodes:
+        title = episode["title"].encode("utf-8")
+        url = episode["url"].encode("utf-8")
+        records.append((catalog.episode_key(episode["url"]), len(strings),
+                        len(title), len(strings) + len(title), len(url)))
+        strings += title + url
+
+    slot_count = 1
+    while slot_count < 2 * len(records):
+        slot_count *= 2
+    index = [(0, 0)] * slot_count
+    for position, record in enumerate(records):
+        slot = record[0] & (slot_count - 1)
+        while index[slot][1] != 0:
+            slot = (slot + 1) & (slot_count - 1)
+        index[slot] = (record[0], position + 1)
+
+    records_offset = catalog.HEADER.size
+    index_offset = records_offset + len(records) * record_format.size
+    strings_offset = index_offset + slot_count * catalog.SLOT.size
+    with open(path, "wb") as catalog_file:
+        catalog_file.write(catalog.HEADER.pack(
+            catalog.MAGIC, 2, len(records), slot_count, records_offset,
+            index_offset, strings_offset,
+            catalog._revision(record[0] for record in records)))
+        for record in records:
+            catalog_file.write(record_format.pack(*record))
+        for slot_key, stored in index:
+            catalog_file.write(catalog.SLOT.pack(slot_key, stored))
+        catalog_file.write(strings)
+
+
+def test_catalog_is_abstract():
+    with pytest.raises(TypeError):
+        catalog.Catalog()
+
+
+def test_build_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+    assert catalog.build(EPISODES, path) == len(EPISODES)
+    episodes = catalog.load(path)
+    assert isinstance(episodes, catalog.FileCatalog)
+    assert len(episodes) == len(EPISODES)
+    assert [episodes[i] for i in range(len(episodes))] == EPISODES
+    assert episodes[-1] == EPISODES[-1]
+    with pytest.raises(IndexError):
+        episodes[len(EPISODES)]
+    assert episodes.revision == catalog.ListCatalog(EPISODES).revision
+
+
+def test_version_2_file_is_read_without_mirrors(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+    write_v2(EPISODES, path)
+    episodes = catalog.FileCatalog(path)
+    assert len(episodes) == len(EPISODES)
+    assert episodes[3] == {"title": "Episode 3",
+                           "url": "https://example.com/episodes/3.mp3"}
+    assert episodes[7]["title"] == "Épisode sept"
+    assert episodes.position(catalog.episode_key(EPISODES[20]["url"])) == 20
+
+    # Rebuilt in the current version, as the feed command does
+    rebuilt = str(tmp_path / "rebuilt.bin")
+    catalog.build((episodes[i] for i in range(len(episodes))), rebuilt)
+    assert catalog.FileCatalog(rebuilt).revision == episodes.revision
+
+
+def test_not_a_catalog_file(tmp_path):
+    path = tmp_path / "catalog.bin"
+    path.write_bytes(b"\0" * catalog.HEADER.size)
+    with pytest.raises(ValueError):
+        len(catalog.FileCatalog(str(path)))
+
+
+def test_missing_file_falls_back_to_audio_data(tmp_path):
+    episodes = catalog.load(str(tmp_path / "missing.bin"))
+    assert isinstance(episodes, catalog.ListCatalog)
+
+
+@pytest.mark.parametrize("file_catalog", [True, False])
+def test_index_lookup(tmp_path, file_catalog):
+    if file_catalog:
+        path = str(tmp_path / "catalog.bin")
+        # Duplicate urls: the first one wins
+        catalog.build(EPISODES + [EPISODES[5]], path)
+        episodes = catalog.FileCatalog(path)
+    else:
+        episodes = catalog.ListCatalog(EPISODES + [EPISODES[5]])
+    for position, episode in enumerate(EPISODES):
+        key = catalog.episode_key(episode["url"])
+        assert episodes.key(position) == key
+        assert episodes.position(key) == position
+        assert episodes.resolve(episodes.token(position)) == position
+    assert episodes.position(
+        catalog.episode_key("https://example.com/unknown.mp3")) is None
+    # Legacy tokens are catalog positions
+    assert episodes.resolve("12") == 12
+    assert episodes.resolve(str(len(EPISODES) + 1)) is None
+    assert episodes.resolve("not a token") is None
+    assert episodes.resolve(None) is None
+
+
+@pytest.mark.parametrize("file_catalog", [True, False])
+def test_key_out_of_range(tmp_path, file_catalog):
+    if file_catalog:
+        path = str(tmp_path / "catalog.bin")
+        catalog.build(EPISODES, path)
+        episodes = catalog.FileCatalog(path)
+    else:
+        episodes = catalog.ListCatalog(EPISODES)
+    assert episodes.key(-1) == catalog.episode_key(EPISODES[-1]["url"])
+    for position in (len(EPISODES), 10 ** 6, -len(EPISODES) - 1):
+        with pytest.raises(IndexError):
+            episodes.key(position)
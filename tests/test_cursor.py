@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import base64
+
+import pytest
+
+from alexa import cursor
+
+CODEC = cursor.CursorCodec(b"secret")
+CURSOR = cursor.Cursor(key=0x0123456789abcdef, seed=42, shuffle=True,
+                       revision=0xfedcba9876543210)
+
+
+def tamper(token, position):
+    raw = bytearray(base64.urlsafe_b64decode(token.encode("ascii")))
+    raw[position] ^= 1
+    return base64.urlsafe_b64encode(bytes(raw)).decode("ascii")
+
+
+@pytest.mark.parametrize("playback_cursor", [
+    CURSOR,
+    CURSOR._replace(shuffle=False, seed=0),
+    cursor.Cursor(key=2 ** 64 - 1, seed=2 ** 32 - 1, shuffle=True,
+                  revision=0),
+])
+def test_round_trip(playback_cursor):
+    token = CODEC.encode(playback_cursor)
+    assert len(token) == cursor.TOKEN_LENGTH
+    assert CODEC.decode(token) == playback_cursor
+
+
+@pytest.mark.parametrize("position", [
+    0, 1, 2, 6, 10, cursor.PAYLOAD.size - 1, cursor.PAYLOAD.size,
+    cursor.PAYLOAD.size + cursor.TAG_SIZE - 1])
+def test_tampered_token_is_rejected(position):
+    assert CODEC.decode(tamper(CODEC.encode(CURSOR), position)) is None
+
+
+def test_token_signed_with_another_secret_is_rejected():
+    token = cursor.CursorCodec(b"other secret").encode(CURSOR)
+    assert CODEC.decode(token) is None
+
+
+@pytest.mark.parametrize("token", [
+    None, "", "0", "0123456789abcdef", "not a token",
+    "!" * cursor.TOKEN_LENGTH])
+def test_other_tokens_are_not_cursors(token):
+    assert CODEC.decode(token) is None
+
+
+def test_unknown_version_is_rejected():
+    payload = cursor.PAYLOAD.pack(cursor.VERSION + 1, 0, 0, 1, 1)
+    token = base64.urlsafe_b64encode(
+        payload + CODEC._tag(payload)).decode("ascii")
+    assert CODEC.decode(token) is None
+
+
+def test_loop_bit_of_earlier_tokens_is_ignored():
+    payload = cursor.PAYLOAD.pack(cursor.VERSION, 1 | cursor.SHUFFLE,
+                                  CURSOR.seed, CURSOR.key, CURSOR.revision)
+    token = base64.urlsafe_b64encode(
+        payload + CODEC._tag(payload)).decode("ascii")
+    assert CODEC.decode(token) == CURSOR
+
+
+def test_secret_is_required():
+    with pytest.raises(ValueError):
+        cursor.CursorCodec(b"")
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from ask_sdk_core.dispatch_components import AbstractRequestHandler
+from ask_sdk_core.handler_input import HandlerInput
+from ask_sdk_core.utils import is_intent_name, is_request_type
+from ask_sdk_model import IntentRequest, LaunchRequest, RequestEnvelope
+from ask_sdk_model.intent import Intent
+from ask_sdk_model.interfaces.audioplayer import PlaybackStartedRequest
+from ask_sdk_runtime.dispatch_components import GenericRequestHandlerChain
+
+from alexa import dispatch
+
+
+class Handler(AbstractRequestHandler):
+    """Handler whose ``can_handle`` agrees with its declarations."""
+    def __init__(self, name, request_types=(), intent_names=(), state=None):
+        self.name = name
+        if request_types:
+            self.request_types = request_types
+        if intent_names:
+            self.intent_names = intent_names
+        if state is not None:
+            self.state = state
+
+    def can_handle(self, handler_input):
+        matches = any(is_request_type(request_type)(handler_input)
+                      for request_type in getattr(self, "request_types", ()))
+        matches = matches or any(
+            is_intent_name(intent_name)(handler_input)
+            for intent_name in getattr(self, "intent_names", ()))
+        return matches and all(
+            handler_input.attributes_manager[name] == expected
+            for name, expected in getattr(self, "state", {}).items())
+
+    def handle(self, handler_input):
+        return None
+
+
+class Unindexed(AbstractRequestHandler):
+    """Handler without declarations, for the requests of an intent."""
+    name = "unindexed"
+
+    def can_handle(self, handler_input):
+        return is_intent_name("AMAZON.HelpIntent")(handler_input)
+
+    def handle(self, handler_input):
+        return None
+
+
+HANDLERS = [
+    Handler("launch", request_types=("LaunchRequest",)),
+    Handler("pause", intent_names=("AMAZON.PauseIntent",)),
+    Unindexed(),
+    Handler("resume in session", intent_names=("AMAZON.ResumeIntent",),
+            state={"in_playback_session": True}),
+    Handler("resume", intent_names=("AMAZON.ResumeIntent",
+                                    "AMAZON.HelpIntent")),
+    Handler("started", request_types=("AudioPlayer.PlaybackStarted",)),
+]
+
+
+def handler_input(request, in_playback_session=False):
+    # The state is read through a dict standing in for the attributes
+    return HandlerInput(
+        request_envelope=RequestEnvelope(request=request),
+        attributes_manager={"in_playback_session": in_playback_session})
+
+
+def intent(name):
+    return IntentRequest(intent=Intent(name=name))
+
+
+@pytest.fixture
+def predicate_calls():
+    return []
+
+
+@pytest.fixture
+def mapper(predicate_calls):
+    def in_playback_session(handler_input):
+        predicate_calls.append(None)
+        return handler_input.attributes_manager["in_playback_session"]
+
+    return dispatch.IndexedRequestMapper(
+        [GenericRequestHandlerChain(handler) for handler in HANDLERS],
+        state_predicates={"in_playback_session": in_playback_session},
+        verify=True)
+
+
+@pytest.mark.parametrize("request_, in_playback_session, expected", [
+    (LaunchRequest(), False, "launch"),
+    (intent("AMAZON.PauseIntent"), True, "pause"),
+    (intent("AMAZON.ResumeIntent"), True, "resume in session"),
+    (intent("AMAZON.ResumeIntent"), False, "resume"),
+    # The unindexed handler is checked in its registration order
+    (intent("AMAZON.HelpIntent"), False, "unindexed"),
+    (PlaybackStartedRequest(), False, "started"),
+])
+def test_handlers_are_looked_up(mapper, request_, in_playback_session,
+                                expected, caplog):
+    chain = mapper.get_request_handler_chain(
+        handler_input(request_, in_playback_session))
+    assert chain.request_handler.name == expected
+    # No mismatch with the linear chain
+    assert not caplog.records
+
+
+def test_unknown_request_has_no_handler(mapper):
+    assert mapper.get_request_handler_chain(
+        handler_input(intent("AMAZON.StopIntent"))) is None
+
+
+def test_state_predicates_are_evaluated_once(mapper, predicate_calls):
+    mapper.verify = False
+    mapper.get_request_handler_chain(
+        handler_input(intent("AMAZON.ResumeIntent")))
+    assert len(predicate_calls) == 1
+
+
+def test_handlers_added_later_are_indexed(mapper):
+    stop = Handler("stop", intent_names=("AMAZON.StopIntent",))
+    mapper.get_request_handler_chain(handler_input(LaunchRequest()))
+    mapper.add_request_handler_chain(GenericRequestHandlerChain(stop))
+    assert mapper.get_request_handler_chain(handler_input(
+        intent("AMAZON.StopIntent"))).request_handler is stop
+
+
+def test_mismatch_uses_the_linear_chain(mapper, caplog):
+    # Declared for the launch request, but not handling it
+    wrong = Handler("wrong", request_types=("LaunchRequest",))
+    wrong.can_handle = lambda handler_input: False
+    mapper = dispatch.IndexedRequestMapper(
+        [GenericRequestHandlerChain(wrong)] +
+        mapper.request_handler_chains, verify=True)
+    chain = mapper.get_request_handler_chain(handler_input(LaunchRequest()))
+    assert chain.request_handler.name == "launch"
+    assert "Dispatch mismatch" in caplog.text
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from alexa import failover
+
+URL = "https://example.com/episode.mp3"
+MIRROR = "https://mirror.example.com/episode.mp3"
+RECORD = {"url": URL, "mirrors": [MIRROR]}
+
+
+@pytest.fixture(autouse=True)
+def container():
+    failover._breakers.clear()
+    failover._mirror_streams.clear()
+    yield
+    failover._breakers.clear()
+    failover._mirror_streams.clear()
+
+
+def test_request_handled_again_charges_the_container_once():
+    for _ in range(3):
+        # Attributes read again on each attempt
+        assert failover.fail_over(RECORD, URL, {}, "request-1") == MIRROR
+    assert failover._breakers[URL]["failures"] == 1
+    assert failover.pick(RECORD) == URL
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000 * 1000 * 1000]
+    monkeypatch.setattr(failover, "_now", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_at_the_threshold_and_backs_off(clock):
+    breaker = {}
+    failover._charge(breaker, clock[0])
+    assert not failover._is_open(breaker, clock[0])
+    failover._charge(breaker, clock[0])
+    assert failover._is_open(breaker, clock[0])
+    assert breaker["open_until"] == clock[0] + failover.BACKOFF
+
+    # Opening again doubles the delay
+    clock[0] += failover.BACKOFF
+    assert not failover._is_open(breaker, clock[0])
+    failover._charge(breaker, clock[0])
+    failover._charge(breaker, clock[0])
+    assert breaker["open_until"] == clock[0] + 2 * failover.BACKOFF
+
+    # Reset after RESET_AFTER without failures
+    clock[0] += failover.RESET_AFTER + 1
+    failover._charge(breaker, clock[0])
+    failover._charge(breaker, clock[0])
+    assert breaker["open_until"] == clock[0] + failover.BACKOFF
+
+
+def test_pick_skips_the_urls_open_in_the_container_or_for_the_user(clock):
+    attributes = {}
+    assert failover.pick(RECORD, attributes) == URL
+    failover.fail_over(RECORD, URL, attributes)
+    failover.fail_over(RECORD, URL, attributes)
+    assert failover.pick(RECORD, attributes) == MIRROR
+
+    # Other containers only know the breakers of the user
+    failover._breakers.clear()
+    assert failover.pick(RECORD) == URL
+    assert failover.pick(RECORD, attributes) == MIRROR
+
+    # Closed again after the backoff
+    clock[0] += failover.BACKOFF
+    assert failover.pick(RECORD, attributes) == URL
+
+
+def test_pick_falls_back_to_the_url_when_none_is_healthy(clock):
+    attributes = {}
+    for url in (URL, MIRROR, URL, MIRROR):
+        failover.fail_over(RECORD, url, attributes)
+    assert failover.pick(RECORD, attributes) == URL
+
+
+def test_urls_are_tried_in_turn(clock):
+    second = "https://backup.example.com/episode.mp3"
+    record = {"url": URL, "mirrors": [MIRROR, second]}
+    assert failover.fail_over(record, URL, {}) == MIRROR
+    assert failover.fail_over(record, MIRROR, {}) == second
+    assert failover.fail_over(record, second, {}) == URL
+    # A url no longer in the record: from the first one
+    assert failover.fail_over(
+        record, "https://old.example.com/episode.mp3", {}) == URL
+
+
+def test_open_mirrors_are_skipped(clock):
+    attributes = {}
+    failover.fail_over(RECORD, MIRROR, attributes)
+    failover.fail_over(RECORD, MIRROR, attributes)
+    assert failover.fail_over(RECORD, URL, attributes) is None
+
+
+def test_failed_url_without_mirrors_is_not_played_again_right_away(clock):
+    record = {"url": URL}
+    attributes = {}
+    assert failover.fail_over(record, URL, attributes) is None
+    assert attributes["stream_health"]["retries"] == []
+    assert failover.pick(record, attributes) == URL
+
+
+def test_retries_are_limited_per_user(clock):
+    attributes = {}
+    for _ in range(failover.RETRY_LIMIT):
+        assert failover.fail_over(RECORD, URL, attributes) == MIRROR
+        failover._breakers.clear()
+        attributes["stream_health"]["breakers"].clear()
+    assert failover.fail_over(RECORD, URL, attributes) is None
+    # Another user still gets a retry
+    assert failover.fail_over(RECORD, URL, {}) == MIRROR
+
+    clock[0] += failover.RETRY_WINDOW
+    failover._breakers.clear()
+    attributes["stream_health"]["breakers"].clear()
+    assert failover.fail_over(RECORD, URL, attributes) == MIRROR
+
+
+def test_mirror_streams_are_remembered(clock):
+    assert failover.played_url("token", RECORD) == URL
+    failover.remember("token", MIRROR, RECORD)
+    assert failover.played_url("token", RECORD) == MIRROR
+    failover.remember("token", URL, RECORD)
+    assert failover.played_url("token", RECORD) == URL
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from alexa import catalog, feed, search
+
+RSS = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">
+  <channel>
+    <title>Show</title>
+    <item>
+      <itunes:title>Ignored</itunes:title>
+      <title>Third</title>
+      <pubDate>Wed, 03 Jan 2024 10:00:00 +0000</pubDate>
+      <enclosure url="https://example.com/3.mp3" type="audio/mpeg"/>
+    </item>
+    <item>
+      <title>Video</title>
+      <enclosure url="https://example.com/video.mp4" type="video/mp4"/>
+    </item>
+    <item>
+      <title>Not over https</title>
+      <enclosure url="http://example.com/http.mp3" type="audio/mpeg"/>
+    </item>
+    <item>
+      <title>Second</title>
+      <pubDate>Tue, 02 Jan 2024 10:00:00 +0000</pubDate>
+      <enclosure url="https://example.com/2.mp3" type="audio/mpeg"/>
+    </item>
+  </channel>
+</rss>
+"""
+ATOM = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>Show</title>
+  <entry>
+    <title>Undated</title>
+    <link rel="enclosure" href="https://example.com/undated.mp3"
+          type="audio/mpeg"/>
+  </entry>
+  <entry>
+    <title>First</title>
+    <published>2024-01-01T12:00:00+02:00</published>
+    <link rel="enclosure" href="https://example.com/1.mp3"
+          type="audio/mpeg"/>
+  </entry>
+  <entry>
+    <title>Second again</title>
+    <updated>2024-01-02T10:00:00Z</updated>
+    <link rel="enclosure" href="https://example.com/2.mp3"
+          type="audio/mpeg"/>
+  </entry>
+</feed>
+"""
+
+
+@pytest.fixture
+def feeds(tmp_path):
+    rss = tmp_path / "rss.xml"
+    rss.write_text(RSS, encoding="utf-8")
+    atom = tmp_path / "atom.xml"
+    atom.write_text(ATOM, encoding="utf-8")
+    return [str(rss), str(atom)]
+
+
+@pytest.mark.parametrize("text, timestamp", [
+    ("Tue, 02 Jan 2024 10:00:00 +0000", 1704189600.0),
+    ("2024-01-02T10:00:00Z", 1704189600.0),
+    ("2024-01-02T12:00:00.5+02:00", 1704189600.0),
+    ("2024-01-02 10:00:00", 1704189600.0),
+    ("yesterday", None),
+    (None, None),
+])
+def test_parse_date(text, timestamp):
+    assert feed._parse_date(text) == timestamp
+
+
+def test_read_feed(feeds):
+    episodes = list(feed.read_feed(feeds[0]))
+    assert [episode.title for episode in episodes] == [
+        "Third", "Not over https", "Second"]
+    assert episodes[0].url == "https://example.com/3.mp3"
+    assert [episode.title for episode in feed.read_feed(feeds[1])] == [
+        "Undated", "First", "Second again"]
+
+
+def test_new_episodes_are_appended_oldest_first(tmp_path, feeds):
+    catalog_path = str(tmp_path / "catalog.bin")
+    index_path = str(tmp_path / "search.bin")
+    catalog.build([{"title": "Existing",
+                    "url": "https://example.com/3.mp3"}], catalog_path)
+
+    assert feed.ingest(feeds, catalog_path, index_path) == 3
+    episodes = catalog.FileCatalog(catalog_path)
+    assert [episodes[position]["title"]
+            for position in range(len(episodes))] == [
+        "Existing", "First", "Second", "Undated"]
+    with open(index_path, "rb") as index_file:
+        index = search.SearchIndex(index_file.read())
+    assert index.revision == episodes.revision
+    assert index.search("undated") == 3
+
+
+def test_unchanged_feeds_are_not_parsed_again(tmp_path, feeds, monkeypatch):
+    catalog_path = str(tmp_path / "catalog.bin")
+    catalog.build([], catalog_path)
+    assert feed.ingest(feeds, catalog_path) == 4
+    assert os.path.exists(catalog_path + ".feeds.json")
+
+    parsed = []
+    read_feed = feed.read_feed
+
+    def counting_read_feed(path):
+        parsed.append(path)
+        return read_feed(path)
+
+    monkeypatch.setattr(feed, "read_feed", counting_read_feed)
+    assert feed.ingest(feeds, catalog_path) == 0
+    assert parsed == []
+    assert feed.ingest(feeds, catalog_path, force=True) == 0
+    assert parsed == feeds
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from ask_sdk_core.exceptions import PersistenceException
+
+from alexa import persistence
+from benchmarks.dynamodb import InMemoryDynamoDb
+
+USER = "amzn1.ask.account.test"
+
+
+def adapter(dynamodb, **kwargs):
+    """Adapter of a container, sharing the ``dynamodb`` table."""
+    return persistence.VersionedCacheDynamoDbAdapter(
+        "test", dynamodb_resource=dynamodb,
+        partition_keygen=lambda request_envelope: USER, **kwargs)
+
+
+def stored(dynamodb):
+    return dynamodb.tables["test"][USER]["attributes"]
+
+
+@pytest.fixture
+def dynamodb():
+    dynamodb = InMemoryDynamoDb()
+    adapter(dynamodb).save_attributes(
+        None, {"playback_info": {"index": 0, "offset_in_ms": 0}})
+    return dynamodb
+
+
+def test_write_on_stale_attributes_conflicts(dynamodb):
+    first = adapter(dynamodb)
+    second = adapter(dynamodb)
+    # Cached by the first container
+    first.get_attributes(None)
+    first.save_attributes(None, first.get_attributes(None))
+
+    attributes = second.get_attributes(None)
+    attributes["playback_info"]["offset_in_ms"] = 5000
+    second.save_attributes(None, attributes)
+
+    attributes = first.get_attributes(None)
+    assert first.stats["hits"] == 2
+    attributes["playback_info"]["index"] = 1
+    with pytest.raises(persistence.WriteConflict):
+        first.save_attributes(None, attributes)
+    assert first.stats["conflicts"] == 1
+    # Nothing merged from the stale attributes
+    assert stored(dynamodb) == {"playback_info": {"index": 0,
+                                                  "offset_in_ms": 5000}}
+    # The entry was dropped, the next read gets the stored attributes
+    assert first.get_attributes(None)["playback_info"]["offset_in_ms"] == 5000
+
+
+def test_handle_runs_the_request_again_on_the_stored_attributes(dynamodb):
+    first = adapter(dynamodb)
+    second = adapter(dynamodb)
+    first.get_attributes(None)
+    attempts = []
+
+    def invoke():
+        attempts.append(None)
+        attributes = first.get_attributes(None)
+        if len(attempts) == 1:
+            # Written by another container while handling the request
+            other = second.get_attributes(None)
+            other["playback_info"]["index"] += 1
+            second.save_attributes(None, other)
+        attributes["playback_info"]["index"] += 1
+        first.save_attributes(None, attributes)
+        return attributes["playback_info"]["index"]
+
+    assert first.handle(invoke) == 2
+    assert len(attempts) == 2
+    assert stored(dynamodb)["playback_info"]["index"] == 2
+
+
+def test_handle_gives_up_after_max_conflict_retries(dynamodb):
+    first = adapter(dynamodb, max_conflict_retries=2)
+    attempts = []
+
+    def invoke():
+        attempts.append(None)
+        raise persistence.WriteConflict("The conditional request failed")
+
+    with pytest.raises(PersistenceException):
+        first.handle(invoke)
+    assert len(attempts) == 3
+
+
+def test_new_user_written_concurrently_conflicts():
+    dynamodb = InMemoryDynamoDb()
+    dynamodb.Table("test")
+    first = adapter(dynamodb)
+    second = adapter(dynamodb)
+    assert first.get_attributes(None) == {}
+    second.save_attributes(None, {"playback_info": {"index": 3}})
+    with pytest.raises(persistence.WriteConflict):
+        first.save_attributes(None, {"playback_info": {"index": 0}})
+    assert stored(dynamodb) == {"playback_info": {"index": 3}}
+
+
+def test_read_through_requests_read_the_table(dynamodb):
+    first = adapter(dynamodb,
+                    read_through=lambda request_envelope: request_envelope)
+    second = adapter(dynamodb)
+    first.get_attributes(False)
+    attributes = second.get_attributes(None)
+    attributes["playback_info"]["index"] = 4
+    second.save_attributes(None, attributes)
+
+    assert first.get_attributes(False)["playback_info"]["index"] == 0
+    assert first.get_attributes(True)["playback_info"]["index"] == 4
+    assert first.stats["read_throughs"] == 1
+    # The cache holds the attributes read through it
+    assert first.get_attributes(False)["playback_info"]["index"] == 4
+
+
+def test_update_attributes_writes_existing_items_only(dynamodb):
+    first = adapter(dynamodb)
+    second = adapter(dynamodb)
+    second.get_attributes(None)
+    assert first.update_attributes(
+        None, {("playback_info", "offset_in_ms"): 1200})
+    assert stored(dynamodb)["playback_info"] == {"index": 0,
+                                                 "offset_in_ms": 1200}
+    assert dynamodb.tables["test"][USER]["version"] == 2
+    # Attributes read before the update are stale
+    with pytest.raises(persistence.WriteConflict):
+        second.save_attributes(None, {"playback_info": {"index": 1}})
+
+    dynamodb.tables["test"].clear()
+    assert not first.update_attributes(
+        None, {("playback_info", "offset_in_ms"): 0})
+    assert dynamodb.tables["test"] == {}
+
+
+def test_handle_forgets_attributes_not_saved(dynamodb):
+    first = adapter(dynamodb)
+
+    def invoke():
+        first.get_attributes(None)
+        raise ValueError("handler failed")
+
+    with pytest.raises(ValueError):
+        first.handle(invoke)
+    assert first._snapshots == {}
+    assert first._versions == {}
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from alexa import play_order
+
+
+@pytest.mark.parametrize("length", [1, 2, 3, 7, 64, 100, 1000, 4097])
+@pytest.mark.parametrize("seed", [0, 1, 123456789, 2 ** 32 - 1])
+def test_feistel_permutation_is_a_bijection(length, seed):
+    permutation = play_order.FeistelPermutation(length, seed)
+    assert sorted(permutation) == list(range(length))
+
+
+@pytest.mark.parametrize("length", [1, 5, 300, 5000])
+def test_feistel_inverse_maps_items_back_to_positions(length):
+    permutation = play_order.FeistelPermutation(length, 42)
+    inverse = play_order.FeistelPermutation(length, 42, inverse=True)
+    for position in range(length):
+        assert inverse[permutation[position]] == position
+
+
+def test_feistel_permutation_depends_on_seed_only():
+    assert (list(play_order.FeistelPermutation(500, 7)) ==
+            list(play_order.FeistelPermutation(500, 7)))
+    assert (list(play_order.FeistelPermutation(500, 7)) !=
+            list(play_order.FeistelPermutation(500, 8)))
+
+
+def test_feistel_permutation_negative_and_out_of_range_index():
+    permutation = play_order.FeistelPermutation(10, 3)
+    assert permutation[-1] == permutation[9]
+    with pytest.raises(IndexError):
+        permutation[10]
+
+
+def test_shuffled_order_round_trips_through_its_stored_form():
+    order = play_order.shuffled(1000, seed=99)
+    stored = play_order.encode(order)
+    assert stored == {"length": 1000, "seed": 99}
+    decoded = play_order.decode(stored)
+    assert list(decoded) == list(order)
+    for position in (0, 1, 500, 999):
+        assert decoded.index(decoded[position]) == position
+
+
+def test_packed_order_round_trips_with_its_inverse():
+    order = [3, 0, 4, 1, 2]
+    stored = play_order.encode(order)
+    decoded = play_order.decode(stored)
+    assert list(decoded) == order
+    assert [decoded.index(token) for token in range(5)] == [1, 3, 4, 0, 2]
+
+
+def test_identity_and_legacy_orders():
+    assert play_order.encode(range(4)) == {"length": 4}
+    assert play_order.decode({"length": 4}).is_identity
+    legacy = play_order.decode([2, 0, 1])
+    assert list(legacy) == [2, 0, 1]
+    assert play_order.needs_upgrade([2, 0, 1])
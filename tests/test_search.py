@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from alexa import catalog, search
+
+TITLES = [
+    "Welcome to the show",
+    "Episode 22: Gardening in winter",
+    "The best of 2018",
+    "Interview with Zoë Martin",
+    "Gardening tools",
+    "Cooking with kids",
+]
+EPISODES = catalog.ListCatalog([
+    {"title": title, "url": "https://example.com/{}.mp3".format(position)}
+    for position, title in enumerate(TITLES)])
+
+
+@pytest.fixture(scope="module")
+def index():
+    return search.SearchIndex(search.build(TITLES, EPISODES.revision))
+
+
+@pytest.mark.parametrize("text, words", [
+    ("Zoë's Café", ["zoe", "s", "cafe"]),
+    ("episode twenty two", ["episode", "22"]),
+    ("the best of twenty eighteen", ["the", "best", "of", "2018"]),
+    ("Episode 007", ["episode", "7"]),
+])
+def test_normalize(text, words):
+    assert search.normalize(text) == words
+
+
+@pytest.mark.parametrize("query, position", [
+    ("welcome to the show", 0),
+    # Numbers said in words
+    ("episode twenty two", 1),
+    ("best of twenty eighteen", 2),
+    # Accents and misheard words
+    ("interview with zoe martin", 3),
+    ("interview with zoey martin", 3),
+    # Prefixes
+    ("garden tools", 4),
+    ("cook", 5),
+])
+def test_search(index, query, position):
+    assert index.search(query) == position
+
+
+@pytest.mark.parametrize("query", ["", "quantum physics", "quantum physics show"])
+def test_no_good_match(index, query):
+    assert index.search(query) is None
+
+
+def test_written_index_is_mapped(tmp_path, monkeypatch):
+    path = str(tmp_path / "search.bin")
+    search.write(EPISODES, path)
+    monkeypatch.setattr(catalog, "_catalog", EPISODES)
+    monkeypatch.setattr(search, "_index", None)
+    monkeypatch.setenv("SEARCH_INDEX_PATH", path)
+    index = search.get_index()
+    assert index.revision == EPISODES.revision
+    assert index.search("gardening in winter") == 1
+
+
+def test_stale_index_is_built_in_memory(tmp_path, monkeypatch, caplog):
+    path = str(tmp_path / "search.bin")
+    search.write(catalog.ListCatalog(EPISODES.episodes[:2]), path)
+    monkeypatch.setattr(catalog, "_catalog", EPISODES)
+    monkeypatch.setattr(search, "_index", None)
+    monkeypatch.setenv("SEARCH_INDEX_PATH", path)
+    assert search.get_index().search("cooking with kids") == 5
+    assert "another catalog" in caplog.text
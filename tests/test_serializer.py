@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import decimal
+
+import pytest
+from ask_sdk_core.serialize import DefaultSerializer
+from ask_sdk_model import Response, ResponseEnvelope
+from ask_sdk_model.interfaces.audioplayer import (
+    AudioItem, AudioItemMetadata, ClearBehavior, ClearQueueDirective,
+    PlayBehavior, PlayDirective, StopDirective, Stream)
+from ask_sdk_model.interfaces.display import Image as DisplayImage
+from ask_sdk_model.interfaces.display import ImageInstance
+from ask_sdk_model.interfaces.videoapp import LaunchDirective, VideoItem
+from ask_sdk_model.ui import (
+    Image, PlainTextOutputSpeech, Reprompt, SimpleCard, SsmlOutputSpeech,
+    StandardCard)
+
+from alexa import serializer
+
+
+def play(offset_in_ms=0, metadata=None):
+    return PlayDirective(
+        play_behavior=PlayBehavior.REPLACE_ALL,
+        audio_item=AudioItem(
+            stream=Stream(token="token", url="https://example.com/a.mp3",
+                          offset_in_milliseconds=offset_in_ms,
+                          expected_previous_token=None),
+            metadata=metadata))
+
+
+RESPONSES = [
+    Response(output_speech=SsmlOutputSpeech(ssml="<speak>Hi</speak>"),
+             reprompt=Reprompt(output_speech=PlainTextOutputSpeech(
+                 text="Hello?")),
+             should_end_session=False),
+    Response(card=SimpleCard(title="Title", content="Content")),
+    Response(card=StandardCard(
+        title="Title", text="Text",
+        image=Image(small_image_url="https://example.com/s.png"))),
+    Response(directives=[play()], should_end_session=True),
+    # Offsets read back from DynamoDb
+    Response(directives=[play(decimal.Decimal(1200))]),
+    Response(directives=[play(metadata=AudioItemMetadata(
+        title="Title", subtitle="Subtitle",
+        art=DisplayImage(sources=[ImageInstance(
+            url="https://example.com/art.png")])))]),
+    Response(directives=[StopDirective()]),
+    Response(directives=[ClearQueueDirective(
+        clear_behavior=ClearBehavior.CLEAR_ALL)]),
+    Response(),
+]
+
+
+@pytest.mark.parametrize("response", RESPONSES)
+def test_written_like_the_default_serializer(response):
+    envelope = ResponseEnvelope(version="1.0", response=response,
+                                session_attributes={"index": 2})
+    fast = serializer.ResponseSerializer()
+    assert fast.serialize(envelope) == DefaultSerializer().serialize(
+        envelope)
+    assert fast.stats == {"fast": 1, "fallback": 0}
+
+
+def test_other_shapes_fall_back_to_the_default_serializer():
+    envelope = ResponseEnvelope(version="1.0", response=Response(
+        directives=[LaunchDirective(video_item=VideoItem(
+            source="https://example.com/video.mp4"))]))
+    fast = serializer.ResponseSerializer()
+    assert fast.serialize(envelope) == DefaultSerializer().serialize(
+        envelope)
+    assert fast.stats == {"fast": 0, "fallback": 1}
+
+
+def test_other_objects_use_the_default_serializer():
+    fast = serializer.ResponseSerializer()
+    assert fast.serialize(play()) == DefaultSerializer().serialize(play())
+    assert fast.stats == {"fast": 0, "fallback": 0}